@@ -0,0 +1,131 @@
+import random
+import re
+from multiprocessing import Array, Value
+
+from bank.storages import BOTTOM_ACCOUNT_NUMBER, TOP_ACCOUNT_NUMBER
+
+RANDOM_PROBES = 8  # random probes before allocator scans for a free number
+
+_NOT_FULL_BYTE = re.compile(rb"[^\xff]")
+
+
+class AccountAllocator:
+    """
+    Allocator of free account numbers shared by all processes. Every account number has one bit
+    in bitmap (shared memory), reservation is done under bitmap lock, so two workers never get the same number.
+    Few random probes are tried first, when they hit used numbers allocator scans bitmap for a byte with free bit
+    from random position, so reservation does not depend on luck even when number space is almost full.
+    """
+
+    def __init__(self, bottom: int = BOTTOM_ACCOUNT_NUMBER, top: int = TOP_ACCOUNT_NUMBER):
+        self._bottom = bottom
+        self._size = top - bottom + 1
+        self._bitmap = Array('B', (self._size + 7) // 8)
+        self._used = Value('i', 0, lock=False)
+        self.load([])
+
+    def load(self, account_numbers):
+        """
+        Marks numbers of existing accounts as used, other numbers become free
+        :param account_numbers: iterable of account numbers
+        """
+        with self._bitmap.get_lock():
+            bits = self._bitmap.get_obj()
+            memoryview(bits).cast('B')[:] = bytes(len(bits))
+
+            # bits past the last number are marked as used, so they are never picked
+            for index in range(self._size, len(bits) * 8):
+                bits[index >> 3] |= 1 << (index & 7)
+
+            self._used.value = 0
+            for account_number in account_numbers:
+                self._mark(bits, self._index(account_number))
+
+    def reserve(self) -> str | None:
+        """
+        Reserves random free account number
+        :return: account number or None if every number is used
+        """
+        with self._bitmap.get_lock():
+            if self._used.value >= self._size:
+                return None
+
+            bits = self._bitmap.get_obj()
+            index = self._find_free(bits)
+            self._mark(bits, index)
+            return str(self._bottom + index)
+
+    def reserve_many(self, count: int) -> list:
+        """
+        Reserves random free account numbers in one pass under bitmap lock
+        :param count: number of account numbers
+        :return: list of account numbers, shorter than count if number space got full
+        """
+        reserved = []
+        with self._bitmap.get_lock():
+            bits = self._bitmap.get_obj()
+            while len(reserved) < count and self._used.value < self._size:
+                index = self._find_free(bits)
+                self._mark(bits, index)
+                reserved.append(str(self._bottom + index))
+
+        return reserved
+
+    def release(self, account_number: str):
+        """
+        Returns number of removed account (or number that was not used after all) back to free numbers
+        """
+        index = self._index(account_number)
+        if index is None:
+            return
+
+        with self._bitmap.get_lock():
+            bits = self._bitmap.get_obj()
+            mask = 1 << (index & 7)
+            if bits[index >> 3] & mask:
+                bits[index >> 3] &= ~mask & 0xFF
+                self._used.value -= 1
+
+    def get_stats(self) -> dict:
+        """
+        :return: dictionary with used and free account numbers
+        """
+        used = self._used.value
+        return {"used": used, "free": self._size - used}
+
+    def _index(self, account_number) -> int | None:
+        try:
+            index = int(account_number) - self._bottom
+        except (TypeError, ValueError):
+            return None
+        return index if 0 <= index < self._size else None
+
+    def _mark(self, bits, index: int | None):
+        """
+        Marks number as used, bitmap lock must be held
+        """
+        if index is None:
+            return
+
+        mask = 1 << (index & 7)
+        if not bits[index >> 3] & mask:
+            bits[index >> 3] |= mask
+            self._used.value += 1
+
+    def _find_free(self, bits) -> int:
+        """
+        Finds free number, bitmap lock must be held and at least one number must be free
+        :return: index of free number
+        """
+        for _ in range(RANDOM_PROBES):
+            index = random.randrange(self._size)
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return index
+
+        bitmap = memoryview(bits).cast('B')
+        start = random.randrange(len(bitmap))
+        match = _NOT_FULL_BYTE.search(bitmap, start) or _NOT_FULL_BYTE.search(bitmap, 0, start)
+
+        byte = match.start()
+        free_bits = [bit for bit in range(8) if not bitmap[byte] & (1 << bit)]
+        return byte * 8 + random.choice(free_bits)
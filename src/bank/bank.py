@@ -1,10 +1,16 @@
 import logging
 import socket
+import threading
 import time
 from multiprocessing import Queue, Manager
+from bank.allocator import AccountAllocator
 from bank.gateway import Gateway
-from bank.storages import prepare_storage_structure, load_data_to_shared_memory, BankStorage
-from workers.worker_manager import WorkerManager
+from bank.engines import prepare_storage, create_storage, create_cache, create_hot_accounts, create_read_snapshot
+from bank.snapshot import SnapshotPublisher
+from network.discovery import DiscoveryResponder
+from network.gossip import Gossiper
+from utils.configurations import LIVE_CONFIG_KEYS
+from workers.worker_manager import WorkerManager, max_worker_index
 
 log = logging.getLogger("BANK")
 
@@ -16,9 +22,28 @@ class Bank:
     def __init__(self, config: dict, log_queue: Queue, manager, security):
         self._config = config
         self._log_queue = log_queue
-        self._shared_memory = manager.dict()
+        self._shared_memory = create_cache(self._config, manager)
         self._shared_lock = manager.Lock()
         self._security = security
+        self._traces = manager.TraceBuffer(self._config.get("trace_buffer_size", 100))
+        self._warmup = manager.dict(state="pending", loaded=0, total=None, duration=None)
+        self._allocator = AccountAllocator()
+        # row 0 is used by primary storage, rows 1.. by workers
+        self._hot_accounts = create_hot_accounts(self._config, max_worker_index(self._config) + 1)
+        self._read_snapshot = create_read_snapshot(self._config)
+        self._snapshot_publisher = None
+        self._responses = self._create_response_cache(manager)
+        proxy_cache_size = self._config.get("proxy_cache_size", 10_000)
+        self._proxy_cache = manager.ProxyCache(proxy_cache_size) if proxy_cache_size else None
+        self._peers = manager.PeerHealth(
+            self._config.get("circuit_failure_threshold", 3),
+            self._config.get("circuit_open_time", 10)
+        )
+        self._membership = manager.Membership(
+            self._config["host"], self._config["port"], self._config.get("gossip_timeout", 10)
+        ) if self._config.get("gossip_enabled", False) else None
+        self._gossiper = None
+        self._discovery = None
 
         self._gateway = Gateway(self._config["host"], self._config["port"])
         self._worker_manager = WorkerManager(
@@ -26,23 +51,41 @@ class Bank:
             self._log_queue,
             self._shared_memory,
             self._shared_lock,
-            self._security
+            self._security,
+            self._traces,
+            self._warmup,
+            self._allocator,
+            self._hot_accounts,
+            self._responses,
+            self._proxy_cache,
+            self._peers,
+            self._membership,
+            self._read_snapshot
         )
 
         self._storage = None
         self._start_time = None
         self._is_open = False
+        self._profile = None
+        self._config_version = 1
+        self._reload_lock = threading.Lock()
 
-        success = prepare_storage_structure(self._config["storage_path"])
-        if not success:
-            exit(1)
-
-        success = load_data_to_shared_memory(self._config["storage_path"], self._shared_memory)
+        success = prepare_storage(self._config, self._shared_memory, self._shared_lock, self._warmup)
         if not success:
             exit(1)
 
         log.info("Bank initialized")
 
+    def _create_response_cache(self, manager):
+        """
+        Creates cache of responses to commands with request ID shared by all workers
+        :return: proxy of the cache or None if it is disabled
+        """
+        capacity = self._config.get("idempotency_cache_size", 10_000)
+        if not capacity:
+            return None
+        return manager.ResponseCache(capacity, self._config.get("idempotency_ttl", 300))
+
     def open_bank(self):
         """
         Bank gets open by accepting clients from gateway (main loop).
@@ -52,12 +95,16 @@ class Bank:
             return
 
         try:
-            self._storage = BankStorage(
-                self._config["storage_path"],
-                self._config["storage_timeout"],
-                self._shared_memory,
-                self._shared_lock
+            self._storage = create_storage(
+                self._config, self._shared_memory, self._shared_lock, self._allocator,
+                is_primary=True, warmup_state=self._warmup, hot_accounts=self._hot_accounts
             )
+            self._allocator.load(account_number for account_number, _ in self._storage.get_accounts())
+            if self._read_snapshot is not None:
+                self._snapshot_publisher = SnapshotPublisher(
+                    self._read_snapshot, self._storage, self._config.get("read_snapshot_interval", 0.2)
+                )
+                self._snapshot_publisher.start()
 
             self._worker_manager.create_workers()
             self._worker_manager.start_workers()
@@ -65,24 +112,47 @@ class Bank:
             server_socket = self._gateway.open()
             if server_socket is None:
                 raise Exception("Failed to open server socket. Gateway returned None.")
+            self._worker_manager.set_accept_queue(self._gateway.get_accept_queue)
 
             self._start_time = time.time()
             self._is_open = True
+            if self._membership is not None:
+                self._gossiper = Gossiper(self._config, self._membership, self._security, self._peers, self._get_summary)
+                self._gossiper.start()
+            if self._config.get("discovery_enabled", False):
+                self._discovery = DiscoveryResponder(self._config, self._get_summary)
+                if not self._discovery.start():
+                    self._discovery = None
             self._start_listening_for_clients(server_socket)
         except BaseException as e:  # fallback
             log.critical(e)
 
+    def _get_summary(self) -> tuple[int, int]:
+        """
+        :return: total amount and client count announced by gossip and UDP discovery
+        """
+        return self._storage.get_total_amount(), self._storage.get_client_count()
+
     def close_bank(self):
         """
-        Closes bank - stops workers, closes gateway and storage
+        Closes bank - stops accepting clients, drains workers (commands in progress are finished), closes storage
         """
 
         if not self._is_open:
             return
 
         log.info("Closing bank...")
-        self._worker_manager.stop_workers()
+        if self._gossiper:
+            self._gossiper.stop()
+            self._gossiper = None
+        if self._discovery:
+            self._discovery.stop()
+            self._discovery = None
         self._gateway.close()
+        self._worker_manager.stop_workers()
+        if self._snapshot_publisher:
+            self._snapshot_publisher.stop()
+            self._snapshot_publisher = None
         if self._storage:
             self._storage.close()
         self._is_open = False
@@ -102,7 +172,8 @@ class Bank:
                 self._worker_manager.distribute_socket(client_socket)
 
             except OSError as e:
-                if e.errno == 10038 or e.errno == 9:
+                # EINVAL is raised on Linux when listener socket was shut down
+                if e.errno in (10038, 9, 22):
                     log.info("Listener socket closed, stopping loop.")
                     break
                 log.error(f"Listener socket error: {e}")
@@ -123,7 +194,17 @@ class Bank:
                 "total_amount": 0,
                 "client_count": 0,
                 "active_connections": 0,
-                "is_open": self._is_open
+                "is_open": self._is_open,
+                "warmup": self.get_warmup_status(),
+                "cache": self._shared_memory.get_stats(),
+                "account_numbers": self._allocator.get_stats(),
+                "hot_accounts": self._hot_accounts.get_stats() if self._hot_accounts else None,
+                "idempotency": self._responses.get_stats() if self._responses else None,
+                "proxy": self._proxy_cache.get_stats() if self._proxy_cache else None,
+                "peers": self._peers.get_stats(),
+                "gossip": self._membership.get_stats() if self._membership else None,
+                "snapshot": self._read_snapshot.get_stats() if self._read_snapshot else None,
+                "workers": self._worker_manager.get_worker_stats()
             }
 
         return {
@@ -131,9 +212,81 @@ class Bank:
             "total_amount": self._storage.get_total_amount(),
             "client_count": self._storage.get_client_count(),
             "active_connections": self._worker_manager.get_active_connections_count(),
-            "is_open": self._is_open
+            "is_open": self._is_open,
+            "warmup": self.get_warmup_status(),
+            "cache": self._shared_memory.get_stats(),
+            "account_numbers": self._allocator.get_stats(),
+            "hot_accounts": self._hot_accounts.get_stats() if self._hot_accounts else None,
+            "idempotency": self._responses.get_stats() if self._responses else None,
+            "proxy": self._proxy_cache.get_stats() if self._proxy_cache else None,
+            "peers": self._peers.get_stats(),
+            "gossip": self._membership.get_stats() if self._membership else None,
+            "snapshot": self._read_snapshot.get_stats() if self._read_snapshot else None,
+            "workers": self._worker_manager.get_worker_stats()
+        }
+
+    def reload_config(self, config: dict) -> dict:
+        """
+        Applies reloaded configuration, changed live keys (LIVE_CONFIG_KEYS) are published to workers,
+        changes of other keys are reported and need restart of the bank.
+        :param config: validated configuration
+        :return: dictionary with new version, applied keys, keys that need restart and number of updated workers
+        """
+        with self._reload_lock:
+            keys = (set(config) | set(self._config)) - {"bank_code"}
+            changed = sorted(key for key in keys if config.get(key) != self._config.get(key))
+            live = {key: config[key] for key in changed if key in LIVE_CONFIG_KEYS and key in config}
+            restart_required = [key for key in changed if key not in live]
+
+            if restart_required:
+                log.warning(f"Changed configuration keys need restart: {', '.join(restart_required)}")
+
+            workers = 0
+            if live:
+                self._config_version += 1
+                workers = self._worker_manager.publish_config(live, self._config_version)
+                if "ban_duration" in live:
+                    self._security.BAN_DURATION = live["ban_duration"]
+                log.info(f"Configuration version {self._config_version} applied to {workers} workers: {', '.join(live)}")
+
+        return {
+            "version": self._config_version,
+            "applied": sorted(live),
+            "restart_required": restart_required,
+            "workers": workers
         }
 
+    def get_config(self) -> dict:
+        """
+        :return: dictionary with configuration version and current configuration
+        """
+        return {"version": self._config_version, "config": dict(self._config)}
+
+    def restart_workers(self) -> int:
+        """
+        Replaces all workers one by one without closing the listener (rolling restart)
+        :return: number of replaced workers
+        """
+        if not self._is_open:
+            return 0
+        return self._worker_manager.restart_workers()
+
+    def get_workers(self) -> dict:
+        """
+        Gets worker pool with recent autoscaling events
+        :return: dictionary with workers, limits, restarts and events
+        """
+        workers = self._worker_manager.get_worker_stats()
+        workers["events"] = self._worker_manager.get_scaling_events()
+        return workers
+
+    def get_warmup_status(self) -> dict:
+        """
+        Gets progress of cache warm-up
+        :return: dictionary with state (pending, running, done, failed), loaded and total accounts and duration
+        """
+        return dict(self._warmup)
+
     #deprecated
     def get_all_accounts(self) -> list:
         """
@@ -143,32 +296,19 @@ class Bank:
         if not self._storage:
             return []
 
-        accounts = []
-        with self._shared_lock:
-            for account_number, balance in self._shared_memory.items():
-                accounts.append({
-                    "account_number": account_number,
-                    "bank_code": self._config.get('bank_code', 'N/A'),
-                    "balance": balance
-                })
-
-        return accounts
+        return self.get_accounts_paged(0, None)
 
-    def get_accounts_paged(self, offset: int, limit: int) -> list:
+    def get_accounts_paged(self, offset: int, limit: int | None) -> list:
         """
-        Gets a subset of accounts based on parameters,
+        Gets a subset of accounts based on parameters, accounts are read from storage (cache may not hold all of them)
         :param offset: number of items to skip
-        :param limit: max number of items to return
+        :param limit: max number of items to return, None for all
         :return: list of dictionaries with account info
         """
         if not self._storage:
             return []
 
-        with self._shared_lock:
-            snapshot = list(self._shared_memory.items())
-
-        snapshot.sort(key=lambda x: x[0])
-        paged_items = snapshot[offset: offset + limit]
+        paged_items = self._storage.get_accounts(offset, limit)
 
         accounts = []
         bank_code = self._config.get('bank_code', 'N/A')
@@ -182,6 +322,26 @@ class Bank:
 
         return accounts
 
+    def create_accounts(self, count: int) -> list:
+        """
+        Creates many accounts at once
+        :param count: number of accounts
+        :return: list of new account numbers
+        """
+        if not self._storage or not self._is_open:
+            return []
+
+        return self._storage.create_accounts(count)
+
+    def get_bulk_create_limit(self) -> int:
+        """
+        :return: max number of accounts created at once
+        """
+        return self._config.get("bulk_create_limit", 10_000)
+
+    def get_bank_code(self) -> str:
+        return self._config.get('bank_code', 'N/A')
+
     def get_accounts_count(self) -> int:
         """
         Gets the total number of active accounts.
@@ -189,8 +349,39 @@ class Bank:
         if not self._storage:
             return 0
 
-        with self._shared_lock:
-            return len(self._shared_memory)
+        return self._storage.get_client_count()
+
+    def get_traces(self) -> list:
+        """
+        Gets recent request traces collected by workers
+        :return: list of trace records, newest first
+        """
+        return self._traces.get_all()
+
+    def start_profiling(self, interval: float) -> int:
+        """
+        Starts sampling profiler in all workers
+        :param interval: sampling interval in seconds
+        :return: number of workers that started sampling
+        """
+        if not self._is_open:
+            return 0
+        return self._worker_manager.start_profiling(interval)
+
+    def stop_profiling(self, per_worker: bool = False) -> dict:
+        """
+        Stops sampling profiler in all workers, merged result is kept for get_profile
+        :param per_worker: keep stacks of every worker separated
+        :return: profile with merged folded stacks
+        """
+        self._profile = self._worker_manager.stop_profiling(per_worker)
+        return self._profile
+
+    def get_profile(self) -> dict | None:
+        """
+        Gets last collected profile
+        """
+        return self._profile
 
     def get_gateway_address(self) -> str:
         return self._config["host"] + ":" + str(self._config["port"])
@@ -1,192 +1,259 @@
 import logging
 import time
-from threading import Thread
 from dataclasses import dataclass
 import socket
-from multiprocessing import Value
 
+from bank.idempotency import ResponseCache, IDEMPOTENT_CODES, split_request_id
+from bank.proxy import BankProxy
 from bank.security import SecurityGuard
 from commands.factory import CommandFactory
 from commands.parser import parse_command, is_command_for_us, parse_address
-from network.connector import BankConnector
+from logger.tracing import RequestTracer, trace_stage
 
 log = logging.getLogger('WORKER')
 
 @dataclass
 class ClientContext:
-    socket: socket.socket
     config: dict
     factory: CommandFactory
-    active_connections: Value
     security: SecurityGuard
+    tracer: RequestTracer
+    proxy: BankProxy
+    responses: ResponseCache | None = None
 
-class ClientConnection(Thread):
+class ClientContextHolder:
     """
-    Client class (thread)
+    Current client context of worker, configuration reload replaces it with a new one
     """
 
     def __init__(self, context: ClientContext):
-        super().__init__()
+        self.context = context
 
-        self._socket = context.socket
-        self._configuration = context.config
-        self._factory = context.factory
-        self._active_connections = context.active_connections
-        self._security = context.security
+class ClientConnection:
+    """
+    State of one client connection. Connection does not own a thread, connection manager calls handle
+    from its handler threads when socket has data, so idle connection does not block any thread.
+    Context is taken from holder for every message, so keep-alive connections use reloaded configuration.
+    """
+
+    def __init__(self, client_socket: socket.socket, ip_address: str, holder: ClientContextHolder):
+        self._socket = client_socket
+        self._ip_address = ip_address
+        self._holder = holder
+        self._context = holder.context
+
+        self._request_timestamps = []
+        self._bad_commands_count = 0
 
-        self._MAX_RPM = self._configuration['max_requests_per_minute']
-        self._MAX_BAD_COMMANDS = self._configuration['max_bad_commands']
+        self.last_activity = time.monotonic()
+        self.commands = 0  # handled commands, connection that sent a command uses keep-alive timeout
 
-        self._connector = BankConnector(timeout=self._configuration.get('network_timeout', 5.0))
+        # client_timeout limits sending of responses, waiting for data is limited by idle reaping
+        self._timeout = self._context.config.get('client_timeout', 5)
+        self._socket.settimeout(self._timeout)
 
-        self.daemon = True
+    @property
+    def socket(self) -> socket.socket:
+        return self._socket
 
-    def run(self):
+    @property
+    def ip_address(self) -> str:
+        return self._ip_address
+
+    def handle(self) -> bool:
         """
-        Main client loop, handles data received from socket
+        Receives and handles one message, socket must have data (or be closed by client)
+        :return: False if connection has to be closed
         """
         try:
-            ip_address, port = self._socket.getpeername()
+            return self._handle_message()
         except OSError:
-            log.warning("Client disconnected before handling started.")
-            return
+            # timeout while sending, reset or closed connection
+            return False
+        except Exception as e:
+            log.error(f"Error handling client: {e}", exc_info=True)
+            return False
 
-        request_timestamps = []
-        bad_commands_count = 0
+    def reject(self, response: str) -> bool:
+        """
+        Receives one message and answers it with error without handling it (worker is overloaded).
+        Called from selector thread, so socket is never waited for, client that does not read its responses
+        is disconnected instead.
+        :param response: error response
+        :return: False if connection has to be closed
+        """
+        payload = f"{response}\r\n".encode('utf-8')
+        try:
+            self._socket.setblocking(False)
+            if not self._socket.recv(1024):
+                return False
 
-        with self._active_connections.get_lock():
-            self._active_connections.value += 1
+            self.last_activity = time.monotonic()
+            return self._socket.send(payload) == len(payload)
+        except OSError:
+            # including BlockingIOError, full send buffer means client does not read
+            return False
+        finally:
+            try:
+                self._socket.settimeout(self._timeout)
+            except OSError:
+                pass
 
-        try:
-            client_timeout = self._configuration.get('client_timeout', 5)
-            self._socket.settimeout(client_timeout)
+    def _handle_message(self) -> bool:
+        ip_address = self._ip_address
+
+        data = self._socket.recv(1024)
+        if not data:
+            return False
 
-            while True:
-                data = self._socket.recv(1024)
-                if not data:
-                    break
+        self.last_activity = time.monotonic()
 
-                if self._security.is_banned(ip_address):
-                    self._socket.sendall("ER Banned\r\n".encode('utf-8'))
-                    break
+        # message is handled with one context even if configuration is reloaded meanwhile
+        context = self._context = self._holder.context
+        timeout = context.config.get('client_timeout', 5)
+        if timeout != self._timeout:
+            self._timeout = timeout
+            self._socket.settimeout(timeout)
 
-                now = time.time()
-                request_timestamps = [t for t in request_timestamps if t > now - 60]
-                request_timestamps.append(now)
+        if context.security.is_banned(ip_address):
+            self._socket.sendall("ER Banned\r\n".encode('utf-8'))
+            return False
 
-                if len(request_timestamps) > self._MAX_RPM:
-                    self._security.ban_ip(ip_address)
-                    self._socket.sendall("ER Rate limit exceeded\r\n".encode('utf-8'))
-                    break
+        now = time.time()
+        self._request_timestamps = [t for t in self._request_timestamps if t > now - 60]
+        self._request_timestamps.append(now)
 
-                message = data.decode('utf-8').strip()
-                if not message:
-                    continue
+        if len(self._request_timestamps) > context.config['max_requests_per_minute']:
+            context.security.ban_ip(ip_address)
+            self._socket.sendall("ER Rate limit exceeded\r\n".encode('utf-8'))
+            return False
 
+        message = data.decode('utf-8').strip()
+        if not message:
+            return True
+
+        trace = context.tracer.begin(ip_address, message[:2].upper())
+
+        # request that failed with exception (e.g. while sending) is finished as error, so the trace does not
+        # stay in handler thread, which serves other connections too
+        outcome = "ER"
+        try:
+            with trace_stage("parse"):
                 code, args = parse_command(message)
+                args, request_id, valid_request_id = split_request_id(args)
 
                 is_for_our_bank = is_command_for_us(
-                    self._configuration['host'],
+                    context.config['host'],
                     args[0] if args else None
                 )
 
-                if is_for_our_bank:
-                    try:
-                        cmd = self._factory.create(code, *args)
-                        if cmd is None:
-                            response = "ER Invalid command"
-                            bad_commands_count += 1
-                        else:
-                            response = cmd.execute()
-                            bad_commands_count = max(0, bad_commands_count - 1)
-
-                    except TypeError:
-                        response = "ER invalid arguments"
-                        bad_commands_count += 1
-
-                    except ValueError:
-                        response = "ER argument value error"
-                        bad_commands_count += 1
+            tracked = (valid_request_id and request_id is not None and context.responses is not None
+                       and code in IDEMPOTENT_CODES)
+            replayed = self._claim_request(request_id, code, args) if tracked else None
+            completed = False
+
+            try:
+                if not valid_request_id:
+                    response = "ER Invalid request ID"
+                    self._bad_commands_count += 1
+                elif replayed is not None:
+                    response = replayed
+                elif is_for_our_bank:
+                    response = self._execute(code, args)
+                    # failed command changed nothing, its retry is executed again
+                    completed = not response.startswith("ER")
                 else:
-                    response = self._handle_proxy_request(code, args)
-
-                if bad_commands_count >= self._MAX_BAD_COMMANDS:
-                    self._security.ban_ip(ip_address)
-                    self._socket.sendall("ER Too many errors. \r\n".encode('utf-8'))
-                    break
-
+                    with trace_stage("proxy"):
+                        response = context.proxy.relay(code, args, request_id, ip_address)
+                    # error of proxied command may come from unreachable bank, outcome is unknown
+                    completed = not response.startswith("ER")
+            finally:
+                if tracked and replayed is None:
+                    if completed:
+                        context.responses.complete(ip_address, request_id, response)
+                    else:
+                        context.responses.release(ip_address, request_id)
+
+            if self._bad_commands_count >= context.config['max_bad_commands']:
+                context.security.ban_ip(ip_address)
+                self._socket.sendall("ER Too many errors. \r\n".encode('utf-8'))
+                return False
+
+            with trace_stage("send"):
                 self._socket.sendall(f"{response}\r\n".encode('utf-8'))
 
-        except socket.timeout:
-            pass #log.warning("Client timed out.")
-        except ConnectionResetError:
-            pass #log.warning("Client connection reset.")
-        except Exception as e:
-            log.error(f"Error handling client: {e}", exc_info=True)
+            outcome = response
+            self.commands += 1
+            self.last_activity = time.monotonic()
+            return True
         finally:
-            with self._active_connections.get_lock():
-                self._active_connections.value -= 1
-            self._close_connection()
+            context.tracer.finish(trace, outcome)
 
-    def _handle_proxy_request(self, code: str, args: list) -> str:
+    def _execute(self, code: str, args: list) -> str:
         """
-        Handles proxy requests by relaying commands to another bank.
-        First tries a cached port if available, otherwise scans the configured range.
-        :param code: Command code
-        :param args: List of command arguments
-        :return: Response string from the target bank or an error message
+        Executes command for our bank
+        :return: response
         """
+        try:
+            with trace_stage("factory"):
+                cmd = self._context.factory.create(code, *args)
 
-        if code not in ['AD', 'AW', 'AB']:
-            return "ER Command cannot be proxied"
-
-        if not args:
-            return "ER Missing arguments for proxy request"
-
-        target_ip = args[0].split('/')[-1]
-        original_message = f"{code} {' '.join(args)}".strip()
-
-        scan_config = self._configuration.get('network_scan_port_range', [65525, 65535])
-        port_range = range(scan_config[0], scan_config[1] + 1)
-
-        cached_port = self._security.get_known_port(target_ip)
-        ports_to_try = [cached_port] if cached_port else port_range
+            if cmd is None:
+                self._bad_commands_count += 1
+                return "ER Invalid command"
 
-        for port in ports_to_try:
-            log.debug(f"Relaying {code} to {target_ip}:{port}")
-            response = self._connector.send_command(target_ip, port, original_message)
+            if not self._charge(cmd.cost):
+                return "ER Rate limit exceeded"
 
-            if response and not response.startswith("ER"):
-                self._security.save_known_port(target_ip, port)
-                return response
+            with trace_stage("execute"):
+                response = cmd.execute()
+            self._bad_commands_count = max(0, self._bad_commands_count - 1)
+            return response
 
-            if cached_port and port == cached_port:
-                return self._scan_ports_and_relay(target_ip, original_message)
+        except TypeError:
+            self._bad_commands_count += 1
+            return "ER invalid arguments"
 
-        return "ER Target bank unreachable"
+        except ValueError:
+            self._bad_commands_count += 1
+            return "ER argument value error"
 
-    def _scan_ports_and_relay(self, ip: str, message: str) -> str:
+    def _charge(self, cost: int) -> bool:
         """
-        Scans a range of ports on a target IP and relays the message to the first responding port.
-        :param ip: Target IP address to scan
-        :param message: Full command message to relay
-        :return: Response from the discovered bank or error if not found
+        Counts command that costs more than one request (e.g. bulk creation) against rate limit,
+        the request itself was counted already
+        :return: False if command would exceed the limit (it is not executed)
         """
+        if len(self._request_timestamps) + cost - 1 > self._context.config['max_requests_per_minute']:
+            return False
 
-        scan_config = self._configuration.get('network_scan_port_range', [65525, 65535])
-        for port in range(scan_config[0], scan_config[1] + 1):
-            res = self._connector.send_command(ip, port, message)
-            if res and not res.startswith("ER"):
-                self._security.save_known_port(ip, port)
-                return res
-        return "ER Bank not found on any allowed port"
+        self._request_timestamps.extend([self._request_timestamps[-1]] * (cost - 1))
+        return True
 
-    def _close_connection(self):
+    def _claim_request(self, request_id: str, code: str, args: list) -> str | None:
+        """
+        Claims command with request ID in shared response cache
+        :return: response to send without executing the command (original response of retried command
+                 or error), None if command has to be executed
+        """
+        with trace_stage("idempotency"):
+            state, response = self._context.responses.claim(self._ip_address, request_id, f"{code} {' '.join(args)}")
+
+        if state == "done":
+            log.debug(f"Replaying response of request {request_id}")
+            return response
+        if state == "pending":
+            return "ER Request with this ID is still being processed"
+        if state == "conflict":
+            return "ER Request ID was already used for another command"
+        return None
+
+    def close(self):
         """
         Close the socket connection
         """
         try:
             self._socket.close()
-            log.info("Connection closed.")
+            log.debug("Connection closed.")
         except Exception:
             pass
\ No newline at end of file
@@ -0,0 +1,368 @@
+import logging
+import queue
+import selectors
+import socket
+import threading
+import time
+from collections import Counter, deque
+
+from bank.client import ClientConnection, ClientContextHolder
+
+WHEEL_TICK = 0.25  # seconds, precision of idle reaping
+WHEEL_SLOTS = 256
+
+log = logging.getLogger("WORKER")
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel. Item is put into bucket of its deadline and returned when the wheel passes the bucket,
+    so scheduling and expiry are O(1). Item with deadline further than one revolution comes back earlier,
+    caller checks the real deadline and schedules it again.
+    """
+
+    def __init__(self, tick: float, slots: int):
+        self._tick = tick
+        self._buckets = [[] for _ in range(slots)]
+        self._current = int(time.monotonic() / tick)
+
+    def schedule(self, item, deadline: float):
+        """
+        :param deadline: monotonic time
+        """
+        target = max(int(deadline / self._tick), self._current + 1)
+        target = min(target, self._current + len(self._buckets))
+        self._buckets[target % len(self._buckets)].append(item)
+
+    def advance(self, now: float) -> list:
+        """
+        Moves wheel to current time
+        :param now: monotonic time
+        :return: items from passed buckets
+        """
+        items = []
+        target = int(now / self._tick)
+        for _ in range(min(target - self._current, len(self._buckets))):
+            self._current += 1
+            index = self._current % len(self._buckets)
+            if self._buckets[index]:
+                items.extend(self._buckets[index])
+                self._buckets[index] = []
+
+        self._current = max(self._current, target)
+        return items
+
+
+class HandlerPool:
+    """
+    Fixed number of handler threads with bounded queue of waiting tasks. Task that does not fit into the queue
+    is not accepted, caller answers it as overload instead of piling up work.
+    """
+
+    def __init__(self, threads: int, queue_size: int, name: str):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{number}", daemon=True)
+            for number in range(threads)
+        ]
+
+        self._lock = threading.Lock()
+        self._busy = 0
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, function, *args) -> bool:
+        """
+        Queues task for handler thread
+        :return: False if queue is full
+        """
+        try:
+            self._queue.put_nowait((function, args))
+            return True
+        except queue.Full:
+            return False
+
+    def is_saturated(self) -> bool:
+        return self._queue.full()
+
+    def shutdown(self):
+        """
+        Stops handler threads after queued tasks
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def get_stats(self) -> dict:
+        """
+        :return: dictionary with waiting tasks and busy threads
+        """
+        with self._lock:
+            return {"queued": self._queue.qsize(), "busy": self._busy}
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+
+            function, args = task
+            with self._lock:
+                self._busy += 1
+            try:
+                function(*args)
+            except Exception as e:
+                log.error(f"Handler error: {e}", exc_info=True)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+
+class ConnectionManager:
+    """
+    Client connections of one worker. Idle sockets wait in one selector thread, socket with data is handed
+    to a handler pool (client_handler_threads, client_queue_size), handler thread handles one message
+    and returns the socket to the selector. When the queue of the pool is full, message is answered
+    with "ER Server busy" by the selector thread and new connections are refused.
+    Last activity of connections is checked by timer wheel, idle connections are closed after client_timeout
+    (before the first command) or keepalive_timeout. Connections over max_connections_per_worker
+    or max_connections_per_ip (in this worker) are refused.
+    """
+
+    def __init__(self, config: dict, active_connections):
+        self._config = config
+        self._active_connections = active_connections
+
+        self._selector = selectors.DefaultSelector()
+        self._wheel = TimerWheel(WHEEL_TICK, WHEEL_SLOTS)
+        self._handlers = HandlerPool(
+            config.get("client_handler_threads", 32),
+            config.get("client_queue_size", 128),
+            "Client"
+        )
+
+        # used only by selector thread
+        self._idle = set()  # connections registered in selector
+        self._scheduled = set()  # connections with entry in timer wheel
+
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._per_ip = Counter()
+        self._returning = deque()  # handled connections waiting to be registered in selector again
+        self._rejected = 0  # messages and connections answered with "ER Server busy"
+        self._stopping = False
+
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+
+        self._thread = None
+
+    def start(self):
+        self._handlers.start()
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, name="ConnectionManager", daemon=True)
+        self._thread.start()
+
+    def add(self, client_socket: socket.socket, holder: ClientContextHolder) -> bool:
+        """
+        Adds new client socket
+        :param client_socket: socket received from bank process
+        :param holder: holder of current context of client commands
+        :return: False if connection was refused (over limit) or client already disconnected
+        """
+        try:
+            ip_address = client_socket.getpeername()[0]
+        except OSError:
+            log.warning("Client disconnected before handling started.")
+            client_socket.close()
+            return False
+
+        refused = None
+        with self._lock:
+            if self._stopping:
+                refused = "ER Server is shutting down"
+            elif len(self._connections) >= self._config.get("max_connections_per_worker", 1000):
+                refused = "ER Too many connections"
+            elif self._per_ip[ip_address] >= self._config.get("max_connections_per_ip", 100):
+                refused = "ER Too many connections from your address"
+            elif self._handlers.is_saturated():
+                refused = "ER Server busy"
+            else:
+                connection = ClientConnection(client_socket, ip_address, holder)
+                self._connections.add(connection)
+                self._per_ip[ip_address] += 1
+
+        if refused:
+            if refused == "ER Server busy":
+                self._count_rejected()
+            log.debug(f"Connection from {ip_address} refused: {refused}")
+            try:
+                client_socket.sendall(f"{refused}\r\n".encode('utf-8'))
+            except OSError:
+                pass
+            client_socket.close()
+            return False
+
+        with self._active_connections.get_lock():
+            self._active_connections.value += 1
+
+        self._return(connection)
+        return True
+
+    def stop(self):
+        """
+        Stops accepting connections, idle connections are closed immediately, others after their current message
+        """
+        with self._lock:
+            self._stopping = True
+        self._wake()
+
+    def count(self) -> int:
+        return len(self._connections)
+
+    def get_stats(self) -> dict:
+        """
+        :return: dictionary with messages waiting for handler, busy handlers and rejected messages
+        """
+        with self._lock:
+            return {**self._handlers.get_stats(), "rejected": self._rejected}
+
+    def _count_rejected(self):
+        with self._lock:
+            self._rejected += 1
+
+    def _return(self, connection: ClientConnection):
+        self._returning.append(connection)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wakeup_writer.send(b"\0")
+        except OSError:
+            # buffer is full, selector is going to wake up anyway
+            pass
+
+    def _run(self):
+        """
+        Selector loop - dispatches sockets with data, registers returned sockets and reaps idle connections
+        """
+        while True:
+            try:
+                if self._poll():
+                    break
+            except Exception as e:
+                log.error(f"Connection manager error: {e}", exc_info=True)
+
+        self._selector.close()
+        self._handlers.shutdown()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
+
+    def _poll(self) -> bool:
+        """
+        One round of selector loop
+        :return: True when manager is stopped and all connections are closed
+        """
+        for key, _ in self._selector.select(WHEEL_TICK):
+            if key.data is None:
+                self._drain_wakeups()
+                continue
+
+            connection = key.data
+            self._unregister(connection)
+            if not self._handlers.submit(self._handle, connection):
+                self._reject(connection)
+
+        while self._returning:
+            connection = self._returning.popleft()
+            if self._stopping:
+                self._close(connection)
+                continue
+
+            self._selector.register(connection.socket, selectors.EVENT_READ, connection)
+            self._idle.add(connection)
+            if connection not in self._scheduled:
+                self._scheduled.add(connection)
+                self._wheel.schedule(connection, connection.last_activity + self._idle_timeout(connection))
+
+        now = time.monotonic()
+        for connection in self._wheel.advance(now):
+            self._check_idle(connection, now)
+
+        if self._stopping:
+            for connection in list(self._idle):
+                self._unregister(connection)
+                self._close(connection)
+
+            with self._lock:
+                return not self._connections
+
+        return False
+
+    def _handle(self, connection: ClientConnection):
+        """
+        Handles one message in handler thread
+        """
+        if connection.handle():
+            self._return(connection)
+        else:
+            self._close(connection)
+
+    def _reject(self, connection: ClientConnection):
+        """
+        Answers message with "ER Server busy" in selector thread, connection stays open so client can retry
+        """
+        if connection.reject("ER Server busy"):
+            self._count_rejected()
+            self._returning.append(connection)
+        else:
+            self._close(connection)
+
+    def _check_idle(self, connection: ClientConnection, now: float):
+        """
+        Closes connection that is idle too long, connection being handled is scheduled again when it returns
+        """
+        self._scheduled.discard(connection)
+        if connection not in self._idle:
+            return
+
+        deadline = connection.last_activity + self._idle_timeout(connection)
+        if deadline <= now:
+            self._unregister(connection)
+            self._close(connection)
+            return
+
+        self._scheduled.add(connection)
+        self._wheel.schedule(connection, deadline)
+
+    def _idle_timeout(self, connection: ClientConnection) -> float:
+        if connection.commands:
+            return self._config.get("keepalive_timeout", 60)
+        return self._config.get("client_timeout", 5)
+
+    def _unregister(self, connection: ClientConnection):
+        self._idle.discard(connection)
+        self._selector.unregister(connection.socket)
+
+    def _close(self, connection: ClientConnection):
+        connection.close()
+
+        with self._lock:
+            if connection not in self._connections:
+                return
+            self._connections.remove(connection)
+            self._per_ip[connection.ip_address] -= 1
+            if not self._per_ip[connection.ip_address]:
+                del self._per_ip[connection.ip_address]
+
+        with self._active_connections.get_lock():
+            self._active_connections.value -= 1
+
+    def _drain_wakeups(self):
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
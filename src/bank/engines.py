@@ -0,0 +1,135 @@
+import logging
+import multiprocessing.managers as managers
+import threading
+
+from bank.allocator import AccountAllocator
+from bank.hot_accounts import HotAccounts
+from bank.journal import JournalStorage, recover_journal_storage
+from bank.snapshot import ReadSnapshot
+from bank.storages import BalanceCache, BankStorage, SQLiteStorage, CACHE_POLICIES, prepare_storage_structure, \
+    load_data_to_shared_memory
+
+STORAGE_ENGINES = ("sqlite", "journal")
+WARMUP_MODES = ("blocking", "background")
+HOT_ACCOUNT_SLOTS = 64
+
+log = logging.getLogger("SYSTEM")
+
+
+def create_hot_accounts(config: dict, rows: int) -> HotAccounts | None:
+    """
+    Creates shared table of hot accounts if deposit aggregation is enabled
+    :param config: bank configuration
+    :param rows: number of processes that deposit (workers + primary storage)
+    :return: hot accounts table or None
+    """
+    if not config.get("hot_accounts", False):
+        return None
+    return HotAccounts(rows, HOT_ACCOUNT_SLOTS)
+
+
+def create_read_snapshot(config: dict) -> ReadSnapshot | None:
+    """
+    Creates shared read snapshot if snapshot reads are enabled
+    :param config: bank configuration
+    :return: read snapshot or None
+    """
+    if not config.get("read_snapshot", False):
+        return None
+    return ReadSnapshot()
+
+
+def create_cache(config: dict, manager) -> BalanceCache:
+    """
+    Creates shared cache of configured policy in manager process
+    :param config: bank configuration
+    :param manager: started SharedManager
+    :return: proxy of the cache
+    """
+    policy = config.get("cache_policy", "full")
+    factory = getattr(manager, CACHE_POLICIES[policy].__name__)
+
+    if policy == "full":
+        return factory()
+    return factory(config.get("cache_capacity", 100_000))
+
+
+def prepare_storage(config: dict, shared_memory: BalanceCache, shared_lock=None,
+                    warmup_state: managers.DictProxy | None = None) -> bool:
+    """
+    Prepares storage of configured engine and loads accounts into shared cache (bounded cache up to its capacity).
+    With background cache warm-up (sqlite engine only) accounts are loaded by a thread after this function returns.
+    :param config: bank configuration
+    :param shared_memory: shared cache object
+    :param shared_lock: lock shared by all storages
+    :param warmup_state: shared dictionary with warm-up progress
+    :return: true if storage is ready
+    """
+    if config.get("storage_engine", "sqlite") == "journal":
+        # journal is recovered from snapshot into memory, there is nothing to read through
+        success = recover_journal_storage(config["storage_path"], shared_memory)
+        if warmup_state is not None:
+            warmup_state.update(state="done" if success else "failed", loaded=shared_memory.size())
+        return success
+
+    shards = config.get("storage_shards", 1)
+    if not prepare_storage_structure(config["storage_path"], shards):
+        return False
+
+    chunk_size = config.get("cache_warmup_chunk_size", 5000)
+    max_accounts = config.get("cache_capacity", 100_000) if shared_memory.is_bounded() else None
+
+    if config.get("cache_warmup", "blocking") == "background" and warmup_state is not None:
+        warmup_state.update(state="pending")
+        threading.Thread(
+            target=load_data_to_shared_memory,
+            args=(config["storage_path"], shared_memory, chunk_size, shared_lock, warmup_state, max_accounts, shards),
+            name="CacheWarmup",
+            daemon=True
+        ).start()
+        log.info("Cache warm-up started in background")
+        return True
+
+    return load_data_to_shared_memory(
+        config["storage_path"], shared_memory, chunk_size, shared_lock, warmup_state, max_accounts, shards
+    )
+
+
+def create_storage(config: dict, shared_cache: BalanceCache, shared_lock, allocator: AccountAllocator,
+                   is_primary: bool = False, warmup_state: managers.DictProxy | None = None,
+                   hot_accounts: HotAccounts | None = None, worker_index: int = 0) -> BankStorage:
+    """
+    Creates storage of configured engine for current process
+    :param config: bank configuration
+    :param shared_cache: shared cache object
+    :param shared_lock: lock shared by all storages
+    :param allocator: account number allocator shared by all storages
+    :param is_primary: storage of the main bank process, it runs engine maintenance (journal snapshots)
+    :param warmup_state: shared dictionary with warm-up progress, storage reads through to disk until warm-up is done
+    :param hot_accounts: shared table of hot accounts (sqlite engine), None disables deposit aggregation
+    :param worker_index: row of this process in hot accounts table (0 for primary storage)
+    :return: new storage
+    """
+    if config.get("storage_engine", "sqlite") == "journal":
+        return JournalStorage(
+            config["storage_path"],
+            config.get("journal_fsync_interval", 0.002),
+            shared_cache,
+            shared_lock,
+            allocator,
+            snapshot_interval=config.get("journal_snapshot_interval", 60) if is_primary else None
+        )
+
+    return SQLiteStorage(
+        config["storage_path"],
+        config["storage_timeout"],
+        shared_cache,
+        shared_lock,
+        allocator,
+        warmup_state,
+        hot_accounts=hot_accounts,
+        hot_row=worker_index,
+        hot_threshold=config.get("hot_account_threshold", 50),
+        flush_interval=config.get("hot_account_flush_interval", 0.05),
+        shards=config.get("storage_shards", 1)
+    )
@@ -1,8 +1,12 @@
 import logging
 import socket
+import struct
 
 log = logging.getLogger("SYSTEM")
 
+TCP_INFO_SIZE = 104
+TCP_INFO_UNACKED_OFFSET = 24  # tcpi_unacked, accept queue length of listening socket on Linux
+
 class Gateway:
     """
     Gateway provides server socket
@@ -31,8 +35,26 @@ class Gateway:
         log.info(f"Server is listening at {self._host}:{self._port}")
         return self._server_socket
 
+    def get_accept_queue(self) -> int | None:
+        """
+        Gets number of connections waiting in accept queue of server socket (Linux only)
+        :return: queue length or None if it cannot be read
+        """
+        if self._server_socket is None or not hasattr(socket, "TCP_INFO"):
+            return None
+
+        try:
+            info = self._server_socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_SIZE)
+        except OSError:
+            return None
+        return struct.unpack_from("I", info, TCP_INFO_UNACKED_OFFSET)[0]
+
     def close(self):
         """
-        Closes socket
+        Closes socket, shutdown wakes up thread blocked in accept
         """
+        try:
+            self._server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
         self._server_socket.close()
\ No newline at end of file
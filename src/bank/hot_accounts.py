@@ -0,0 +1,160 @@
+import ctypes
+import time
+from multiprocessing import Array, Lock, Value
+
+
+class HotAccounts:
+    """
+    Shared table of hot accounts (accounts receiving many deposits) with pending deposit deltas.
+    Every process (row) adds deposits only to its own row under its row lock, so deposits to hot accounts
+    do not wait for shared lock or SQLite. Deltas are folded into storage under shared lock, so sum of
+    stored balance and pending deltas (merged balance) is consistent for anyone holding shared lock.
+    Deltas live in shared memory, deposits of crashed worker are still folded by others.
+    """
+
+    def __init__(self, rows: int, slots: int):
+        self._rows = rows
+        self._slots = slots
+
+        self._accounts = Array('i', slots, lock=False)  # 0 = free slot
+        self._last_used = Array('d', slots, lock=False)
+        self._deltas = Array(ctypes.c_longlong, rows * slots, lock=False)
+        self._row_locks = [Lock() for _ in range(rows)]
+        self._version = Value('i', 0, lock=False)
+
+        self._local_version = -1
+        self._local_slots = {}
+
+    def slot_of(self, account_number: str) -> int | None:
+        """
+        Finds slot of hot account, mapping is rebuilt in this process only when table changed
+        :return: slot or None if account is not hot
+        """
+        if self._local_version != self._version.value:
+            self._local_version = self._version.value
+            self._local_slots = {account: slot for slot, account in enumerate(self._accounts) if account}
+
+        try:
+            return self._local_slots.get(int(account_number))
+        except ValueError:
+            return None
+
+    def add(self, row: int, slot: int, account_number: str, value: int) -> bool:
+        """
+        Adds deposit to pending delta of this process
+        :return: False if slot no longer belongs to the account (deposit must be stored directly)
+        """
+        with self._row_locks[row]:
+            if self._accounts[slot] != int(account_number):
+                return False
+
+            self._deltas[row * self._slots + slot] += value
+            self._last_used[slot] = time.time()
+            return True
+
+    def pending(self, slot: int) -> int:
+        """
+        :return: sum of pending deltas of all processes for slot
+        """
+        return sum(self._deltas[row * self._slots + slot] for row in range(self._rows))
+
+    def pending_by_account(self) -> dict:
+        """
+        :return: pending deltas of all hot accounts (account number: amount)
+        """
+        return {str(account): self.pending(slot) for slot, account in enumerate(self._accounts) if account}
+
+    def collect(self, slot: int, rows=None) -> dict:
+        """
+        Reads pending deltas of slot, they stay pending until settle is called after they were stored.
+        Shared lock must be held.
+        :param rows: rows to collect, all rows if None
+        :return: dictionary row: amount (rows without delta are skipped)
+        """
+        amounts = {}
+        for row in range(self._rows) if rows is None else rows:
+            with self._row_locks[row]:
+                amount = self._deltas[row * self._slots + slot]
+            if amount:
+                amounts[row] = amount
+
+        return amounts
+
+    def settle(self, slot: int, amounts: dict):
+        """
+        Removes stored amounts from pending deltas (deposits added meanwhile stay pending). Shared lock must be held.
+        :param amounts: amounts returned by collect
+        """
+        for row, amount in amounts.items():
+            with self._row_locks[row]:
+                self._deltas[row * self._slots + slot] -= amount
+
+    def pending_slots(self, rows=None) -> list:
+        """
+        :param rows: rows to check, all rows if None
+        :return: slots where some of the rows has pending delta
+        """
+        rows = range(self._rows) if rows is None else rows
+        return [
+            slot for slot in range(self._slots)
+            if any(self._deltas[row * self._slots + slot] for row in rows)
+        ]
+
+    def assign(self, account_number: str) -> int | None:
+        """
+        Marks account as hot. Shared lock must be held.
+        :return: slot or None if table is full
+        """
+        account = int(account_number)
+        for slot in range(self._slots):
+            if self._accounts[slot] == account:
+                return slot
+
+        for slot in range(self._slots):
+            if not self._accounts[slot]:
+                self._last_used[slot] = time.time()
+                self._accounts[slot] = account
+                self._version.value += 1
+                return slot
+
+        return None
+
+    def release(self, slot: int) -> bool:
+        """
+        Frees slot if no process has pending delta, deposits are blocked (all row locks) while checking.
+        Shared lock must be held.
+        :return: False if some delta is still pending (it has to be folded first)
+        """
+        for lock in self._row_locks:
+            lock.acquire()
+        try:
+            if self.pending(slot):
+                return False
+
+            self._accounts[slot] = 0
+            self._version.value += 1
+            return True
+        finally:
+            for lock in self._row_locks:
+                lock.release()
+
+    def idle_slots(self, idle_time: float) -> list:
+        """
+        :return: slots of hot accounts without deposit for idle_time seconds
+        """
+        limit = time.time() - idle_time
+        return [
+            slot for slot in range(self._slots)
+            if self._accounts[slot] and self._last_used[slot] < limit
+        ]
+
+    def account_of(self, slot: int) -> str | None:
+        account = self._accounts[slot]
+        return str(account) if account else None
+
+    def get_stats(self) -> dict:
+        """
+        :return: dictionary with hot accounts and their pending deltas
+        """
+        pending = self.pending_by_account()
+        return {"accounts": pending, "pending_total": sum(pending.values())}
@@ -0,0 +1,123 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+IDEMPOTENT_CODES = ("AC", "AP", "AR", "AD", "AW")
+CLAIM_TIMEOUT = 30  # seconds after which unfinished claim (e.g. of crashed worker) can be taken over
+
+_REQUEST_ID = re.compile(r"[A-Za-z0-9_.:-]{1,64}")
+
+
+def split_request_id(args: list) -> tuple[list, str | None, bool]:
+    """
+    Splits optional request ID (last argument in format #<id>) from command arguments
+    :param args: command arguments
+    :return: arguments without request ID, request ID (or None) and False if request ID has invalid format
+    """
+    if not args or not args[-1].startswith("#"):
+        return args, None, True
+
+    request_id = args[-1][1:]
+    return args[:-1], request_id, _REQUEST_ID.fullmatch(request_id) is not None
+
+
+class ResponseCache:
+    """
+    Bounded cache of responses to mutating commands sent with request ID, lives in manager process
+    and is shared by all workers, so retried command returns original response from any worker.
+    Request IDs are scoped to the client (its IP address), the same ID sent by another client is another request.
+    Request is claimed before execution, concurrent duplicate sees the claim instead of executing again.
+    Entries expire after ttl, oldest entries are evicted when cache is full.
+    """
+
+    def __init__(self, capacity: int, ttl: float):
+        self._capacity = capacity
+        self._ttl = ttl
+        self._entries = OrderedDict()  # (client, request ID): [command, response or None, time]
+        self._guard = threading.Lock()
+
+        self._replayed = 0
+        self._conflicts = 0
+        self._evictions = 0
+
+    def claim(self, client: str, request_id: str, command: str) -> tuple[str, str | None]:
+        """
+        Claims request before execution
+        :param client: IP address of client
+        :param request_id: request ID sent by client
+        :param command: command without request ID, same ID with other command is a conflict
+        :return: (state, response) - "claimed" (execute and complete), "done" with original response,
+                 "pending" (executed by someone else right now) or "conflict"
+        """
+        key = (client, request_id)
+        now = time.monotonic()
+        with self._guard:
+            self._expire(now)
+
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is None and now - entry[2] > CLAIM_TIMEOUT):
+                self._entries[key] = [command, None, now]
+                self._entries.move_to_end(key)
+                self._evict()
+                return "claimed", None
+
+            if entry[0] != command:
+                self._conflicts += 1
+                return "conflict", None
+
+            if entry[1] is None:
+                return "pending", None
+
+            self._replayed += 1
+            return "done", entry[1]
+
+    def complete(self, client: str, request_id: str, response: str):
+        """
+        Stores response of claimed request, ttl starts now
+        """
+        key = (client, request_id)
+        with self._guard:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = [entry[0], response, time.monotonic()]
+
+    def release(self, client: str, request_id: str):
+        """
+        Drops claim of request whose result is unknown (it was not executed or target bank did not answer),
+        so retry is executed again
+        """
+        key = (client, request_id)
+        with self._guard:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is None:
+                del self._entries[key]
+
+    def get_stats(self) -> dict:
+        """
+        :return: dictionary with cached responses, replayed responses, conflicts and evictions
+        """
+        with self._guard:
+            self._expire(time.monotonic())
+            return {
+                "size": len(self._entries),
+                "capacity": self._capacity,
+                "replayed": self._replayed,
+                "conflicts": self._conflicts,
+                "evictions": self._evictions,
+            }
+
+    def _expire(self, now: float):
+        """
+        Removes expired entries, entries are ordered by time, so only the oldest are checked
+        """
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry[2] <= max(self._ttl, CLAIM_TIMEOUT if entry[1] is None else 0):
+                break
+            del self._entries[key]
+
+    def _evict(self):
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
+            self._evictions += 1
@@ -0,0 +1,482 @@
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from bank.storages import BalanceCache, BankStorage
+from logger.tracing import trace_stage
+
+if TYPE_CHECKING:
+    from bank.allocator import AccountAllocator
+
+log = logging.getLogger("STORAGE")
+
+JOURNAL_MAGIC = b"BNKJ"
+SNAPSHOT_MAGIC = b"BNKS"
+SNAPSHOT_VERSION = 1
+
+# magic, generation
+JOURNAL_HEADER = struct.Struct("<4sQ")
+# crc32 of the rest, operation, account number, amount
+JOURNAL_RECORD = struct.Struct("<IcIq")
+RECORD_BODY = struct.Struct("<cIq")
+# magic, version, journal generation, journal offset, number of accounts
+SNAPSHOT_HEADER = struct.Struct("<4sHQQI")
+SNAPSHOT_ENTRY = struct.Struct("<Iq")
+SNAPSHOT_TRAILER = struct.Struct("<I")
+
+OP_CREATE = b"C"
+OP_REMOVE = b"R"
+OP_DEPOSIT = b"D"
+OP_WITHDRAW = b"W"
+
+
+def get_journal_paths(storage_path: str) -> tuple:
+    """
+    Journal engine keeps its files next to configured storage path
+    :param storage_path: configured storage path
+    :return: journal path, snapshot path
+    """
+    path = Path(storage_path)
+    return str(path.with_suffix(".journal")), str(path.with_suffix(".snapshot"))
+
+
+def _fsync_directory(path: str):
+    """
+    Makes rename durable, not supported on Windows
+    """
+    if os.name != "posix":
+        return
+
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_atomically(path: str, data: bytes):
+    """
+    Writes file through temporary file and rename, so readers see either old or new content.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp_path, path)
+    _fsync_directory(path)
+
+
+def write_snapshot(snapshot_path: str, balances: dict, generation: int, offset: int):
+    """
+    Writes compact binary snapshot of all balances
+    :param snapshot_path: snapshot file path
+    :param balances: account number (str) -> balance
+    :param generation: generation of journal the snapshot belongs to
+    :param offset: journal offset, records before it are included in snapshot
+    """
+    parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, generation, offset, len(balances))]
+    parts.extend(SNAPSHOT_ENTRY.pack(int(account), balance) for account, balance in balances.items())
+
+    data = b"".join(parts)
+    _write_atomically(snapshot_path, data + SNAPSHOT_TRAILER.pack(zlib.crc32(data)))
+
+
+def read_snapshot(snapshot_path: str) -> tuple | None:
+    """
+    Reads snapshot and verifies its checksum
+    :param snapshot_path: snapshot file path
+    :return: (balances, generation, offset) or None if there is no valid snapshot
+    """
+    try:
+        with open(snapshot_path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return None
+
+    if len(data) < SNAPSHOT_HEADER.size + SNAPSHOT_TRAILER.size:
+        log.error("Snapshot is truncated, ignoring it")
+        return None
+
+    body, trailer = data[:-SNAPSHOT_TRAILER.size], data[-SNAPSHOT_TRAILER.size:]
+    if zlib.crc32(body) != SNAPSHOT_TRAILER.unpack(trailer)[0]:
+        log.error("Snapshot checksum does not match, ignoring it")
+        return None
+
+    magic, version, generation, offset, count = SNAPSHOT_HEADER.unpack_from(body)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        log.error("Snapshot has unknown format, ignoring it")
+        return None
+
+    balances = {
+        str(account): balance
+        for account, balance in SNAPSHOT_ENTRY.iter_unpack(body[SNAPSHOT_HEADER.size:])
+    }
+    if len(balances) != count:
+        log.error("Snapshot is inconsistent, ignoring it")
+        return None
+
+    return balances, generation, offset
+
+
+def replay_journal(journal_path: str, balances: dict, generation: int, offset: int) -> int:
+    """
+    Applies journal records to balances. Replay stops at first torn or corrupted record.
+    :param journal_path: journal file path
+    :param balances: balances loaded from snapshot, modified in place
+    :param generation: generation from snapshot, journal of other generation is already included in snapshot
+    :param offset: offset from snapshot
+    :return: number of replayed records
+    """
+    try:
+        with open(journal_path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return 0
+
+    if len(data) < JOURNAL_HEADER.size:
+        return 0
+
+    magic, journal_generation = JOURNAL_HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC:
+        log.error("Journal has unknown format, ignoring it")
+        return 0
+
+    if journal_generation != generation:
+        # journal was compacted into snapshot but not replaced yet
+        return 0
+
+    position = max(offset, JOURNAL_HEADER.size)
+    replayed = 0
+
+    while position + JOURNAL_RECORD.size <= len(data):
+        checksum, operation, account, amount = JOURNAL_RECORD.unpack_from(data, position)
+        if zlib.crc32(data[position + 4:position + JOURNAL_RECORD.size]) != checksum:
+            break
+
+        _apply(balances, operation, str(account), amount)
+        position += JOURNAL_RECORD.size
+        replayed += 1
+
+    if position < len(data):
+        log.warning(f"Journal has {len(data) - position} bytes of torn or corrupted records, they were discarded")
+
+    return replayed
+
+
+def _apply(balances: dict, operation: bytes, account: str, amount: int):
+    if operation == OP_CREATE:
+        balances[account] = 0
+    elif operation == OP_REMOVE:
+        balances.pop(account, None)
+    elif operation == OP_DEPOSIT:
+        balances[account] = balances.get(account, 0) + amount
+    elif operation == OP_WITHDRAW:
+        balances[account] = balances.get(account, 0) - amount
+
+
+def recover_journal_storage(storage_path: str, shared_memory: BalanceCache) -> bool:
+    """
+    Loads snapshot, replays journal into shared memory and compacts both into new snapshot with empty journal.
+    Compaction is crash safe: new snapshot points to new journal generation, so old journal is never replayed twice.
+    :param storage_path: configured storage path
+    :param shared_memory: shared cache object, it must hold every account (full policy)
+    :return: true if successfully loaded
+    """
+    journal_path, snapshot_path = get_journal_paths(storage_path)
+    start = time.perf_counter()
+
+    try:
+        snapshot = read_snapshot(snapshot_path)
+        if snapshot is None:
+            if os.path.exists(snapshot_path) or os.path.exists(journal_path):
+                log.critical("Snapshot is missing or damaged, refusing to start with partial data")
+                return False
+            balances, generation, offset = {}, 0, 0
+        else:
+            balances, generation, offset = snapshot
+
+        replayed = replay_journal(journal_path, balances, generation, offset)
+
+        new_generation = generation + 1
+        write_snapshot(snapshot_path, balances, new_generation, JOURNAL_HEADER.size)
+        _write_atomically(journal_path, JOURNAL_HEADER.pack(JOURNAL_MAGIC, new_generation))
+
+        shared_memory.update(balances)
+
+    except OSError as e:
+        log.critical(f"Could not recover journal storage: {e}")
+        return False
+
+    log.info(
+        f"Journal storage recovered {len(balances)} accounts, replayed {replayed} records "
+        f"in {time.perf_counter() - start:.3f} s"
+    )
+    return True
+
+
+class JournalStorage(BankStorage):
+    """
+    Storage where shared cache is the authoritative copy of balances (cache must use full policy). Every mutation is appended to journal
+    (all processes append to one file) and fsync is batched - writers wait until a background thread syncs
+    journal, so one fsync covers all mutations from that interval. Primary storage also writes periodic snapshots.
+    """
+
+    def __init__(self, storage_path: str, fsync_interval: float, shared_cache: BalanceCache, shared_lock,
+                 allocator: 'AccountAllocator', snapshot_interval: float | None = None):
+        super().__init__(shared_cache, shared_lock, allocator)
+        self._journal_path, self._snapshot_path = get_journal_paths(storage_path)
+        self._fsync_interval = fsync_interval
+
+        self._fd = os.open(self._journal_path, os.O_WRONLY | os.O_APPEND | getattr(os, "O_BINARY", 0))
+        with open(self._journal_path, "rb") as file:
+            self._generation = JOURNAL_HEADER.unpack(file.read(JOURNAL_HEADER.size))[1]
+
+        self._sync_condition = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._sync_error = None
+        self._closed = False
+
+        self._sync_thread = threading.Thread(target=self._sync_loop, name="JournalSync", daemon=True)
+        self._sync_thread.start()
+
+        self._snapshot_interval = snapshot_interval
+        self._snapshot_stop = threading.Event()
+        self._snapshot_thread = None
+        if snapshot_interval:
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name="JournalSnapshot", daemon=True)
+            self._snapshot_thread.start()
+
+    def _append(self, operation: bytes, account_number: str, value: int) -> int:
+        """
+        Appends record to journal, shared lock must be held so journal order matches cache order.
+        :return: sequence number to wait for with _wait_durable
+        """
+        return self._append_many([(operation, account_number, value)])
+
+    def _append_many(self, records: list) -> int:
+        """
+        Appends records (operation, account number, value) to journal with one write, shared lock must be held.
+        :return: sequence number to wait for with _wait_durable
+        """
+        data = bytearray()
+        for operation, account_number, value in records:
+            body = RECORD_BODY.pack(operation, int(account_number), value)
+            data += struct.pack("<I", zlib.crc32(body)) + body
+
+        with trace_stage("journal"):
+            os.write(self._fd, data)
+
+        with self._sync_condition:
+            self._written += 1
+            self._sync_condition.notify_all()
+            return self._written
+
+    def _wait_durable(self, sequence: int):
+        """
+        Waits until record is synced to disk
+        """
+        with trace_stage("fsync"), self._sync_condition:
+            while self._synced < sequence and self._sync_error is None:
+                self._sync_condition.wait()
+
+            if self._sync_error is not None:
+                raise self._sync_error
+
+    def _sync_loop(self):
+        while True:
+            with self._sync_condition:
+                while self._written == self._synced and not self._closed:
+                    self._sync_condition.wait()
+
+                if self._closed and self._written == self._synced:
+                    return
+
+            # let more writers join this fsync
+            if self._fsync_interval:
+                time.sleep(self._fsync_interval)
+
+            with self._sync_condition:
+                target = self._written
+
+            try:
+                os.fsync(self._fd)
+                error = None
+            except OSError as e:
+                log.critical(f"Journal fsync failed: {e}")
+                error = e
+
+            with self._sync_condition:
+                self._synced = max(self._synced, target)
+                self._sync_error = error
+                self._sync_condition.notify_all()
+
+            if error is not None:
+                return
+
+    def _snapshot_loop(self):
+        while not self._snapshot_stop.wait(self._snapshot_interval):
+            self.snapshot()
+
+    def snapshot(self) -> bool:
+        """
+        Writes snapshot of current balances, so startup replays only journal records written after it.
+        :return: true if snapshot was written
+        """
+        try:
+            with self._locked():
+                offset = os.fstat(self._fd).st_size
+                balances = self._cache.snapshot()
+
+            write_snapshot(self._snapshot_path, balances, self._generation, offset)
+            log.info(f"Journal snapshot written with {len(balances)} accounts")
+            return True
+        except OSError as e:
+            log.error(f"Could not write journal snapshot: {e}")
+            return False
+
+    def create_account(self) -> str | None:
+        # allocator is loaded from cache, which is authoritative, so reserved number is never used
+        candidate = self._allocator.reserve()
+        if candidate is None:
+            log.warning("No free account number left")
+            return None
+
+        try:
+            with self._locked():
+                sequence = self._append(OP_CREATE, candidate, 0)
+                self._cache.put(candidate, 0)
+
+            self._wait_durable(sequence)
+            return candidate
+
+        except (OSError, struct.error) as e:
+            self._allocator.release(candidate)
+            log.error(f"Error while creating account: {e}")
+            return None
+
+    def create_accounts(self, count: int) -> list:
+        candidates = self._allocator.reserve_many(count)
+        if not candidates:
+            return []
+
+        try:
+            with self._locked():
+                sequence = self._append_many([(OP_CREATE, number, 0) for number in candidates])
+                self._cache.update({number: 0 for number in candidates})
+
+            self._wait_durable(sequence)
+            return candidates
+
+        except (OSError, struct.error) as e:
+            for number in candidates:
+                self._allocator.release(number)
+            log.error(f"Error while creating accounts: {e}")
+            return []
+
+    def remove_account(self, account_number: str) -> str:
+        try:
+            with self._locked():
+                if not self._cache.contains(account_number):
+                    return "Account not found"
+
+                sequence = self._append(OP_REMOVE, account_number, 0)
+                self._cache.pop(account_number)
+
+            self._allocator.release(account_number)
+            self._wait_durable(sequence)
+            return ''
+
+        except (OSError, ValueError, struct.error) as e:
+            log.error(f"Error while removing account: {e}")
+            return "Error while removing account"
+
+    def deposit(self, account_number: str, value: int) -> str:
+        try:
+            with self._locked():
+                balance = self._cache.get(account_number)
+                if balance is None:
+                    return "Invalid account number"
+
+                sequence = self._append(OP_DEPOSIT, account_number, value)
+                self._cache.put(account_number, balance + value)
+
+            self._wait_durable(sequence)
+            return ''
+
+        except (OSError, ValueError, struct.error) as e:
+            log.error(f"Error while depositing: {e}")
+            return "Error while depositing"
+
+    def withdraw(self, account_number: str, value: int) -> str:
+        try:
+            with self._locked():
+                balance = self._cache.get(account_number)
+                if balance is None:
+                    return "Account not found"
+                if balance < value:
+                    return "Lack of funds"
+
+                sequence = self._append(OP_WITHDRAW, account_number, value)
+                self._cache.put(account_number, balance - value)
+
+            self._wait_durable(sequence)
+            return ''
+
+        except (OSError, ValueError, struct.error) as e:
+            log.error(f"Error: {e}")
+            return "Database error"
+
+    def get_balance(self, account_number: str) -> int | None:
+        """
+        Gets account balance from shared cache, which is authoritative for this engine.
+        """
+        with trace_stage("cache"):
+            return self._cache.get(account_number)
+
+    def get_total_amount(self) -> int:
+        """
+        Gets total amount in all accounts
+        :return: total amount
+        """
+        with trace_stage("cache"):
+            return sum(self._cache.snapshot().values())
+
+    def get_client_count(self) -> int:
+        """
+        Gets number of clients (accounts)
+        :return: client count
+        """
+        with trace_stage("cache"):
+            return self._cache.size()
+
+    def get_accounts(self, offset: int = 0, limit: int | None = None) -> list:
+        with trace_stage("cache"):
+            accounts = sorted(self._cache.snapshot().items())
+        return accounts[offset:] if limit is None else accounts[offset:offset + limit]
+
+    def close(self):
+        """
+        Syncs pending records, writes last snapshot (primary storage) and closes journal.
+        """
+        if self._closed:
+            return
+
+        self._snapshot_stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self.snapshot()
+
+        with self._sync_condition:
+            self._closed = True
+            self._sync_condition.notify_all()
+        self._sync_thread.join()
+
+        os.close(self._fd)
@@ -0,0 +1,105 @@
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from bank.storages import detect_shards, get_shard_paths, shard_of, prepare_shard_structure
+
+MIGRATION_SUFFIX = ".migrating"
+
+log = logging.getLogger("STORAGE")
+
+
+class MigrationError(Exception):
+    pass
+
+
+def _totals(paths: list) -> tuple[int, int]:
+    """
+    :return: number of accounts and total amount of all files
+    """
+    count = total = 0
+    for path in paths:
+        connection = sqlite3.connect(path)
+        try:
+            rows, amount = connection.execute("select count(*), sum(balance) from accounts").fetchone()
+            count += rows
+            total += amount or 0
+        finally:
+            connection.close()
+    return count, total
+
+
+def migrate_storage(storage_path: str, shards: int, batch_size: int = 10_000) -> dict:
+    """
+    Repartitions sqlite storage (single file or shards) into given number of shards. Accounts are copied into
+    new files, which replace old ones only when number of accounts and total amount match, old files are kept
+    with suffix .<timestamp>.bak. Bank must not run during migration.
+    :param storage_path: configured storage path
+    :param shards: target number of shards
+    :param batch_size: accounts read and written at once
+    :return: dictionary with source and target shards, accounts, total amount, duration and backup files
+    :raises MigrationError: when there is nothing to migrate or copied data do not match
+    """
+    source = detect_shards(storage_path)
+    if not source:
+        raise MigrationError(f"Storage {storage_path} does not exist")
+    if source == shards:
+        raise MigrationError(f"Storage {storage_path} already has {shards} shards")
+
+    start = time.perf_counter()
+    source_paths = get_shard_paths(storage_path, source)
+    target_paths = get_shard_paths(storage_path, shards)
+    temporary_paths = [path + MIGRATION_SUFFIX for path in target_paths]
+
+    for path in temporary_paths:
+        Path(path).unlink(missing_ok=True)
+        if not prepare_shard_structure(path):
+            raise MigrationError(f"Could not create {path}")
+
+    targets = [sqlite3.connect(path) for path in temporary_paths]
+    try:
+        for path in source_paths:
+            connection = sqlite3.connect(path)
+            try:
+                cursor = connection.execute("select account_number, balance from accounts")
+                while rows := cursor.fetchmany(batch_size):
+                    batches = [[] for _ in targets]
+                    for row in rows:
+                        batches[shard_of(row[0], shards)].append(row)
+                    for target, batch in zip(targets, batches):
+                        target.executemany("insert into accounts (account_number, balance) values (?, ?)", batch)
+            finally:
+                connection.close()
+
+        for target in targets:
+            target.commit()
+    finally:
+        for target in targets:
+            target.close()
+
+    expected = _totals(source_paths)
+    copied = _totals(temporary_paths)
+    if expected != copied:
+        for path in temporary_paths:
+            Path(path).unlink(missing_ok=True)
+        raise MigrationError(f"Copied storage does not match (accounts, total): source {expected}, copy {copied}")
+
+    backups = [f"{path}.{time.strftime('%Y%m%d%H%M%S')}.bak" for path in source_paths]
+    for path, backup in zip(source_paths, backups):
+        os.replace(path, backup)
+    for temporary, path in zip(temporary_paths, target_paths):
+        os.replace(temporary, path)
+
+    duration = time.perf_counter() - start
+    log.info(f"Storage migrated from {source} to {shards} shards ({expected[0]} accounts) in {duration:.3f} s")
+    return {
+        "source_shards": source,
+        "target_shards": shards,
+        "accounts": expected[0],
+        "total_amount": expected[1],
+        "duration_s": round(duration, 3),
+        "files": target_paths,
+        "backups": backups,
+    }
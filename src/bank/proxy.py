@@ -0,0 +1,300 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from bank.security import SecurityGuard
+from network.connector import BankConnector
+from network.gossip import Membership
+from network.health import PeerHealth
+
+PROXY_CODES = ("AD", "AW", "AB")
+MUTATION_CODES = ("AD", "AW")
+INVALIDATION_WINDOW = 60  # seconds invalidation is remembered, longer than any proxied request
+UNKNOWN_OUTCOME = "ER Target bank did not answer, outcome is unknown"  # mutation is not sent again
+
+log = logging.getLogger('WORKER')
+
+
+class ProxyCache:
+    """
+    Cache of balances (AB responses) of accounts in other banks, lives in manager process and is shared
+    by all workers. Deposit or withdrawal proxied by any worker invalidates the account. Response is stored
+    only if the account was not invalidated since its request started, so balance read before
+    a mutation cannot be stored after it.
+    """
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._entries = OrderedDict()  # account: (response, expires at)
+        self._invalidations = OrderedDict()  # account: time of last invalidation
+        self._guard = threading.Lock()
+
+        self._hits = 0
+        self._misses = 0
+        self._invalidated = 0
+        self._coalesced = 0
+
+    def get(self, account: str) -> tuple[str | None, float]:
+        """
+        :param account: account in format number/ip
+        :return: (cached response or None, token) - token is passed to put when response was not cached
+        """
+        now = time.monotonic()
+        with self._guard:
+            entry = self._entries.get(account)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(account)
+                self._hits += 1
+                return entry[0], now
+
+            if entry is not None:
+                del self._entries[account]
+            self._misses += 1
+            return None, now
+
+    def put(self, account: str, response: str, ttl: float, token: float):
+        """
+        Stores response unless account was invalidated after token was issued
+        :param token: token returned by get before the request was sent
+        """
+        now = time.monotonic()
+        with self._guard:
+            self._forget_invalidations(now)
+            if self._invalidations.get(account, float("-inf")) >= token:
+                return
+
+            self._entries[account] = (response, now + ttl)
+            self._entries.move_to_end(account)
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, account: str):
+        """
+        Drops cached balance of account and rejects responses of requests started before
+        """
+        now = time.monotonic()
+        with self._guard:
+            self._forget_invalidations(now)
+            if self._entries.pop(account, None) is not None:
+                self._invalidated += 1
+
+            self._invalidations[account] = now
+            self._invalidations.move_to_end(account)
+
+    def add_coalesced(self, count: int):
+        """
+        Counts requests that waited for the same request of another client instead of sending their own
+        """
+        with self._guard:
+            self._coalesced += count
+
+    def get_stats(self) -> dict:
+        """
+        :return: dictionary with cached balances, hits, misses, invalidations and coalesced requests
+        """
+        with self._guard:
+            return {
+                "size": len(self._entries),
+                "capacity": self._capacity,
+                "hits": self._hits,
+                "misses": self._misses,
+                "invalidated": self._invalidated,
+                "coalesced": self._coalesced,
+            }
+
+    def _forget_invalidations(self, now: float):
+        while self._invalidations:
+            account, invalidated_at = next(iter(self._invalidations.items()))
+            if now - invalidated_at <= INVALIDATION_WINDOW:
+                break
+            del self._invalidations[account]
+
+
+class _Flight:
+    """
+    Request to other bank that is in progress, clients asking for the same balance wait for its response
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = "ER Target bank unreachable"
+        self.waiters = 0
+
+
+class BankProxy:
+    """
+    Relays commands for accounts of other banks. Identical AB requests in progress in this worker are sent
+    only once (single-flight) and their response is optionally kept in shared ProxyCache for proxy_cache_ttl.
+    Request ID and strict mode of AB are forwarded only to gossip members, other banks may not know
+    these extensions and reject the command.
+    """
+
+    def __init__(self, config: dict, security: SecurityGuard, cache: ProxyCache | None = None,
+                 peers: PeerHealth | None = None, membership: Membership | None = None):
+        self._configuration = config
+        self._security = security
+        self._cache = cache
+        self._membership = membership
+        self._connector = BankConnector(timeout=config.get('network_timeout', 5.0), peers=peers)
+
+        self._lock = threading.Lock()
+        self._flights = {}  # account: _Flight
+
+    def relay(self, code: str, args: list, request_id: str | None = None, client: str | None = None) -> str:
+        """
+        Relays command to the bank of the account
+        :param code: Command code
+        :param args: List of command arguments
+        :param request_id: request ID of the command, it is forwarded (to banks that support it)
+                           so target bank recognizes retries
+        :param client: IP address of client that sent the command, request ID is unique only for the client
+        :return: Response string from the target bank or an error message
+        """
+        if code not in PROXY_CODES:
+            return "ER Command cannot be proxied"
+
+        if not args:
+            return "ER Missing arguments for proxy request"
+
+        account = args[0]
+        # strict read (AB <account> strict) must not be answered by cache or by request started before it
+        if code == "AB" and request_id is None and len(args) == 1:
+            return self._read_balance(account, args)
+
+        try:
+            return self._relay(code, args, self._scope_request_id(request_id, client))
+        finally:
+            # outcome of failed mutation is unknown too, so the balance is dropped in any case
+            self._invalidate(account)
+
+    def _read_balance(self, account: str, args: list) -> str:
+        """
+        Reads balance from cache, from request of another client in progress or from the target bank
+        """
+        ttl = self._configuration.get("proxy_cache_ttl", 0)
+        token = None
+        if self._cache is not None and ttl > 0:
+            cached, token = self._cache.get(account)
+            if cached is not None:
+                return cached
+
+        with self._lock:
+            flight = self._flights.get(account)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._flights[account] = _Flight()
+            else:
+                flight.waiters += 1
+
+        if not is_leader:
+            flight.done.wait()
+            return flight.response
+
+        try:
+            flight.response = self._relay("AB", args)
+        finally:
+            with self._lock:
+                if self._flights.get(account) is flight:
+                    del self._flights[account]
+            flight.done.set()
+
+        if self._cache is not None:
+            if token is not None and not flight.response.startswith("ER"):
+                self._cache.put(account, flight.response, ttl, token)
+            if flight.waiters:
+                self._cache.add_coalesced(flight.waiters)
+
+        return flight.response
+
+    def _invalidate(self, account: str):
+        """
+        Requests started after the mutation do not join balance request in progress (it may miss the mutation)
+        """
+        with self._lock:
+            self._flights.pop(account, None)
+
+        if self._cache is not None:
+            self._cache.invalidate(account)
+
+    def _relay(self, code: str, args: list, request_id: str | None = None) -> str:
+        """
+        Sends command to the bank of the account.
+        First tries a cached port if available, otherwise scans the configured range.
+        """
+        target_ip = args[0].split('/')[-1]
+        extended = self._supports_extensions(target_ip)
+        if code == "AB" and not extended:
+            # target answers plain AB from its storage, our cache was already bypassed for strict read
+            args = args[:1]
+        original_message = f"{code} {' '.join(args)}".strip()
+        if request_id is not None and extended:
+            original_message += f" #{request_id}"
+
+        scan_config = self._configuration.get('network_scan_port_range', [65525, 65535])
+        port_range = range(scan_config[0], scan_config[1] + 1)
+
+        cached_port = self._security.get_known_port(target_ip)
+        ports_to_try = [cached_port] if cached_port else port_range
+
+        for port in ports_to_try:
+            log.debug(f"Relaying {code} to {target_ip}:{port}")
+            response, delivered = self._send(target_ip, port, code, original_message)
+
+            if response and not response.startswith("ER"):
+                self._security.save_known_port(target_ip, port)
+                return response
+
+            if response is None and delivered:
+                return UNKNOWN_OUTCOME
+
+            if cached_port and port == cached_port:
+                return self._scan_ports_and_relay(target_ip, code, original_message)
+
+        return "ER Target bank unreachable"
+
+    def _send(self, ip: str, port: int, code: str, message: str) -> tuple[str | None, bool]:
+        """
+        :return: response (None if failed) and True if mutation may have been applied without answer,
+                 such mutation must not be sent again (to any port)
+        """
+        if code in MUTATION_CODES:
+            return self._connector.send_mutation(ip, port, message)
+        return self._connector.send_command(ip, port, message), False
+
+    @staticmethod
+    def _scope_request_id(request_id: str | None, client: str | None) -> str | None:
+        """
+        Target bank sees requests of all our clients coming from our IP, so forwarded ID is derived
+        from client address and its ID (retry of the client gets the same ID, other clients get other IDs)
+        :return: request ID to forward or None
+        """
+        if request_id is None:
+            return None
+        return hashlib.sha256(f"{client}#{request_id}".encode('utf-8')).hexdigest()[:32]
+
+    def _supports_extensions(self, ip: str) -> bool:
+        """
+        Banks that gossip with us run protocol extensions (request IDs, strict reads)
+        """
+        return self._membership is not None and self._membership.is_alive(ip)
+
+    def _scan_ports_and_relay(self, ip: str, code: str, message: str) -> str:
+        """
+        Scans a range of ports on a target IP and relays the message to the first responding port.
+        :param ip: Target IP address to scan
+        :param code: Command code
+        :param message: Full command message to relay
+        :return: Response from the discovered bank or error if not found
+        """
+
+        scan_config = self._configuration.get('network_scan_port_range', [65525, 65535])
+        for port in range(scan_config[0], scan_config[1] + 1):
+            res, delivered = self._send(ip, port, code, message)
+            if res and not res.startswith("ER"):
+                self._security.save_known_port(ip, port)
+                return res
+            if res is None and delivered:
+                return UNKNOWN_OUTCOME
+        return "ER Bank not found on any allowed port"
@@ -0,0 +1,154 @@
+import ctypes
+import logging
+import threading
+import time
+from multiprocessing import Array, Value
+
+from bank.storages import BankStorage, BOTTOM_ACCOUNT_NUMBER, TOP_ACCOUNT_NUMBER
+
+ACCOUNT_SLOTS = TOP_ACCOUNT_NUMBER - BOTTOM_ACCOUNT_NUMBER + 1
+MISSING = -1  # balance of account number that does not exist
+READ_ATTEMPTS = 3  # reads retried when publisher overwrote the buffer meanwhile
+
+log = logging.getLogger("STORAGE")
+
+
+class ReadSnapshot:
+    """
+    Immutable copy of all balances and aggregates in shared memory, published periodically by bank process
+    and read by workers without shared lock, manager round trip or SQLite. Account numbers are dense
+    (5 digits), so balance of account is found by index. There are two buffers, publisher writes the one
+    readers are not directed to and then switches them. Every buffer has a sequence number which is odd
+    while the buffer is written (seqlock), reader that sees it change reads again.
+    """
+
+    def __init__(self):
+        self._balances = Array(ctypes.c_longlong, 2 * ACCOUNT_SLOTS, lock=False)
+        self._totals = Array(ctypes.c_longlong, 2 * 2, lock=False)  # total amount and client count of buffer
+        self._published = Array('d', 2, lock=False)  # wall time when buffer was published
+        self._sequences = Array(ctypes.c_longlong, 2, lock=False)
+        self._active = Value('i', 0, lock=False)
+        self._version = Value(ctypes.c_longlong, 0, lock=False)
+
+    def publish(self, accounts: list):
+        """
+        Writes new snapshot into inactive buffer and makes it active, only one process may publish
+        :param accounts: list of (account number, balance) pairs
+        """
+        balances = [MISSING] * ACCOUNT_SLOTS
+        total = 0
+        for account_number, balance in accounts:
+            balances[int(account_number) - BOTTOM_ACCOUNT_NUMBER] = balance
+            total += balance
+
+        buffer = 1 - self._active.value
+        self._sequences[buffer] += 1
+        self._balances[buffer * ACCOUNT_SLOTS:(buffer + 1) * ACCOUNT_SLOTS] = balances
+        self._totals[buffer * 2] = total
+        self._totals[buffer * 2 + 1] = len(accounts)
+        self._published[buffer] = time.time()
+        self._sequences[buffer] += 1
+
+        self._active.value = buffer
+        self._version.value += 1
+
+    def get_balance(self, account_number: str, max_staleness: float) -> int | None:
+        """
+        :param max_staleness: maximum age of snapshot in seconds
+        :return: balance, None if account is not in snapshot or snapshot is older than max staleness
+        """
+        try:
+            index = int(account_number) - BOTTOM_ACCOUNT_NUMBER
+        except ValueError:
+            return None
+        if not (0 <= index < ACCOUNT_SLOTS):
+            return None
+
+        balance = self._read(lambda buffer: self._balances[buffer * ACCOUNT_SLOTS + index], max_staleness)
+        return None if balance == MISSING else balance
+
+    def get_total_amount(self, max_staleness: float) -> int | None:
+        """
+        :return: total amount or None if snapshot is older than max staleness
+        """
+        return self._read(lambda buffer: self._totals[buffer * 2], max_staleness)
+
+    def get_client_count(self, max_staleness: float) -> int | None:
+        """
+        :return: client count or None if snapshot is older than max staleness
+        """
+        return self._read(lambda buffer: self._totals[buffer * 2 + 1], max_staleness)
+
+    def get_stats(self) -> dict:
+        """
+        :return: dictionary with version, age and size of active snapshot
+        """
+        buffer = self._active.value
+        published = self._published[buffer]
+        return {
+            "version": self._version.value,
+            "age": round(time.time() - published, 3) if published else None,
+            "accounts": self._totals[buffer * 2 + 1],
+        }
+
+    def _read(self, read, max_staleness: float):
+        """
+        Reads value of active buffer, retried when the buffer was overwritten during the read
+        :param read: function reading value from buffer
+        :return: value or None if snapshot is stale or could not be read
+        """
+        for _ in range(READ_ATTEMPTS):
+            buffer = self._active.value
+            sequence = self._sequences[buffer]
+            if sequence % 2:
+                continue
+
+            value = read(buffer)
+            published = self._published[buffer]
+            if self._sequences[buffer] != sequence:
+                continue
+
+            if not published or time.time() - published > max_staleness:
+                return None
+            return value
+
+        return None
+
+
+class SnapshotPublisher:
+    """
+    Thread of bank process publishing balances of primary storage to read snapshot every interval,
+    balances come from warm full cache, storage is read only until warm-up is done
+    """
+
+    def __init__(self, snapshot: ReadSnapshot, storage: BankStorage, interval: float):
+        self._snapshot = snapshot
+        self._storage = storage
+        self._interval = interval
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._publish()
+        self._thread = threading.Thread(target=self._run, name="SnapshotPublisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self._interval + 5)
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self._publish()
+
+    def _publish(self):
+        try:
+            accounts = self._storage.get_balances()
+            if not accounts and self._storage.get_client_count():
+                # storage could not be read, readers fall back to storage when the last snapshot gets stale
+                return
+            self._snapshot.publish(accounts)
+        except Exception as e:
+            log.error(f"Could not publish read snapshot: {e}")
@@ -1,59 +1,706 @@
+import heapq
+import itertools
 import logging
 import sqlite3
-import random
+import threading
+import time
 import multiprocessing.managers as managers
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from logger.tracing import trace_stage
+
+if TYPE_CHECKING:
+    # allocator imports account number bounds from this module
+    from bank.allocator import AccountAllocator
+    from bank.hot_accounts import HotAccounts
 
 log = logging.getLogger("STORAGE")
 BOTTOM_ACCOUNT_NUMBER = 10_000
 TOP_ACCOUNT_NUMBER = 99_999
 MAX_ENTRIES = 5
+HOT_ACCOUNT_IDLE = 10  # seconds without deposit after which account stops being hot
+MAX_SHARDS = 64
 
 
-class BankStorage:
+def get_shard_paths(storage_path: str, shards: int = 1) -> list:
     """
-    Main storage for data
+    Sharded storage keeps shard files next to configured storage path (storage.shard0.db, storage.shard1.db, ...),
+    storage with one shard uses configured path
+    :param storage_path: configured storage path
+    :param shards: number of shards
+    :return: path of every shard
     """
+    if shards == 1:
+        return [storage_path]
 
-    def __init__(self, file_path, timeout, shared_cache: managers.DictProxy, shared_lock):
-        self._file_path = file_path
+    path = Path(storage_path)
+    return [str(path.with_name(f"{path.stem}.shard{shard}{path.suffix}")) for shard in range(shards)]
+
+
+def shard_of(account_number: str, shards: int) -> int:
+    """
+    :return: shard of account, account numbers are random, so shards get similar number of accounts
+    """
+    return int(account_number) % shards
+
+
+def detect_shards(storage_path: str) -> int:
+    """
+    Detects layout of existing storage files
+    :return: number of shard files (shard0..shardN-1), 1 for single file, 0 if there is no storage
+    """
+    paths = get_shard_paths(storage_path, MAX_SHARDS)
+    shards = next((shard for shard, path in enumerate(paths) if not Path(path).exists()), MAX_SHARDS)
+    if shards:
+        return shards
+    return 1 if Path(storage_path).exists() else 0
+
+
+class BalanceCache(ABC):
+    """
+    Cache of account balances shared by all storages. Object lives in manager process (see SharedManager),
+    processes use it through proxy, so every public method is one round trip and is synchronized here.
+    Consistency with storage is kept by storages, which write into cache only under the shared lock.
+    Balance may carry version of its row in storage, then older balance never replaces newer one.
+    """
+
+    policy = None
+
+    def __init__(self, capacity: int | None = None):
+        self._capacity = capacity
+        self._guard = threading.Lock()
+        # versions of evicted accounts stay here, at most one per account number
+        self._versions = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, account_number: str) -> int | None:
+        """
+        Gets cached balance, lookup is counted as hit or miss
+        :return: balance or None if account is not cached
+        """
+        with self._guard:
+            balance = self._lookup(account_number)
+            if balance is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return balance
+
+    def put(self, account_number: str, balance: int, version: int | None = None):
+        """
+        :param version: version of the row in storage, cached balance with newer version is kept
+        """
+        with self._guard:
+            self._put(account_number, balance, version)
+
+    def update(self, balances):
+        """
+        Puts many balances at once
+        :param balances: dictionary or iterable of (account number, balance) or (account number, balance, version)
+        """
+        items = balances.items() if isinstance(balances, dict) else balances
+        with self._guard:
+            for item in items:
+                self._put(*item)
+
+    def advance(self, account_number: str, balance: int, version: int):
+        """
+        Stores balance returned by mutation. Balances of concurrent mutations may arrive in any order,
+        so only newer version is stored. Account that is not cached is not added (it may be evicted or removed).
+        """
+        with self._guard:
+            if account_number in self._entries() and self._versions.get(account_number, -1) < version:
+                self._store(account_number, balance)
+                self._versions[account_number] = version
+
+    def pop(self, account_number: str):
+        with self._guard:
+            self._remove(account_number)
+            self._versions.pop(account_number, None)
+
+    def contains(self, account_number: str) -> bool:
+        """
+        Checks if account is cached, lookup is not counted and does not affect eviction
+        """
+        with self._guard:
+            return account_number in self._entries()
+
+    def size(self) -> int:
+        with self._guard:
+            return len(self._entries())
+
+    def snapshot(self) -> dict:
+        """
+        :return: copy of all cached balances
+        """
+        with self._guard:
+            return dict(self._entries())
+
+    def is_bounded(self) -> bool:
+        """
+        :return: true if cache may evict accounts, miss then does not mean that account does not exist
+        """
+        return self._capacity is not None
+
+    def get_stats(self) -> dict:
+        """
+        :return: dictionary with policy, capacity, size and hit, miss and eviction counters
+        """
+        with self._guard:
+            lookups = self._hits + self._misses
+            return {
+                "policy": self.policy,
+                "capacity": self._capacity,
+                "size": len(self._entries()),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else None,
+            }
+
+    def _put(self, account_number: str, balance: int, version: int | None = None):
+        if version is None:
+            self._versions.pop(account_number, None)
+        elif account_number in self._entries() and self._versions.get(account_number, -1) > version:
+            return
+        else:
+            self._versions[account_number] = version
+
+        self._store(account_number, balance)
+
+    @abstractmethod
+    def _lookup(self, account_number: str) -> int | None:
+        pass
+
+    @abstractmethod
+    def _store(self, account_number: str, balance: int):
+        pass
+
+    @abstractmethod
+    def _remove(self, account_number: str):
+        pass
+
+    @abstractmethod
+    def _entries(self) -> dict:
+        pass
+
+
+class FullCache(BalanceCache):
+    """
+    Cache holding every account, nothing is evicted
+    """
+
+    policy = "full"
+
+    def __init__(self, capacity: int | None = None):
+        super().__init__(None)
+        self._balances = {}
+
+    def _lookup(self, account_number: str) -> int | None:
+        return self._balances.get(account_number)
+
+    def _store(self, account_number: str, balance: int):
+        self._balances[account_number] = balance
+
+    def _remove(self, account_number: str):
+        self._balances.pop(account_number, None)
+
+    def _entries(self) -> dict:
+        return self._balances
+
+
+class LRUCache(BalanceCache):
+    """
+    Bounded cache evicting least recently used account
+    """
+
+    policy = "lru"
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._balances = OrderedDict()
+
+    def _lookup(self, account_number: str) -> int | None:
+        balance = self._balances.get(account_number)
+        if balance is not None:
+            self._balances.move_to_end(account_number)
+        return balance
+
+    def _store(self, account_number: str, balance: int):
+        if account_number in self._balances:
+            self._balances.move_to_end(account_number)
+        elif len(self._balances) >= self._capacity:
+            self._balances.popitem(last=False)
+            self._evictions += 1
+
+        self._balances[account_number] = balance
+
+    def _remove(self, account_number: str):
+        self._balances.pop(account_number, None)
+
+    def _entries(self) -> dict:
+        return self._balances
+
+
+class ClockCache(BalanceCache):
+    """
+    Bounded cache with CLOCK (second chance) eviction. Hit only sets reference bit of the slot,
+    so lookups are cheaper than reordering in LRU, hand clears bits and evicts first slot without it.
+    """
+
+    policy = "clock"
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._balances = {}
+        self._slot_of = {}
+        self._slots = [None] * capacity
+        self._referenced = bytearray(capacity)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._hand = 0
+
+    def _lookup(self, account_number: str) -> int | None:
+        balance = self._balances.get(account_number)
+        if balance is not None:
+            self._referenced[self._slot_of[account_number]] = 1
+        return balance
+
+    def _store(self, account_number: str, balance: int):
+        slot = self._slot_of.get(account_number)
+        if slot is None:
+            slot = self._free.pop() if self._free else self._evict()
+            self._slots[slot] = account_number
+            self._slot_of[account_number] = slot
+
+        self._referenced[slot] = 1
+        self._balances[account_number] = balance
+
+    def _evict(self) -> int:
+        """
+        Moves hand to first slot that was not referenced since last pass and evicts its account
+        :return: freed slot
+        """
+        while self._referenced[self._hand]:
+            self._referenced[self._hand] = 0
+            self._hand = (self._hand + 1) % self._capacity
+
+        slot = self._hand
+        self._hand = (self._hand + 1) % self._capacity
+
+        victim = self._slots[slot]
+        del self._slot_of[victim]
+        del self._balances[victim]
+        self._evictions += 1
+        return slot
+
+    def _remove(self, account_number: str):
+        slot = self._slot_of.pop(account_number, None)
+        if slot is None:
+            return
+
+        del self._balances[account_number]
+        self._slots[slot] = None
+        self._referenced[slot] = 0
+        self._free.append(slot)
+
+    def _entries(self) -> dict:
+        return self._balances
+
+
+CACHE_POLICIES = {cache.policy: cache for cache in (FullCache, LRUCache, ClockCache)}
+
+
+class BankStorage(ABC):
+    """
+    Storage interface used by commands. Every process has its own storage object,
+    shared cache, lock and account number allocator are common for all of them.
+    Mutations return empty string on success, otherwise error message.
+    """
+
+    def __init__(self, shared_cache: BalanceCache, shared_lock, allocator: 'AccountAllocator'):
         self._lock = shared_lock
-        self._connection = sqlite3.connect(self._file_path, check_same_thread=False, timeout=timeout)
         self._cache = shared_cache
+        self._allocator = allocator
 
+    @contextmanager
+    def _locked(self):
+        """
+        Holds shared lock, time spent waiting for it is traced
+        """
+        with trace_stage("lock"):
+            self._lock.acquire()
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+    @abstractmethod
+    def create_account(self) -> str | None:
+        pass
+
+    @abstractmethod
+    def create_accounts(self, count: int) -> list:
+        """
+        Creates many accounts at once (one transaction, one cache update)
+        :param count: number of accounts
+        :return: list of new account numbers, shorter than count if accounts could not be created
+        """
+        pass
+
+    @abstractmethod
+    def remove_account(self, account_number: str) -> str:
+        pass
+
+    @abstractmethod
+    def deposit(self, account_number: str, value: int) -> str:
+        pass
+
+    @abstractmethod
+    def withdraw(self, account_number: str, value: int) -> str:
+        pass
+
+    @abstractmethod
+    def get_balance(self, account_number: str) -> int | None:
+        pass
+
+    @abstractmethod
+    def get_total_amount(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_client_count(self) -> int:
+        pass
+
+    @abstractmethod
+    def get_accounts(self, offset: int = 0, limit: int | None = None) -> list:
+        """
+        Gets accounts ordered by account number
+        :param offset: number of accounts to skip
+        :param limit: max number of accounts to return, None for all
+        :return: list of (account number, balance) pairs
+        """
+        pass
+
+    def get_balances(self) -> list:
+        """
+        Gets balances of all accounts in any order, storage may answer it cheaper than get_accounts
+        :return: list of (account number, balance) pairs
+        """
+        return self.get_accounts()
+
+    @abstractmethod
+    def close(self):
+        pass
+
+
+class SQLiteStorage(BankStorage):
+    """
+    Storage where every mutation is committed to SQLite, shared cache holds copy of balances.
+    Every change of balance increases version of the row. Mutation returns new balance with its version
+    and cache keeps the newest one, so balances of concurrent mutations cannot be stored in wrong order.
+    Cache is written only under shared lock, warm-up and read-through read SQLite under that lock,
+    so they cannot overwrite balance of mutation stored meanwhile.
+    Mutations are written through to cache, misses are read through from SQLite unless cache holds every account.
+    With hot accounts table, deposits to accounts that receive many deposits are added to pending deltas
+    of this process (row) and folded into SQLite periodically, reads and withdrawals see merged balance.
+    Row 0 belongs to primary storage, which folds deltas of all rows when it is closed.
+    With several shards accounts are partitioned by account number into separate SQLite files, so writes
+    to different shards do not wait for the same SQLite write lock, aggregates are summed over all shards.
+    """
+
+    def __init__(self, file_path, timeout, shared_cache: BalanceCache, shared_lock, allocator: 'AccountAllocator',
+                 warmup_state=None, hot_accounts: 'HotAccounts | None' = None, hot_row: int = 0,
+                 hot_threshold: int = 50, flush_interval: float = 0.05, shards: int = 1):
+        super().__init__(shared_cache, shared_lock, allocator)
+        self._file_path = file_path
+        self._connections = [
+            sqlite3.connect(path, check_same_thread=False, timeout=timeout)
+            for path in get_shard_paths(file_path, shards)
+        ]
+        # connections are shared by client threads of this process, transactions must not interleave
+        self._connection_locks = [threading.Lock() for _ in self._connections]
+
+        self._warmup_state = warmup_state
+        # bounded cache never holds every account, so it is never warm
+        self._cache_bounded = shared_cache.is_bounded()
+        self._is_warm = warmup_state is None and not self._cache_bounded
+
+        self._hot = hot_accounts
+        self._hot_row = hot_row
+        self._hot_threshold = hot_threshold
+        self._deposit_counts = Counter()
+        self._counts_since = time.monotonic()
+        self._counts_lock = threading.Lock()
+        self._flush_interval = flush_interval
+        self._flusher_stop = threading.Event()
+        self._flusher = None
+
+        if self._hot is not None:
+            self._flusher = threading.Thread(target=self._run_flusher, name="HotAccountFlusher", daemon=True)
+            self._flusher.start()
+
+    def _shard(self, account_number: str) -> int:
+        return shard_of(account_number, len(self._connections))
+
+    @contextmanager
+    def _transaction(self, shard: int):
+        """
+        Runs statements in one transaction on this process connection to shard
+        """
+        with trace_stage("sql"), self._connection_locks[shard], self._connections[shard]:
+            yield self._connections[shard]
+
+    def _fetch_one(self, shard: int, query: str, parameters: tuple = ()) -> tuple | None:
+        with trace_stage("sql"), self._connection_locks[shard]:
+            return self._connections[shard].execute(query, parameters).fetchone()
+
+    def _fetch_sum(self, query: str) -> int:
+        """
+        Runs aggregate query on every shard
+        :return: sum of results
+        """
+        return sum(self._fetch_one(shard, query)[0] or 0 for shard in range(len(self._connections)))
+
+    def _cache_is_warm(self) -> bool:
+        """
+        Checks if cache warm-up finished, once it did the shared state is not asked again.
+        """
+        if not self._is_warm and not self._cache_bounded:
+            self._is_warm = self._warmup_state.get("state") == "done"
+        return self._is_warm
+
+    def _refresh_cache(self, account_number: str) -> int | None:
+        """
+        Writes current balance from SQLite to cache, shared lock must be held.
+        :return: current balance or None if account does not exist
+        """
+        row = self._fetch_one(
+            self._shard(account_number), "select balance, version from accounts where account_number = ?",
+            (account_number,)
+        )
+
+        with trace_stage("cache"):
+            if row is None:
+                self._cache.pop(account_number)
+                return None
+
+            self._cache.put(account_number, row[0], row[1])
+            return row[0]
+
+    def _hot_slot(self, account_number: str) -> int | None:
+        return self._hot.slot_of(account_number) if self._hot is not None else None
+
+    def _count_deposit(self, account_number: str):
+        """
+        Counts deposits of this process, account with more than threshold deposits per second becomes hot
+        """
+        now = time.monotonic()
+        with self._counts_lock:
+            if now - self._counts_since >= 1.0:
+                self._deposit_counts.clear()
+                self._counts_since = now
+
+            self._deposit_counts[account_number] += 1
+            if self._deposit_counts[account_number] != self._hot_threshold:
+                return
+
+        with self._locked():
+            # account could be removed meanwhile
+            if self._fetch_one(
+                    self._shard(account_number), "SELECT 1 FROM accounts WHERE account_number = ?", (account_number,)
+            ) is None:
+                return
+            slot = self._hot.assign(account_number)
+
+        if slot is not None:
+            log.info(f"Account {account_number} is hot, deposits are aggregated")
+
+    def _fold(self, slot: int, rows=None):
+        """
+        Stores pending deltas of hot account in one UPDATE, shared lock must be held
+        :param rows: rows to fold, all if None
+        :raises sqlite3.IntegrityError: when account does not exist, deltas stay pending
+        """
+        account_number = self._hot.account_of(slot)
+        if account_number is None:
+            return
+
+        amounts = self._hot.collect(slot, rows)
+        if not amounts:
+            return
+
+        with self._transaction(self._shard(account_number)) as connection:
+            cursor = connection.execute(
+                "update accounts set balance = balance + ?, version = version + 1 where account_number = ?",
+                (sum(amounts.values()), account_number)
+            )
+
+        if cursor.rowcount == 0:
+            # acknowledged deposits must not disappear, they stay pending (and counted in total amount)
+            raise sqlite3.IntegrityError(f"Pending deposits {amounts} of missing account {account_number} were kept")
+
+        self._hot.settle(slot, amounts)
+        self._refresh_cache(account_number)
+
+    def _release_hot(self, slot: int):
+        """
+        Folds all pending deltas and frees slot, shared lock must be held
+        """
+        for _ in range(MAX_ENTRIES):
+            self._fold(slot)
+            if self._hot.release(slot):
+                return
+        raise sqlite3.OperationalError("Hot account still receives deposits")
+
+    def _run_flusher(self):
+        while not self._flusher_stop.wait(self._flush_interval):
+            try:
+                self._flush_hot(rows=[self._hot_row])
+
+                for slot in self._hot.idle_slots(HOT_ACCOUNT_IDLE):
+                    with self._locked():
+                        if slot in self._hot.idle_slots(HOT_ACCOUNT_IDLE):
+                            self._release_hot(slot)
+            except Exception as e:
+                log.error(f"Error while flushing hot accounts: {e}")
+
+    def _flush_hot(self, rows=None):
+        """
+        Folds pending deltas of given rows (all rows if None) into SQLite, slot that cannot be folded
+        does not stop others
+        """
+        for slot in self._hot.pending_slots(rows):
+            try:
+                with self._locked():
+                    self._fold(slot, rows)
+            except sqlite3.IntegrityError as e:
+                log.error(e)
 
     def create_account(self) -> str | None:
 
         for _ in range(MAX_ENTRIES):
-            candidate = str(random.randint(BOTTOM_ACCOUNT_NUMBER, TOP_ACCOUNT_NUMBER))
+            candidate = self._allocator.reserve()
+            if candidate is None:
+                log.warning("No free account number left")
+                return None
 
             try:
-                with self._connection:
-                    self._connection.execute("insert into accounts (account_number) values (?)", (candidate,))
+                with self._transaction(self._shard(candidate)) as connection:
+                    connection.execute("insert into accounts (account_number) values (?)", (candidate,))
 
                 account_number = candidate
 
-                with self._lock:
-                    self._cache[account_number] = 0
+                with self._locked(), trace_stage("cache"):
+                    self._cache.put(account_number, 0)
 
                 return account_number
 
             except sqlite3.IntegrityError:
+                # account exists although allocator did not know about it, number stays reserved
                 log.warning(f"Collision detected for {candidate}")
                 continue
             except Exception as e:
+                self._allocator.release(candidate)
                 log.error(f"Error while creating account: {e}")
                 break
 
         return None
 
+    def create_accounts(self, count: int) -> list:
+        """
+        Accounts of every shard are inserted in one transaction, so with several shards accounts of shards
+        that failed are missing in the result
+        """
+        candidates = self._allocator.reserve_many(count)
+        created = []
+
+        for _ in range(MAX_ENTRIES):
+            if not candidates:
+                break
+
+            retry = []
+            for shard, numbers in self._group_by_shard(candidates).items():
+                try:
+                    with self._transaction(shard) as connection:
+                        connection.executemany(
+                            "insert into accounts (account_number) values (?)", ((number,) for number in numbers)
+                        )
+                    created += numbers
+
+                except sqlite3.IntegrityError:
+                    # some numbers exist although allocator did not know about them, they stay reserved
+                    existing = self._existing_accounts(shard, numbers)
+                    log.warning(f"Collision detected for {len(existing)} accounts")
+
+                    retry += [number for number in numbers if number not in existing]
+                    retry += self._allocator.reserve_many(len(existing))
+                except Exception as e:
+                    log.error(f"Error while creating accounts: {e}")
+                    for number in numbers:
+                        self._allocator.release(number)
+
+            candidates = retry
+
+        for number in candidates:
+            self._allocator.release(number)
+
+        if created:
+            with self._locked(), trace_stage("cache"):
+                self._cache.update({number: 0 for number in created})
+        return created
+
+    def _group_by_shard(self, account_numbers: list) -> dict:
+        """
+        :return: dictionary shard: account numbers
+        """
+        groups = {}
+        for number in account_numbers:
+            groups.setdefault(self._shard(number), []).append(number)
+        return groups
+
+    def _existing_accounts(self, shard: int, account_numbers: list) -> set:
+        """
+        :return: set of given account numbers that exist in database shard
+        """
+        existing = set()
+        with trace_stage("sql"), self._connection_locks[shard]:
+            for start in range(0, len(account_numbers), 500):
+                chunk = account_numbers[start:start + 500]
+                rows = self._connections[shard].execute(
+                    f"select account_number from accounts where account_number in ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                existing.update(row[0] for row in rows)
+
+        return existing
+
     def remove_account(self, account_number: str) -> str:
+        """
+        Hot slot is released and account deleted under one hold of shared lock, so the account cannot become hot
+        again (and collect deposits that could not be folded) before it is deleted
+        """
         try:
-            with self._connection:
-                cursor = self._connection.execute("delete from accounts where account_number = ?", (account_number,))
+            with self._locked():
+                slot = self._hot_slot(account_number)
+                if slot is not None:
+                    self._release_hot(slot)
+
+                with self._transaction(self._shard(account_number)) as connection:
+                    cursor = connection.execute("delete from accounts where account_number = ?", (account_number,))
+
+                if cursor.rowcount > 0:
+                    with trace_stage("cache"):
+                        self._cache.pop(account_number)
 
             if cursor.rowcount > 0:
-                with self._lock:
-                    self._cache.pop(account_number, None)
+                self._allocator.release(account_number)
                 return ''
 
         except Exception as e:
@@ -63,15 +710,24 @@ class BankStorage:
         return "Account not found"
 
     def deposit(self, account_number: str, value: int) -> str:
+        slot = self._hot_slot(account_number)
+        if slot is not None and self._hot.add(self._hot_row, slot, account_number, value):
+            return ''
+
         try:
-            with self._connection:
-                cursor = self._connection.execute(
-                    "update accounts set balance = balance + ? where account_number = ?", (value, account_number))
+            with self._transaction(self._shard(account_number)) as connection:
+                row = connection.execute(
+                    "update accounts set balance = balance + ?, version = version + 1 where account_number = ? "
+                    "returning balance, version",
+                    (value, account_number)
+                ).fetchone()
 
-            if cursor.rowcount > 0:
-                with self._lock:
-                    if account_number in self._cache:
-                        self._cache[account_number] += value
+            if row is not None:
+                with self._locked(), trace_stage("cache"):
+                    self._cache.advance(account_number, *row)
+
+                if self._hot is not None:
+                    self._count_deposit(account_number)
                 return ''
 
         except Exception as e:
@@ -81,21 +737,26 @@ class BankStorage:
         return "Invalid account number"
 
     def withdraw(self, account_number: str, value: int) -> str:
+        slot = self._hot_slot(account_number)
+        if slot is not None:
+            return self._withdraw_hot(slot, account_number, value)
+
         try:
-            with self._connection:
-                cursor = self._connection.execute(
-                    "UPDATE accounts SET balance = balance - ? WHERE account_number = ? AND balance >= ?",
+            with self._transaction(self._shard(account_number)) as connection:
+                row = connection.execute(
+                    "UPDATE accounts SET balance = balance - ?, version = version + 1 "
+                    "WHERE account_number = ? AND balance >= ? RETURNING balance, version",
                     (value, account_number, value)
-                )
+                ).fetchone()
 
-            if cursor.rowcount > 0:
-                with self._lock:
-                    if account_number in self._cache:
-                        self._cache[account_number] -= value
+            if row is not None:
+                with self._locked(), trace_stage("cache"):
+                    self._cache.advance(account_number, *row)
                 return ''
             else:
-                cursor = self._connection.execute("SELECT 1 FROM accounts WHERE account_number = ?", (account_number,))
-                if not cursor.fetchone():
+                if not self._fetch_one(
+                        self._shard(account_number), "SELECT 1 FROM accounts WHERE account_number = ?", (account_number,)
+                ):
                     return "Account not found"
                 return "Lack of funds"
 
@@ -103,86 +764,278 @@ class BankStorage:
             log.error(f"Error: {e}")
             return "Database error"
 
+    def _withdraw_hot(self, slot: int, account_number: str, value: int) -> str:
+        """
+        Withdraws from hot account, pending deltas are folded first so withdrawal can use merged balance
+        """
+        try:
+            with self._locked():
+                self._fold(slot)
+
+                with self._transaction(self._shard(account_number)) as connection:
+                    cursor = connection.execute(
+                        "UPDATE accounts SET balance = balance - ?, version = version + 1 "
+                        "WHERE account_number = ? AND balance >= ?",
+                        (value, account_number, value)
+                    )
+
+                if self._refresh_cache(account_number) is None:
+                    return "Account not found"
+                if cursor.rowcount == 0:
+                    return "Lack of funds"
+                return ''
+
+        except Exception as e:
+            log.error(f"Error: {e}")
+            return "Database error"
+
     def get_balance(self, account_number: str) -> int | None:
         """
-        Gets account balance directly from shared cache.
+        Gets account balance from shared cache. Missing accounts are read from SQLite,
+        when cache holds every account (full policy after warm-up) miss means that account does not exist.
+        Balance of hot account is merged with pending deltas.
         """
-        with self._lock:
-            return self._cache.get(account_number)
+        slot = self._hot_slot(account_number)
+        if slot is not None:
+            try:
+                with self._locked():
+                    balance = self._cache.get(account_number)
+                    if balance is None:
+                        balance = self._refresh_cache(account_number)
+                    return None if balance is None else balance + self._hot.pending(slot)
+            except sqlite3.Error as e:
+                log.error(f"Error while reading balance: {e}")
+                return None
+
+        with trace_stage("cache"):
+            balance = self._cache.get(account_number)
+
+        if balance is not None or self._cache_is_warm():
+            return balance
+
+        try:
+            with self._locked():
+                return self._refresh_cache(account_number)
+        except sqlite3.Error as e:
+            log.error(f"Error while reading balance: {e}")
+            return None
 
     def get_total_amount(self) -> int:
         """
-        Gets total amount in all accounts
+        Gets total amount in all accounts (sum of all shards)
         :return: total amount
         """
         try:
-            cursor = self._connection.execute("SELECT SUM(balance) FROM accounts")
-            result = cursor.fetchone()[0]
-            return result if result else 0
+            if self._hot is None:
+                return self._fetch_sum("SELECT SUM(balance) FROM accounts")
+
+            with self._locked():
+                return self._fetch_sum("SELECT SUM(balance) FROM accounts") + self._hot.get_stats()["pending_total"]
         except Exception as e:
             log.error(f"Error getting total amount: {e}")
             return 0
 
     def get_client_count(self) -> int:
         """
-        Gets number of clients (accounts)
+        Gets number of clients (accounts) of all shards
         :return: client count
         """
         try:
-            cursor = self._connection.execute("SELECT COUNT(*) FROM accounts")
-            return cursor.fetchone()[0]
+            return self._fetch_sum("SELECT COUNT(*) FROM accounts")
         except Exception as e:
             log.error(f"Error getting client count: {e}")
         return 0
 
+    def get_accounts(self, offset: int = 0, limit: int | None = None) -> list:
+        try:
+            if len(self._connections) == 1:
+                with trace_stage("sql"), self._connection_locks[0]:
+                    accounts = self._connections[0].execute(
+                        "SELECT account_number, balance FROM accounts ORDER BY account_number LIMIT ? OFFSET ?",
+                        (-1 if limit is None else limit, offset)
+                    ).fetchall()
+            else:
+                accounts = self._get_sharded_accounts(offset, limit)
+        except Exception as e:
+            log.error(f"Error getting accounts: {e}")
+            return []
+
+        if self._hot is None:
+            return accounts
+
+        pending = self._hot.pending_by_account()
+        return [(number, balance + pending.get(number, 0)) for number, balance in accounts]
+
+    def get_balances(self) -> list:
+        """
+        Full cache holds every account after warm-up, so balances are copied from it instead of reading
+        all shards. Until warm-up is done (and with bounded cache) they are read from SQLite.
+        """
+        if not self._cache_is_warm():
+            return self.get_accounts()
+
+        with trace_stage("cache"):
+            balances = self._cache.snapshot()
+        if self._hot is None:
+            return list(balances.items())
+
+        pending = self._hot.pending_by_account()
+        return [(number, balance + pending.get(number, 0)) for number, balance in balances.items()]
+
+    def _get_sharded_accounts(self, offset: int, limit: int | None) -> list:
+        """
+        Merges ordered accounts of all shards, every shard returns at most offset + limit accounts
+        """
+        shard_limit = -1 if limit is None else offset + limit
+        shards = []
+        for shard in range(len(self._connections)):
+            with trace_stage("sql"), self._connection_locks[shard]:
+                shards.append(self._connections[shard].execute(
+                    "SELECT account_number, balance FROM accounts ORDER BY account_number LIMIT ?", (shard_limit,)
+                ).fetchall())
+
+        return list(itertools.islice(heapq.merge(*shards), offset, None if limit is None else offset + limit))
+
     def close(self):
         """
-        Closes storage (connection to db)
+        Folds pending deltas of hot accounts (primary storage folds all rows) and closes storage (connection to db)
         """
-        if self._connection:
-            self._connection.close()
+        if self._flusher is not None:
+            self._flusher_stop.set()
+            self._flusher.join()
+            try:
+                self._flush_hot(rows=None if self._hot_row == 0 else [self._hot_row])
+            except Exception as e:
+                log.error(f"Could not flush hot accounts: {e}")
 
+        for connection in self._connections:
+            connection.close()
 
-def load_data_to_shared_memory(file_path: str, shared_memory: managers.DictProxy) -> bool:
+
+def load_data_to_shared_memory(file_path: str, shared_memory: BalanceCache, chunk_size: int = 5000,
+                               shared_lock=None, warmup_state: managers.DictProxy | None = None,
+                               max_accounts: int | None = None, shards: int = 1) -> bool:
     """
-    Loads data from sqlite database into provided shared dictionary
+    Streams data from sqlite database into provided shared cache in chunks (ordered by account number).
+    Every chunk is read and written under shared lock, so warm-up can run while bank already serves clients.
+    Shards are loaded in parallel, one thread per shard.
     :param file_path: database filepath
-    :param shared_memory: shared memory object
+    :param shared_memory: shared cache object
+    :param chunk_size: number of rows read and written at once
+    :param shared_lock: lock shared with storages, needed when bank is already open
+    :param warmup_state: shared dictionary where progress is reported (state, loaded, total, duration)
+    :param max_accounts: loads at most this many accounts (capacity of bounded cache)
+    :param shards: number of shards of storage
     :return: true if successfully loaded
     """
     log = logging.getLogger("SYSTEM")
-    conn = None
+    paths = get_shard_paths(file_path, shards)
+    start = time.perf_counter()
+    progress = {"claimed": 0, "loaded": 0, "total": 0}
+    guard = threading.Lock()
+
+    def report(**values):
+        if warmup_state is not None:
+            warmup_state.update(values)
+
+    def claim(wanted: int) -> int:
+        """
+        Reserves part of max_accounts for next chunk of a shard
+        """
+        with guard:
+            allowed = wanted if max_accounts is None else max(0, min(wanted, max_accounts - progress["claimed"]))
+            progress["claimed"] += allowed
+            return allowed
+
+    def loaded(claimed: int, rows: int):
+        with guard:
+            progress["claimed"] -= claimed - rows
+            progress["loaded"] += rows
+            report(loaded=progress["loaded"], total=max(progress["total"], progress["loaded"]))
+
+    def load_shard(path: str):
+        conn = sqlite3.connect(path)
+        try:
+            last_account = ""
+            while limit := claim(chunk_size):
+                with shared_lock if shared_lock is not None else nullcontext():
+                    rows = conn.execute(
+                        "select account_number, balance, version from accounts where account_number > ? "
+                        "order by account_number limit ?",
+                        (last_account, limit)
+                    ).fetchall()
+
+                    if rows:
+                        shared_memory.update(rows)
+
+                loaded(limit, len(rows))
+                if not rows:
+                    break
+                last_account = rows[-1][0]
+        finally:
+            conn.close()
+
     try:
-        conn = sqlite3.connect(file_path)
-        cursor = conn.cursor()
+        total = 0
+        for path in paths:
+            conn = sqlite3.connect(path)
+            try:
+                total += conn.execute("select count(*) from accounts").fetchone()[0]
+            finally:
+                conn.close()
+        if max_accounts is not None:
+            total = min(total, max_accounts)
+        progress["total"] = total
+        report(state="running", loaded=0, total=total, duration=None)
 
-        cursor.execute("select account_number, balance from accounts")
-        rows = cursor.fetchall()
+        with ThreadPoolExecutor(max_workers=len(paths), thread_name_prefix="ShardLoader") as executor:
+            for result in [executor.submit(load_shard, path) for path in paths]:
+                result.result()
 
-        if not rows:
-            log.warning("Database does not contain any data.")
-            return True
+        duration = time.perf_counter() - start
+        report(state="done", loaded=progress["loaded"], total=progress["loaded"], duration=round(duration, 3))
 
-        shared_memory.update(dict(rows))
-        log.info(f"Shared memory has been loaded")
-        log.info(shared_memory)
+        if not progress["loaded"]:
+            log.warning("Database does not contain any data.")
+        else:
+            log.info(f"Shared memory has been loaded with {progress['loaded']} accounts in {duration:.3f} s")
         return True
 
     except sqlite3.Error as e:
         log.critical(f"Could not load data into shared memory: {e}")
-        if conn:
-            conn.rollback()
+        report(state="failed")
         return False
 
-    finally:
-        if conn:
-            conn.close()
-
 
-def prepare_storage_structure(file_path: str) -> bool:
+def prepare_storage_structure(file_path: str, shards: int = 1) -> bool:
     """
-    Prepares storage structure (db structure)
+    Prepares storage structure (db structure) of every shard, shards are prepared in parallel.
+    Storage with different number of shards is not opened, it has to be migrated first (src/migrate.py).
     :param file_path: database filepath
+    :param shards: number of shards
+    :return: true if successfully created
+    """
+    log = logging.getLogger("SYSTEM")
+
+    existing = detect_shards(file_path)
+    if existing and existing != shards:
+        log.critical(f"Storage {file_path} has {existing} shards but {shards} are configured, "
+                     f"migrate it with: python src/migrate.py --storage-path {file_path} --shards {shards}")
+        return False
+
+    paths = get_shard_paths(file_path, shards)
+    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+        results = list(executor.map(prepare_shard_structure, paths))
+
+    if all(results):
+        log.info(f"Database storage structure is ready.")
+    return all(results)
+
+
+def prepare_shard_structure(file_path: str) -> bool:
+    """
+    Creates accounts table in one database file
+    :param file_path: database filepath of the shard
     :return: true if successfully created
     """
     log = logging.getLogger("SYSTEM")
@@ -194,20 +1047,25 @@ def prepare_storage_structure(file_path: str) -> bool:
         cursor.execute("""
                 CREATE TABLE IF NOT EXISTS accounts (
                     account_number TEXT PRIMARY KEY,
-                    balance INTEGER DEFAULT 0
+                    balance INTEGER DEFAULT 0,
+                    version INTEGER NOT NULL DEFAULT 0
                 )
             """)
 
+        # storage created before rows were versioned
+        columns = [column[1] for column in cursor.execute("PRAGMA table_info(accounts)")]
+        if "version" not in columns:
+            cursor.execute("ALTER TABLE accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
         conn.commit()
-        log.info(f"Database storage structure is ready.")
         return True
 
     except sqlite3.Error as e:
-        log.critical(f"Could not create database structure: {e}")
+        log.critical(f"Could not create database structure of {file_path}: {e}")
         if conn:
             conn.rollback()
         return False
 
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
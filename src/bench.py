@@ -0,0 +1,116 @@
+import argparse
+import json
+import multiprocessing
+import sys
+
+from benchmarks.allocator import run_allocator_benchmark
+from benchmarks.bulk import run_bulk_benchmark
+from benchmarks.cluster import CLUSTER_MODES, run_cluster_benchmark
+from benchmarks.contention import run_contention_benchmark
+from benchmarks.runner import BenchmarkOptions, run_benchmark
+from benchmarks.scenarios import SCENARIOS, parse_mix
+from benchmarks.sharding import run_sharding_benchmark
+from benchmarks.storage import run_storage_benchmark
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load generator and benchmark suite for the bank protocol")
+    parser.add_argument("--suite", default="protocol", choices=["protocol", "storage", "allocator", "bulk", "contention", "cluster", "sharding"],
+                        help="protocol drives running bank over TCP, storage measures storage engines directly, "
+                             "allocator measures account creation at 10/50/90/99%% used account numbers, "
+                             "bulk compares AC with bulk creation (AP) of --accounts accounts, "
+                             "contention compares hot account aggregation under Zipf distributed traffic, "
+                             "cluster runs relayed commands and RP against local clusters of --nodes banks, "
+                             "sharding compares deposits of --workers processes to sqlite storage with --shards shards")
+    parser.add_argument("--scenario", default="keepalive", choices=[*SCENARIOS.keys(), "all"])
+    parser.add_argument("--engine", default="sqlite", choices=["sqlite", "journal", "all"], help="storage engine")
+    parser.add_argument("--operations", type=int, default=20_000, help="deposits made by storage suite, accounts created by allocator suite")
+    parser.add_argument("--threads", type=int, default=8, help="writing threads of storage suite")
+    parser.add_argument("--cache-policy", default="full", choices=["full", "lru", "clock"], help="shared cache policy")
+    parser.add_argument("--cache-capacity", type=int, default=100_000, help="capacity of bounded cache")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of contention suite")
+    parser.add_argument("--connections", type=int, default=16, help="number of concurrent connections")
+    parser.add_argument("--requests", type=int, default=200, help="requests sent by every connection")
+    parser.add_argument("--accounts", type=int, default=100, help="accounts created before measuring")
+    parser.add_argument("--hot-accounts", type=int, default=2, help="accounts used by the hot scenario")
+    parser.add_argument("--stub-banks", type=int, default=2, help="peer banks used by the proxy scenario")
+    parser.add_argument("--workers", type=int, default=2, help="bank_workers of the tested bank")
+    parser.add_argument("--nodes", default="2,5,10", help="cluster sizes of cluster suite, e.g. 2,10,25,50,100")
+    parser.add_argument("--cluster-mode", default="scan", choices=CLUSTER_MODES,
+                        help="how nodes of cluster suite find each other")
+    parser.add_argument("--robbery-plans", type=int, default=5, help="RP requests of cluster suite per amount")
+    parser.add_argument("--shards", default="1,2,4", help="storage_shards compared by sharding suite, e.g. 1,2,4,8")
+    parser.add_argument("--mix", default=None, help="command weights, e.g. AD=30,AW=20,AB=50")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="file to write JSON results to")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    arguments = parse_arguments()
+
+    engines = ["sqlite", "journal"] if arguments.engine == "all" else [arguments.engine]
+    if "journal" in engines and arguments.cache_policy != "full":
+        sys.exit("Journal storage engine requires --cache-policy full")
+    scenarios = list(SCENARIOS.keys()) if arguments.scenario == "all" else [arguments.scenario]
+    results = []
+    cache_options = {"cache_policy": arguments.cache_policy, "cache_capacity": arguments.cache_capacity}
+
+    if arguments.suite == "storage":
+        results.append(run_storage_benchmark(engines, arguments.accounts, arguments.operations, arguments.threads,
+                                             arguments.seed, cache_options))
+        scenarios = []
+
+    if arguments.suite == "bulk":
+        results.append(run_bulk_benchmark(engines, arguments.accounts))
+        scenarios = []
+
+    if arguments.suite == "contention":
+        results.append(run_contention_benchmark(arguments.accounts, arguments.operations, arguments.workers,
+                                                arguments.zipf, arguments.seed))
+        scenarios = []
+
+    if arguments.suite == "cluster":
+        options = BenchmarkOptions(
+            connections=arguments.connections,
+            requests=arguments.requests,
+            accounts=arguments.accounts,
+            bank_workers=arguments.workers,
+            seed=arguments.seed,
+        )
+        sizes = [int(size) for size in arguments.nodes.split(",") if size.strip()]
+        results.append(run_cluster_benchmark(sizes, arguments.cluster_mode, options, arguments.robbery_plans))
+        scenarios = []
+
+    if arguments.suite == "sharding":
+        shard_counts = [int(shards) for shards in arguments.shards.split(",") if shards.strip()]
+        results.append(run_sharding_benchmark(shard_counts, arguments.accounts, arguments.operations,
+                                              arguments.workers, arguments.seed))
+        scenarios = []
+
+    if arguments.suite == "allocator":
+        results.append(run_allocator_benchmark(arguments.operations, seed=arguments.seed))
+        scenarios = []
+
+    for scenario, engine in [(scenario, engine) for scenario in scenarios for engine in engines]:
+        options = BenchmarkOptions(
+            scenario=scenario,
+            connections=arguments.connections,
+            requests=arguments.requests,
+            accounts=arguments.accounts,
+            hot_accounts=arguments.hot_accounts,
+            stub_banks=arguments.stub_banks,
+            bank_workers=arguments.workers,
+            mix=parse_mix(arguments.mix) if arguments.mix else None,
+            seed=arguments.seed,
+            config_overrides={"storage_engine": engine, **cache_options},
+        )
+        results.append(run_benchmark(options))
+        print(f"Finished scenario {scenario} ({engine})", file=sys.stderr)
+
+    output = json.dumps(results if len(results) > 1 else results[0], indent=2)
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    print(output)
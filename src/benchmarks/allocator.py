@@ -0,0 +1,99 @@
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from bank.allocator import AccountAllocator
+from bank.engines import prepare_storage, create_storage, create_cache
+from bank.storages import BOTTOM_ACCOUNT_NUMBER, TOP_ACCOUNT_NUMBER, MAX_ENTRIES, prepare_storage_structure
+from benchmarks.runner import describe_environment
+from utils.shared import SharedManager
+
+DEFAULT_OCCUPANCIES = (0.1, 0.5, 0.9, 0.99)
+
+
+def _fill_storage(storage_path: str, occupancy: float, seed: int) -> int:
+    """
+    Inserts accounts with random numbers until given part of number space is used
+    :return: number of inserted accounts
+    """
+    numbers = range(BOTTOM_ACCOUNT_NUMBER, TOP_ACCOUNT_NUMBER + 1)
+    used = random.Random(seed).sample(numbers, int(len(numbers) * occupancy))
+
+    with sqlite3.connect(storage_path) as connection:
+        connection.executemany("insert into accounts (account_number) values (?)", ((str(n),) for n in used))
+    return len(used)
+
+
+def benchmark_occupancy(manager, occupancy: float, operations: int, seed: int = 1) -> dict:
+    """
+    Measures account creation when given part of number space is already used.
+    Legacy random retry loop is described by its model (expected attempts, probability that all attempts collide).
+    :param manager: started SharedManager
+    :param occupancy: used part of number space (0 - 1)
+    :param operations: accounts to create (at most number of free numbers)
+    :param seed: random seed
+    :return: dictionary with results
+    """
+    with tempfile.TemporaryDirectory(prefix="bank-allocator-bench-") as temp_dir:
+        config = {"storage_path": str(Path(temp_dir) / "storage.db"), "storage_timeout": 15}
+
+        cache = create_cache(config, manager)
+        lock = manager.Lock()
+        prepare_storage_structure(config["storage_path"])
+        existing = _fill_storage(config["storage_path"], occupancy, seed)
+        prepare_storage(config, cache)
+
+        allocator = AccountAllocator()
+        storage = create_storage(config, cache, lock, allocator)
+        try:
+            start = time.perf_counter()
+            allocator.load(account_number for account_number, _ in storage.get_accounts())
+            load_duration = time.perf_counter() - start
+
+            reservations = min(operations, allocator.get_stats()["free"])
+            start = time.perf_counter()
+            for _ in range(reservations):
+                allocator.release(allocator.reserve())
+            reserve_duration = time.perf_counter() - start
+
+            created = 0
+            start = time.perf_counter()
+            for _ in range(reservations):
+                if storage.create_account():
+                    created += 1
+            create_duration = time.perf_counter() - start
+        finally:
+            storage.close()
+
+        return {
+            "occupancy": occupancy,
+            "existing_accounts": existing,
+            "bitmap_load_s": round(load_duration, 4),
+            "reserve_us": round(reserve_duration / reservations * 1_000_000, 2) if reservations else None,
+            "created": created,
+            "create_failures": reservations - created,
+            "create_rps": round(created / create_duration, 2) if create_duration else None,
+            "random_retry_expected_attempts": round(1 / (1 - occupancy), 2),
+            "random_retry_failure_rate": round(occupancy ** MAX_ENTRIES, 4),
+        }
+
+
+def run_allocator_benchmark(operations: int, occupancies=DEFAULT_OCCUPANCIES, seed: int = 1) -> dict:
+    """
+    Runs allocator benchmark for every occupancy
+    :return: dictionary with results (JSON serializable)
+    """
+    manager = SharedManager()
+    manager.start()
+
+    try:
+        return {
+            "suite": "allocator",
+            "options": {"operations": operations, "occupancies": list(occupancies), "seed": seed},
+            "environment": describe_environment(),
+            "results": [benchmark_occupancy(manager, occupancy, operations, seed) for occupancy in occupancies],
+        }
+    finally:
+        manager.shutdown()
@@ -0,0 +1,136 @@
+import asyncio
+import tempfile
+import time
+from multiprocessing import Event, Process
+from pathlib import Path
+
+from bank.allocator import AccountAllocator
+from bank.engines import prepare_storage, create_storage, create_cache
+from benchmarks.client import BankClient, wait_for_bank
+from benchmarks.runner import BANK_HOST, BenchmarkOptions, build_config, serve_bank, describe_environment, _free_port
+from utils.shared import SharedManager
+
+
+def _rate(count: int, duration: float) -> float | None:
+    return round(count / duration, 2) if duration else None
+
+
+def benchmark_bulk_storage(manager, engine: str, count: int) -> dict:
+    """
+    Creates accounts one by one and with one bulk call, every variant in new storage
+    :param manager: started SharedManager
+    :param engine: storage engine name
+    :param count: number of accounts
+    :return: dictionary with results
+    """
+    durations = {}
+    created = {}
+
+    for variant in ("single", "bulk"):
+        with tempfile.TemporaryDirectory(prefix="bank-bulk-bench-") as temp_dir:
+            config = {
+                "storage_path": str(Path(temp_dir) / "storage.db"),
+                "storage_timeout": 15,
+                "storage_engine": engine,
+            }
+            cache = create_cache(config, manager)
+            if not prepare_storage(config, cache):
+                raise RuntimeError(f"Could not prepare {engine} storage")
+
+            storage = create_storage(config, cache, manager.Lock(), AccountAllocator())
+            try:
+                start = time.perf_counter()
+                if variant == "bulk":
+                    created[variant] = len(storage.create_accounts(count))
+                else:
+                    created[variant] = sum(1 for _ in range(count) if storage.create_account())
+                durations[variant] = time.perf_counter() - start
+            finally:
+                storage.close()
+
+    return {
+        "engine": engine,
+        "accounts": count,
+        "single_created": created["single"],
+        "single_rps": _rate(created["single"], durations["single"]),
+        "bulk_created": created["bulk"],
+        "bulk_rps": _rate(created["bulk"], durations["bulk"]),
+        "speedup": round(durations["single"] / durations["bulk"], 2) if durations["bulk"] else None,
+    }
+
+
+async def _drive_protocol(port: int, count: int) -> dict:
+    if not await wait_for_bank(BANK_HOST, port):
+        raise RuntimeError("Bank did not start")
+
+    client = BankClient(BANK_HOST, port, timeout=120)
+    await client.connect()
+    try:
+        single = 0
+        start = time.perf_counter()
+        for _ in range(count):
+            if (await client.request("AC")).startswith("AC "):
+                single += 1
+        single_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = await client.request(f"AP {count}")
+        bulk_duration = time.perf_counter() - start
+    finally:
+        await client.close()
+
+    bulk = int(response.split()[1]) if response.startswith("AP") else 0
+    return {
+        "single_created": single,
+        "single_rps": _rate(single, single_duration),
+        "bulk_created": bulk,
+        "bulk_s": round(bulk_duration, 4),
+        "bulk_rps": _rate(bulk, bulk_duration),
+    }
+
+
+def benchmark_bulk_protocol(engine: str, count: int) -> dict:
+    """
+    Creates accounts with AC commands and with one AP command through running bank
+    :param engine: storage engine name
+    :param count: number of accounts
+    :return: dictionary with results
+    """
+    port = _free_port(BANK_HOST)
+    options = BenchmarkOptions(config_overrides={"storage_engine": engine, "bulk_create_limit": count})
+
+    with tempfile.TemporaryDirectory(prefix="bank-bulk-bench-") as temp_dir:
+        config = build_config(str(Path(temp_dir) / "storage.db"), options, port, _free_port(BANK_HOST))
+        stop_event = Event()
+        bank_process = Process(target=serve_bank, args=(config, str(Path(temp_dir) / "bench.log"), stop_event))
+        bank_process.start()
+
+        try:
+            results = asyncio.run(_drive_protocol(port, count))
+        finally:
+            stop_event.set()
+            bank_process.join(timeout=15)
+            if bank_process.is_alive():
+                bank_process.terminate()
+
+    return {"engine": engine, "accounts": count, **results}
+
+
+def run_bulk_benchmark(engines: list, count: int) -> dict:
+    """
+    Runs bulk account creation benchmark (storage and protocol level) for every engine
+    :return: dictionary with results (JSON serializable)
+    """
+    manager = SharedManager()
+    manager.start()
+
+    try:
+        return {
+            "suite": "bulk",
+            "options": {"accounts": count},
+            "environment": describe_environment(),
+            "storage": [benchmark_bulk_storage(manager, engine, count) for engine in engines],
+            "protocol": [benchmark_bulk_protocol(engine, count) for engine in engines],
+        }
+    finally:
+        manager.shutdown()
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+RESPONSE_LIMIT = 1024 * 1024  # longest response line (AP with all account numbers)
+
+
+class BankClient:
+    """
+    Minimal asyncio client for the bank text protocol (one command, one response line).
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 10.0):
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+
+        self._reader = None
+        self._writer = None
+
+    async def connect(self):
+        """
+        Opens connection to the bank
+        """
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self._host, self._port, limit=RESPONSE_LIMIT),
+            self._timeout
+        )
+
+    async def request(self, message: str) -> str:
+        """
+        Sends one command and waits for its response line
+        :param message: command to send (without line ending)
+        :return: response without line ending
+        """
+        self._writer.write(f"{message}\r\n".encode('utf-8'))
+        await self._writer.drain()
+
+        data = await asyncio.wait_for(self._reader.readuntil(b"\r\n"), self._timeout)
+        return data.decode('utf-8').strip()
+
+    async def close(self):
+        """
+        Closes connection, errors are ignored
+        """
+        if self._writer is None:
+            return
+
+        try:
+            self._writer.close()
+            await self._writer.wait_closed()
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._reader = None
+            self._writer = None
+
+
+async def wait_for_bank(host: str, port: int, timeout: float = 30.0) -> bool:
+    """
+    Waits until bank answers BC command
+    :param host: bank host
+    :param port: bank port
+    :param timeout: max time to wait in seconds
+    :return: True if bank responded in time
+    """
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        client = BankClient(host, port, timeout=1.0)
+        try:
+            await client.connect()
+            response = await client.request("BC")
+            if response.startswith("BC"):
+                return True
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            await client.close()
+
+        await asyncio.sleep(0.1)
+
+    return False
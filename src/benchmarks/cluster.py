@@ -0,0 +1,224 @@
+import asyncio
+import json
+import random
+import tempfile
+import time
+from multiprocessing import Process, Event
+from pathlib import Path
+
+from benchmarks.client import BankClient, wait_for_bank
+from benchmarks.runner import (BenchmarkOptions, Recorder, build_config, serve_bank, describe_environment,
+                               _free_port, _prepare_accounts, _run_connection)
+from benchmarks.scenarios import PROXY_MIX
+from utils.configurations import ConfigurationManager
+
+CLUSTER_SUBNET = "127.0.1"  # nodes listen on 127.0.1.1, 127.0.1.2, ... (loopback /8 is routed on Linux)
+CLUSTER_MODES = ("scan", "gossip", "discovery")
+MAX_NODES = 254  # scan range has to be within one /24 subnet
+GOSSIP_CONVERGENCE_TIMEOUT = 120
+
+
+def node_ip(index: int) -> str:
+    return f"{CLUSTER_SUBNET}.{index + 1}"
+
+
+def build_node_configs(temp_dir: str, nodes: int, port: int, mode: str, workers: int,
+                       overrides: dict | None = None) -> list:
+    """
+    Writes configuration file of every node and loads it by ConfigurationManager, so nodes run with
+    validated configuration like a bank started from main.py
+    :param temp_dir: directory for configuration, storage and log files
+    :param port: port of all nodes (every node has its own IP)
+    :param mode: how nodes find each other - scan, gossip or discovery
+    :return: list of configuration dictionaries
+    """
+    discovery_port = _free_port("127.0.0.1")
+    configs = []
+
+    for index in range(nodes):
+        ip = node_ip(index)
+        config_overrides = {
+            "host": ip,
+            "network_scan_ip_range": [node_ip(0), node_ip(nodes - 1)],
+            "network_scan_port_range": [port, port],
+            "monitoring_host": ip,
+            **(overrides or {}),
+        }
+        if mode == "gossip":
+            config_overrides.update(gossip_enabled=True, gossip_interval=0.5, gossip_timeout=5,
+                                    gossip_seeds=[f"{node_ip(0)}:{port}"] if index else [])
+        if mode == "discovery":
+            config_overrides.update(discovery_enabled=True, discovery_port=discovery_port,
+                                    discovery_addresses=["127.255.255.255"])
+
+        options = BenchmarkOptions(bank_workers=workers, config_overrides=config_overrides)
+        config = build_config(str(Path(temp_dir) / f"node-{index}.db"), options, port, port)
+
+        path = Path(temp_dir) / f"node-{index}.json"
+        path.write_text(json.dumps(config), encoding="utf-8")
+        loaded = ConfigurationManager(str(path)).get_config()
+        if loaded is None:
+            raise RuntimeError(f"Configuration of node {index} is invalid, see log")
+        configs.append(loaded)
+
+    return configs
+
+
+def build_proxy_plan(rng: random.Random, count: int, entry: int, accounts: dict) -> list:
+    """
+    Builds commands sent to entry node for accounts of other nodes, so every command is relayed
+    :param entry: index of node the connection is opened to
+    :param accounts: node index: account numbers seeded in the node
+    :return: list of (code, message)
+    """
+    codes = list(PROXY_MIX.keys())
+    weights = list(PROXY_MIX.values())
+    targets = [index for index in accounts if index != entry and accounts[index]]
+
+    plan = []
+    for code in rng.choices(codes, weights=weights, k=count):
+        target = rng.choice(targets)
+        address = f"{rng.choice(accounts[target])}/{node_ip(target)}"
+        plan.append((code, f"AB {address}" if code == "AB" else f"{code} {address} {rng.randint(1, 100)}"))
+
+    return plan
+
+
+async def _wait_for_gossip(port: int, nodes: int) -> float | None:
+    """
+    Waits until every node knows all other nodes (GS without members only pulls the view)
+    :return: seconds until convergence or None on timeout
+    """
+    start = time.perf_counter()
+    while time.perf_counter() - start < GOSSIP_CONVERGENCE_TIMEOUT:
+        views = await asyncio.gather(*(_request(node_ip(index), port, "GS") for index in range(nodes)))
+        if all(view and len(view.split()) - 1 == nodes for view in views):
+            return time.perf_counter() - start
+        await asyncio.sleep(0.2)
+    return None
+
+
+async def _request(host: str, port: int, message: str) -> str | None:
+    client = BankClient(host, port)
+    try:
+        await client.connect()
+        return await client.request(message)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return None
+    finally:
+        await client.close()
+
+
+async def _run_robbery_plans(port: int, nodes: int, count: int, rng: random.Random, recorder: Recorder):
+    """
+    Sends RP to random nodes one by one - RP for 1 stops scanning at the first bank with money,
+    RP for more than all banks hold waits for the whole network
+    """
+    for _ in range(count):
+        for code, amount in (("RP", 1), ("RP_ALL", 10 ** 15)):
+            entry = rng.randrange(nodes)
+            start = time.perf_counter()
+            response = await _request(node_ip(entry), port, f"RP {amount}")
+            recorder.record(code, time.perf_counter() - start, response)
+
+
+async def _drive_cluster(port: int, nodes: int, mode: str, options: BenchmarkOptions, robbery_plans: int) -> dict:
+    start = time.perf_counter()
+    started = await asyncio.gather(*(wait_for_bank(node_ip(index), port, timeout=60) for index in range(nodes)))
+    if not all(started):
+        raise RuntimeError(f"{started.count(False)} of {nodes} nodes did not start in time")
+    startup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    seeded = await asyncio.gather(*(
+        _prepare_accounts(node_ip(index), port, options.accounts) for index in range(nodes)
+    ))
+    accounts = dict(enumerate(seeded))
+    seeding = time.perf_counter() - start
+
+    convergence = await _wait_for_gossip(port, nodes) if mode == "gossip" else None
+
+    rng = random.Random(options.seed)
+    plans = [
+        (index % nodes, build_proxy_plan(random.Random(options.seed * 1_000_003 + index), options.requests,
+                                         index % nodes, accounts))
+        for index in range(options.connections)
+    ]
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _run_connection(node_ip(entry), port, plan, True, recorder) for entry, plan in plans
+    ))
+    proxy = recorder.summary(time.perf_counter() - start)
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    await _run_robbery_plans(port, nodes, robbery_plans, rng, recorder)
+    robbery = recorder.summary(time.perf_counter() - start)
+
+    return {
+        "nodes": nodes,
+        "startup_s": round(startup, 4),
+        "seeding_s": round(seeding, 4),
+        "gossip_convergence_s": round(convergence, 4) if convergence is not None else None,
+        "proxy": proxy,
+        "robbery_plan": robbery,
+    }
+
+
+def run_cluster(nodes: int, mode: str, options: BenchmarkOptions, robbery_plans: int = 5) -> dict:
+    """
+    Starts nodes banks (each in its own process with own SharedManager and temporary sqlite file)
+    on loopback addresses, seeds them with accounts and measures relayed commands and RP, then stops them
+    :param nodes: number of banks
+    :param mode: how nodes find each other - scan, gossip or discovery
+    :param options: connections, requests, accounts, bank_workers, seed and config_overrides are used
+    :param robbery_plans: number of RP pairs (reachable and unreachable amount)
+    :return: dictionary with results of this cluster size
+    """
+    port = _free_port("127.0.0.1")
+
+    with tempfile.TemporaryDirectory(prefix="bank-cluster-bench-") as temp_dir:
+        configs = build_node_configs(temp_dir, nodes, port, mode, options.bank_workers, options.config_overrides)
+
+        stop_event = Event()
+        processes = [
+            Process(target=serve_bank, args=(config, str(Path(temp_dir) / f"node-{index}.log"), stop_event))
+            for index, config in enumerate(configs)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            return asyncio.run(_drive_cluster(port, nodes, mode, options, robbery_plans))
+        finally:
+            stop_event.set()
+            for process in processes:
+                process.join(timeout=15)
+                if process.is_alive():
+                    process.terminate()
+
+
+def run_cluster_benchmark(sizes: list, mode: str, options: BenchmarkOptions, robbery_plans: int = 5) -> dict:
+    """
+    Runs cluster of every size one after another, so latency of relayed commands and scan time of RP
+    can be compared as the network grows
+    :param sizes: numbers of nodes, 2..254
+    :return: dictionary with results (JSON serializable)
+    """
+    if mode not in CLUSTER_MODES:
+        raise ValueError(f"Cluster mode must be one of {', '.join(CLUSTER_MODES)}")
+    if any(not (2 <= size <= MAX_NODES) for size in sizes):
+        raise ValueError(f"Cluster size must be between 2 and {MAX_NODES}")
+
+    return {
+        "suite": "cluster",
+        "options": {
+            "sizes": sizes, "mode": mode, "connections": options.connections, "requests": options.requests,
+            "accounts": options.accounts, "bank_workers": options.bank_workers, "robbery_plans": robbery_plans,
+            "seed": options.seed,
+        },
+        "environment": describe_environment(),
+        "results": [run_cluster(size, mode, options, robbery_plans) for size in sizes],
+    }
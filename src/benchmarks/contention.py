@@ -0,0 +1,139 @@
+import bisect
+import itertools
+import random
+import tempfile
+import time
+from multiprocessing import Process, Queue
+from pathlib import Path
+
+from bank.allocator import AccountAllocator
+from bank.engines import prepare_storage, create_storage, create_cache, create_hot_accounts
+from benchmarks.runner import describe_environment
+from utils.shared import SharedManager
+
+
+def zipf_sampler(count: int, exponent: float, rng: random.Random):
+    """
+    Creates sampler of indexes 0..count-1 with Zipf distribution (index 0 is the most frequent)
+    :return: function returning next index
+    """
+    cumulative = list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+    total = cumulative[-1]
+    return lambda: bisect.bisect_left(cumulative, rng.random() * total)
+
+
+def _contention_worker(config: dict, cache, lock, allocator, hot_accounts, index: int, accounts: list,
+                       operations: int, exponent: float, seed: int, results: Queue):
+    storage = create_storage(config, cache, lock, allocator, hot_accounts=hot_accounts, worker_index=index)
+    rng = random.Random(seed + index)
+    sample = zipf_sampler(len(accounts), exponent, rng)
+
+    deposited = withdrawn = errors = 0
+    for _ in range(operations):
+        account = accounts[sample()]
+        roll = rng.random()
+
+        if roll < 0.8:
+            if storage.deposit(account, 1):
+                errors += 1
+            else:
+                deposited += 1
+        elif roll < 0.9:
+            if not storage.withdraw(account, 1):
+                withdrawn += 1
+        elif storage.get_balance(account) is None:
+            errors += 1
+
+    storage.close()
+    results.put((deposited, withdrawn, errors))
+
+
+def benchmark_contention(manager, hot: bool, accounts: int, operations: int, processes: int, exponent: float,
+                         seed: int = 1) -> dict:
+    """
+    Several processes (like workers) deposit (80 %), withdraw (10 %) and read balance (10 %) of accounts
+    chosen with Zipf distribution, so a few accounts receive most of the traffic.
+    :param manager: started SharedManager
+    :param hot: enables hot account deposit aggregation
+    :return: dictionary with results
+    """
+    with tempfile.TemporaryDirectory(prefix="bank-contention-bench-") as temp_dir:
+        config = {
+            "storage_path": str(Path(temp_dir) / "storage.db"),
+            "storage_timeout": 30,
+            "hot_accounts": hot,
+        }
+
+        cache = create_cache(config, manager)
+        lock = manager.Lock()
+        prepare_storage(config, cache)
+
+        allocator = AccountAllocator()
+        hot_accounts = create_hot_accounts(config, processes + 1)
+        primary = create_storage(config, cache, lock, allocator, hot_accounts=hot_accounts)
+        created = primary.create_accounts(accounts)
+
+        results = Queue()
+        per_process = operations // processes
+        workers = [
+            Process(
+                target=_contention_worker,
+                args=(config, cache, lock, allocator, hot_accounts, index + 1, created, per_process, exponent,
+                      seed, results)
+            )
+            for index in range(processes)
+        ]
+
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        totals = [results.get() for _ in workers]
+        duration = time.perf_counter() - start
+
+        for worker in workers:
+            worker.join()
+
+        deposited = sum(total[0] for total in totals)
+        withdrawn = sum(total[1] for total in totals)
+        hot_stats = hot_accounts.get_stats() if hot_accounts else None
+        primary.close()
+
+        check = create_storage(config, cache, lock, allocator)
+        stored_total = check.get_total_amount()
+        check.close()
+
+        return {
+            "hot_accounts": hot,
+            "operations": per_process * processes,
+            "rps": round(per_process * processes / duration, 2) if duration else None,
+            "errors": sum(total[2] for total in totals),
+            "withdrawn": withdrawn,
+            "hot_account_count": len(hot_stats["accounts"]) if hot_stats else 0,
+            "consistent": stored_total == deposited - withdrawn,
+        }
+
+
+def run_contention_benchmark(accounts: int, operations: int, processes: int, exponent: float = 1.1,
+                             seed: int = 1) -> dict:
+    """
+    Compares storage with and without hot account deposit aggregation under Zipf distributed traffic
+    :return: dictionary with results (JSON serializable)
+    """
+    manager = SharedManager()
+    manager.start()
+
+    try:
+        return {
+            "suite": "contention",
+            "options": {
+                "accounts": accounts, "operations": operations, "processes": processes,
+                "zipf_exponent": exponent, "seed": seed,
+            },
+            "environment": describe_environment(),
+            "results": [
+                benchmark_contention(manager, hot, accounts, operations, processes, exponent, seed)
+                for hot in (False, True)
+            ],
+        }
+    finally:
+        manager.shutdown()
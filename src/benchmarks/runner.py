@@ -0,0 +1,350 @@
+import asyncio
+import os
+import platform
+import random
+import socket
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass, field, asdict
+from multiprocessing import Process, Event
+from pathlib import Path
+from threading import Thread
+
+from bank.bank import Bank
+from bank.security import SecurityGuard
+from benchmarks.client import BankClient, wait_for_bank
+from benchmarks.scenarios import Scenario, SCENARIOS, build_plan
+from benchmarks.stubs import start_stub_banks
+from logger.configure import configure_logger_queue, add_queue_handler_to_root
+from utils.shared import SharedManager
+
+BANK_HOST = "127.0.0.1"
+INITIAL_BALANCE = 1_000_000
+
+
+@dataclass
+class BenchmarkOptions:
+    """
+    Parameters of one benchmark run
+    """
+
+    scenario: str = "keepalive"
+    connections: int = 16
+    requests: int = 200  # per connection
+    accounts: int = 100
+    hot_accounts: int = 2
+    stub_banks: int = 2
+    bank_workers: int = 2
+    mix: dict | None = None
+    seed: int = 1
+    config_overrides: dict = field(default_factory=dict)
+
+
+class Recorder:
+    """
+    Collects latencies and errors of all requests
+    """
+
+    def __init__(self):
+        self._latencies = {}
+        self._errors = {}
+        self._failures = {}
+
+    def record(self, code: str, latency: float, response: str | None):
+        """
+        Records one request
+        :param code: command code
+        :param latency: latency in seconds
+        :param response: response or None if request failed on network level
+        """
+        if response is None:
+            self._failures[code] = self._failures.get(code, 0) + 1
+            return
+
+        self._latencies.setdefault(code, []).append(latency)
+        if response.startswith("ER"):
+            self._errors[code] = self._errors.get(code, 0) + 1
+
+    def summary(self, duration: float) -> dict:
+        """
+        Creates summary of recorded requests
+        :param duration: wall time of the measured phase
+        :return: dictionary with throughput, latency percentiles and error rates
+        """
+        all_latencies = []
+        commands = {}
+
+        for code in sorted(set(self._latencies) | set(self._failures)):
+            latencies = self._latencies.get(code, [])
+            all_latencies.extend(latencies)
+            commands[code] = self._describe(
+                latencies, self._errors.get(code, 0), self._failures.get(code, 0)
+            )
+
+        total = self._describe(all_latencies, sum(self._errors.values()), sum(self._failures.values()))
+        total["duration_s"] = round(duration, 4)
+        total["throughput_rps"] = round(total["requests"] / duration, 2) if duration > 0 else 0.0
+
+        return {"total": total, "commands": commands}
+
+    @staticmethod
+    def _describe(latencies: list, errors: int, failures: int) -> dict:
+        requests = len(latencies) + failures
+        ordered = sorted(latencies)
+
+        return {
+            "requests": requests,
+            "errors": errors,
+            "failures": failures,
+            "error_rate": round((errors + failures) / requests, 4) if requests else 0.0,
+            "latency_ms": {
+                "p50": _percentile(ordered, 50),
+                "p95": _percentile(ordered, 95),
+                "p99": _percentile(ordered, 99),
+                "mean": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else None,
+                "max": round(ordered[-1] * 1000, 3) if ordered else None,
+            }
+        }
+
+
+def _percentile(ordered: list, percent: int) -> float | None:
+    """
+    Nearest-rank percentile
+    :param ordered: sorted latencies in seconds
+    :param percent: percentile to get
+    :return: latency in milliseconds
+    """
+    if not ordered:
+        return None
+
+    rank = max(0, min(len(ordered) - 1, -(-percent * len(ordered) // 100) - 1))
+    return round(ordered[rank] * 1000, 3)
+
+
+def _free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def build_config(storage_path: str, options: BenchmarkOptions, port: int, scan_port: int) -> dict:
+    """
+    Builds bank configuration for benchmark, limits that would ban the load generator are lifted.
+    :param storage_path: path to temporary sqlite file
+    :param options: benchmark options
+    :param port: bank port
+    :param scan_port: port where stub peer banks listen
+    :return: configuration dictionary
+    """
+    config = {
+        "host": BANK_HOST,
+        "port": port,
+        "storage_path": storage_path,
+        "storage_timeout": 5,
+        "bank_workers": options.bank_workers,
+        "client_timeout": 30,
+        "max_requests_per_minute": 1_000_000_000,
+        "max_bad_commands": 1_000_000_000,
+        "ban_duration": 1,
+        "monitoring_host": BANK_HOST,
+        "monitoring_port": 8090,
+        "network_scan_port_range": [scan_port, scan_port],
+        "network_scan_ip_range": ["127.0.0.2", "127.0.0.2"],
+        "network_timeout": 2,
+    }
+    config.update(options.config_overrides)
+    config["bank_code"] = config["host"]
+    return config
+
+
+def serve_bank(config: dict, log_path: str, stop_event: Event):
+    """
+    Runs bank until stop event is set. Target of the bank host process.
+    :param config: bank configuration
+    :param log_path: log file of this run
+    :param stop_event: event that stops the bank
+    """
+    log_queue, listener = configure_logger_queue(log_path, suppress_console=True)
+    queue_handler = add_queue_handler_to_root(log_queue)
+    listener.start()
+
+    manager = SharedManager()
+    manager.start()
+    bank = None
+    try:
+        security = SecurityGuard(manager, config["ban_duration"])
+        bank = Bank(config, log_queue, manager, security)
+        Thread(target=bank.open_bank, daemon=True).start()
+        stop_event.wait()
+    finally:
+        if bank:
+            bank.close_bank()
+        manager.shutdown()
+        queue_handler.close()
+        listener.stop()
+        os._exit(0)
+
+
+async def _prepare_accounts(host: str, port: int, count: int) -> list:
+    """
+    Creates accounts with initial balance, not measured
+    :return: list of account numbers
+    """
+    client = BankClient(host, port)
+    await client.connect()
+
+    accounts = []
+    try:
+        for _ in range(count):
+            response = await client.request("AC")
+            if not response.startswith("AC "):
+                continue
+
+            address = response[3:]
+            await client.request(f"AD {address} {INITIAL_BALANCE}")
+            accounts.append(address.split('/')[0])
+    finally:
+        await client.close()
+
+    return accounts
+
+
+async def _run_connection(host: str, port: int, plan: list, keep_alive: bool, recorder: Recorder):
+    """
+    Sends planned commands, either over one connection or over a new connection per command
+    """
+    client = BankClient(host, port)
+    connected = False
+
+    try:
+        for code, message in plan:
+            start = time.perf_counter()
+            try:
+                if not connected:
+                    await client.connect()
+                    connected = True
+
+                response = await client.request(message)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                response = None
+                await client.close()
+                connected = False
+
+            recorder.record(code, time.perf_counter() - start, response)
+
+            if not keep_alive and connected:
+                await client.close()
+                connected = False
+    finally:
+        await client.close()
+
+
+async def _drive(scenario: Scenario, options: BenchmarkOptions, port: int, peers: list) -> dict:
+    if not await wait_for_bank(BANK_HOST, port):
+        raise RuntimeError("Bank did not start in time")
+
+    setup_start = time.perf_counter()
+    if scenario.proxied:
+        accounts = [str(10_000 + i) for i in range(options.accounts)]
+        bank_codes = peers
+    else:
+        accounts = await _prepare_accounts(BANK_HOST, port, options.accounts)
+        bank_codes = [BANK_HOST]
+        if not accounts:
+            raise RuntimeError("Could not create any account")
+
+    if scenario.hot:
+        accounts = accounts[:max(1, options.hot_accounts)]
+    setup_duration = time.perf_counter() - setup_start
+
+    plans = [
+        build_plan(scenario, random.Random(options.seed * 1_000_003 + index), options.requests, accounts, bank_codes)
+        for index in range(options.connections)
+    ]
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _run_connection(BANK_HOST, port, plan, scenario.keep_alive, recorder) for plan in plans
+    ))
+    duration = time.perf_counter() - start
+
+    summary = recorder.summary(duration)
+    summary["setup_s"] = round(setup_duration, 4)
+    return summary
+
+
+def _git_revision() -> str | None:
+    try:
+        root = Path(__file__).resolve().parent.parent.parent
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+        if not revision:
+            return None
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def describe_environment() -> dict:
+    """
+    Metadata that makes results comparable between commits and machines
+    """
+    return {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_benchmark(options: BenchmarkOptions) -> dict:
+    """
+    Starts bank with temporary sqlite file, drives it with generated load and stops it.
+    :param options: benchmark options
+    :return: dictionary with results (JSON serializable)
+    """
+    scenario = SCENARIOS[options.scenario]
+    if options.mix:
+        scenario = Scenario(**{**asdict(scenario), "mix": dict(options.mix)})
+
+    port = _free_port(BANK_HOST)
+    scan_port = _free_port(BANK_HOST)
+    peers = [f"127.0.0.{2 + i}" for i in range(options.stub_banks)] if scenario.proxied else []
+
+    with tempfile.TemporaryDirectory(prefix="bank-bench-") as temp_dir:
+        config = build_config(str(Path(temp_dir) / "storage.db"), options, port, scan_port)
+        if peers:
+            config["network_scan_ip_range"] = [peers[0], peers[-1]]
+
+        stubs = start_stub_banks(peers, scan_port)
+        stop_event = Event()
+        bank_process = Process(target=serve_bank, args=(config, str(Path(temp_dir) / "bench.log"), stop_event))
+        bank_process.start()
+
+        try:
+            results = asyncio.run(_drive(scenario, options, port, peers))
+        finally:
+            stop_event.set()
+            bank_process.join(timeout=15)
+            if bank_process.is_alive():
+                bank_process.terminate()
+
+            for stub in stubs:
+                stub.terminate()
+
+    return {
+        "scenario": scenario.name,
+        "description": scenario.description,
+        "options": asdict(options),
+        "mix": scenario.mix,
+        "environment": describe_environment(),
+        "results": results,
+    }
+
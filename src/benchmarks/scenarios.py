@@ -0,0 +1,108 @@
+import random
+from dataclasses import dataclass, field
+
+DEFAULT_MIX = {"AC": 5, "AD": 25, "AW": 20, "AB": 40, "BA": 5, "BN": 5}
+PROXY_MIX = {"AD": 25, "AW": 25, "AB": 50}
+HOT_MIX = {"AD": 45, "AW": 35, "AB": 20}
+
+
+@dataclass
+class Scenario:
+    """
+    Describes shape of the generated load
+    """
+
+    name: str
+    description: str
+    keep_alive: bool = True
+    mix: dict = field(default_factory=lambda: dict(DEFAULT_MIX))
+    hot: bool = False
+    proxied: bool = False
+
+
+SCENARIOS = {
+    "keepalive": Scenario(
+        name="keepalive",
+        description="Every connection stays open and sends all of its requests",
+    ),
+    "churn": Scenario(
+        name="churn",
+        description="New connection for every request",
+        keep_alive=False,
+    ),
+    "hot": Scenario(
+        name="hot",
+        description="All mutations and reads hit a few hot accounts",
+        mix=dict(HOT_MIX),
+        hot=True,
+    ),
+    "proxy": Scenario(
+        name="proxy",
+        description="Account commands are relayed to local stub peer banks",
+        mix=dict(PROXY_MIX),
+        proxied=True,
+    ),
+}
+
+
+def parse_mix(text: str) -> dict:
+    """
+    Parses command mix in this format AD=30,AB=50,...
+    :param text: mix to parse
+    :return: dictionary with command codes and their weights
+    """
+    mix = {}
+    for part in text.split(','):
+        if not part.strip():
+            continue
+
+        code, _, weight = part.partition('=')
+        code = code.strip().upper()
+        if code not in DEFAULT_MIX:
+            raise ValueError(f"Command {code} is not supported by the benchmark")
+
+        mix[code] = int(weight)
+
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("Command mix must contain at least one positive weight")
+
+    return mix
+
+
+def build_command(code: str, rng: random.Random, accounts: list, bank_codes: list) -> str:
+    """
+    Builds one protocol command
+    :param code: command code
+    :param rng: random generator of the connection
+    :param accounts: account numbers to pick from
+    :param bank_codes: bank codes (ips) to address accounts at
+    :return: command message
+    """
+    if code in ("AC", "BA", "BN"):
+        return code
+
+    address = f"{rng.choice(accounts)}/{rng.choice(bank_codes)}"
+    if code == "AB":
+        return f"AB {address}"
+
+    return f"{code} {address} {rng.randint(1, 100)}"
+
+
+def build_plan(scenario: Scenario, rng: random.Random, count: int, accounts: list, bank_codes: list) -> list:
+    """
+    Builds deterministic list of commands for one connection
+    :param scenario: scenario to follow
+    :param rng: random generator of the connection
+    :param count: number of commands
+    :param accounts: account numbers to pick from
+    :param bank_codes: bank codes (ips) to address accounts at
+    :return: list of (code, message)
+    """
+    codes = list(scenario.mix.keys())
+    weights = list(scenario.mix.values())
+
+    plan = []
+    for code in rng.choices(codes, weights=weights, k=count):
+        plan.append((code, build_command(code, rng, accounts, bank_codes)))
+
+    return plan
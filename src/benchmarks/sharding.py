@@ -0,0 +1,108 @@
+import random
+import tempfile
+import time
+from multiprocessing import Process, Queue
+from pathlib import Path
+
+from bank.allocator import AccountAllocator
+from bank.engines import prepare_storage, create_storage, create_cache
+from benchmarks.runner import describe_environment
+from utils.shared import SharedManager
+
+
+def _writer(config: dict, cache, lock, allocator, accounts: list, operations: int, seed: int, results: Queue):
+    storage = create_storage(config, cache, lock, allocator)
+    rng = random.Random(seed)
+
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(operations):
+        if storage.deposit(rng.choice(accounts), 1):
+            errors += 1
+    duration = time.perf_counter() - start
+
+    storage.close()
+    results.put((errors, duration))
+
+
+def benchmark_shards(manager, shards: int, accounts: int, operations: int, processes: int, seed: int = 1) -> dict:
+    """
+    Several processes (like workers) deposit to random accounts, every deposit is one committed transaction,
+    so with one shard all processes wait for the same SQLite write lock
+    :param manager: started SharedManager
+    :param shards: storage_shards of the storage
+    :return: dictionary with results
+    """
+    with tempfile.TemporaryDirectory(prefix="bank-sharding-bench-") as temp_dir:
+        config = {
+            "storage_path": str(Path(temp_dir) / "storage.db"),
+            "storage_timeout": 30,
+            "storage_shards": shards,
+        }
+
+        cache = create_cache(config, manager)
+        lock = manager.Lock()
+        if not prepare_storage(config, cache):
+            raise RuntimeError(f"Could not prepare storage with {shards} shards")
+
+        allocator = AccountAllocator()
+        primary = create_storage(config, cache, lock, allocator)
+        created = primary.create_accounts(accounts)
+
+        results = Queue()
+        per_process = operations // processes
+        writers = [
+            Process(target=_writer, args=(config, cache, lock, allocator, created, per_process, seed + index, results))
+            for index in range(processes)
+        ]
+
+        start = time.perf_counter()
+        for writer in writers:
+            writer.start()
+        totals = [results.get() for _ in writers]
+        duration = time.perf_counter() - start
+
+        for writer in writers:
+            writer.join()
+
+        stored_total = primary.get_total_amount()
+        primary.close()
+
+        # warm-up of a restarted bank, shards are loaded in parallel
+        start = time.perf_counter()
+        prepare_storage(config, create_cache(config, manager))
+        load_duration = time.perf_counter() - start
+
+        errors = sum(total[0] for total in totals)
+        return {
+            "shards": shards,
+            "operations": per_process * processes,
+            "rps": round(per_process * processes / duration, 2) if duration else None,
+            "errors": errors,
+            "load_s": round(load_duration, 4),
+            "consistent": stored_total == per_process * processes - errors,
+        }
+
+
+def run_sharding_benchmark(shard_counts: list, accounts: int, operations: int, processes: int, seed: int = 1) -> dict:
+    """
+    Compares write throughput of sqlite storage with different number of shards
+    :return: dictionary with results (JSON serializable)
+    """
+    manager = SharedManager()
+    manager.start()
+
+    try:
+        return {
+            "suite": "sharding",
+            "options": {
+                "shards": shard_counts, "accounts": accounts, "operations": operations, "processes": processes,
+                "seed": seed,
+            },
+            "environment": describe_environment(),
+            "results": [
+                benchmark_shards(manager, shards, accounts, operations, processes, seed) for shards in shard_counts
+            ],
+        }
+    finally:
+        manager.shutdown()
@@ -0,0 +1,120 @@
+import random
+import tempfile
+import time
+from pathlib import Path
+from threading import Thread
+
+from bank.allocator import AccountAllocator
+from bank.engines import prepare_storage, create_storage, create_cache
+from benchmarks.runner import describe_environment
+from utils.shared import SharedManager
+
+
+def _deposit_worker(storage, accounts: list, count: int, seed: int, errors: list):
+    rng = random.Random(seed)
+    for _ in range(count):
+        if storage.deposit(rng.choice(accounts), rng.randint(1, 100)):
+            errors.append(1)
+
+
+def benchmark_engine(engine: str, accounts: int, operations: int, threads: int, seed: int = 1,
+                     cache_options: dict | None = None) -> dict:
+    """
+    Measures write throughput of storage engine and time to recover all data after restart.
+    Storage is used directly (without protocol) from several threads.
+    :param engine: storage engine name
+    :param accounts: number of accounts to create
+    :param operations: number of deposits
+    :param threads: number of writing threads
+    :param seed: random seed
+    :param cache_options: cache_policy and cache_capacity configuration
+    :return: dictionary with results
+    """
+    manager = SharedManager()
+    manager.start()
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="bank-storage-bench-") as temp_dir:
+            config = {
+                "storage_path": str(Path(temp_dir) / "storage.db"),
+                "storage_timeout": 15,
+                "storage_engine": engine,
+                **(cache_options or {}),
+            }
+
+            cache = create_cache(config, manager)
+            lock = manager.Lock()
+            if not prepare_storage(config, cache):
+                raise RuntimeError(f"Could not prepare {engine} storage")
+
+            allocator = AccountAllocator()
+            storage = create_storage(config, cache, lock, allocator)
+
+            start = time.perf_counter()
+            created = [account for account in (storage.create_account() for _ in range(accounts)) if account]
+            create_duration = time.perf_counter() - start
+
+            errors = []
+            per_thread = operations // threads
+            workers = [
+                Thread(target=_deposit_worker, args=(storage, created, per_thread, seed + index, errors))
+                for index in range(threads)
+            ]
+
+            start = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            write_duration = time.perf_counter() - start
+
+            expected_total = storage.get_total_amount()
+            storage.close()
+
+            recovered = create_cache(config, manager)
+            start = time.perf_counter()
+            recovered_ok = prepare_storage(config, recovered)
+            recovery_duration = time.perf_counter() - start
+
+            return {
+                "engine": engine,
+                "accounts": len(created),
+                "create_rps": round(len(created) / create_duration, 2) if create_duration else None,
+                "deposits": per_thread * threads,
+                "deposit_errors": len(errors),
+                "write_rps": round(per_thread * threads / write_duration, 2) if write_duration else None,
+                "recovery_s": round(recovery_duration, 4),
+                "recovered_consistent": recovered_ok and storage_total(config, recovered, lock) == expected_total,
+                "cache": cache.get_stats(),
+            }
+    finally:
+        manager.shutdown()
+
+
+def storage_total(config: dict, cache, lock) -> int:
+    """
+    Reads total amount through new storage, as after restart
+    """
+    storage = create_storage(config, cache, lock, AccountAllocator())
+    try:
+        return storage.get_total_amount()
+    finally:
+        storage.close()
+
+
+def run_storage_benchmark(engines: list, accounts: int, operations: int, threads: int, seed: int = 1,
+                          cache_options: dict | None = None) -> dict:
+    """
+    Runs storage benchmark for every engine
+    :return: dictionary with results (JSON serializable)
+    """
+    return {
+        "suite": "storage",
+        "options": {
+            "accounts": accounts, "operations": operations, "threads": threads, "seed": seed, **(cache_options or {})
+        },
+        "environment": describe_environment(),
+        "results": [
+            benchmark_engine(engine, accounts, operations, threads, seed, cache_options) for engine in engines
+        ],
+    }
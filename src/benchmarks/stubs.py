@@ -0,0 +1,81 @@
+import asyncio
+from multiprocessing import Process
+
+
+class StubBank:
+    """
+    Fake peer bank used as proxy target. Answers protocol commands without any storage,
+    so measured proxy latency is dominated by the relaying bank.
+    """
+
+    def __init__(self, host: str, port: int, total_amount: int = 1_000_000, client_count: int = 10):
+        self._host = host
+        self._port = port
+        self._total_amount = total_amount
+        self._client_count = client_count
+
+    def handle(self, message: str) -> str:
+        """
+        Creates response for one command
+        :param message: received command
+        :return: response without line ending
+        """
+        parts = message.split()
+        if not parts:
+            return "ER Invalid command"
+
+        code = parts[0].upper()
+        if code == "BC":
+            return f"BC {self._host}"
+        if code == "BA":
+            return f"BA {self._total_amount}"
+        if code == "BN":
+            return f"BN {self._client_count}"
+        if code == "AB":
+            return "AB 1000"
+        if code in ("AD", "AW"):
+            return code
+        return "ER Invalid command"
+
+    async def _on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                data = await reader.readline()
+                if not data:
+                    break
+
+                response = self.handle(data.decode('utf-8').strip())
+                writer.write(f"{response}\r\n".encode('utf-8'))
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        """
+        Serves clients until the process is terminated
+        """
+        server = await asyncio.start_server(self._on_client, self._host, self._port)
+        async with server:
+            await server.serve_forever()
+
+
+def _run_stub(host: str, port: int):
+    asyncio.run(StubBank(host, port).serve())
+
+
+def start_stub_banks(hosts: list, port: int) -> list:
+    """
+    Starts one stub bank process per host
+    :param hosts: loopback addresses to listen on
+    :param port: port shared by all stubs
+    :return: list of started processes
+    """
+    processes = []
+    for host in hosts:
+        process = Process(target=_run_stub, args=(host, port), daemon=True)
+        process.start()
+        processes.append(process)
+
+    return processes
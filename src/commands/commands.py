@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
 from typing import Generic, TypeVar
-from commands.contexts import CommandContext, BankCodeContext, StorageContext, NetworkContext
+from commands.contexts import (
+    CommandContext, BankCodeContext, StorageContext, NetworkContext, BulkStorageContext, GossipContext, ReadContext)
 from commands.parser import parse_address
+from network.gossip import format_members, parse_members
 
 T = TypeVar('T', bound=CommandContext)
 
@@ -17,6 +19,13 @@ class BaseCommand(ABC, Generic[T]):
     def code(self) -> str:
         return self._code
 
+    @property
+    def cost(self) -> int:
+        """
+        Number of requests the command counts as against client rate limit
+        """
+        return 1
+
     @abstractmethod
     def execute(self) -> str:
         """
@@ -64,6 +73,35 @@ class CreateAccountCommand(BaseCommand[StorageContext]):
         else:
             return self._error_response("Failed to create account, try again later")
 
+class BulkCreateAccountCommand(BaseCommand[BulkStorageContext]):
+    """
+    Command to create many accounts at once. Response is one line with number of created accounts, bank code
+    and comma separated account numbers. Every account counts as one request against rate limit.
+    """
+
+    def __init__(self, code: str, context: BulkStorageContext, count: str):
+        super().__init__(code, context)
+        try:
+            self._count = int(count)
+            if not (1 <= self._count <= self._context.limit):
+                raise ValueError
+        except ValueError:
+            self._count = None
+
+    @property
+    def cost(self) -> int:
+        return self._count or 1
+
+    def execute(self) -> str:
+        if self._count is None:
+            return self._error_response(f"Count must be a number from 1 to {self._context.limit}")
+
+        accounts = self._context.storage.create_accounts(self._count)
+        if not accounts:
+            return self._error_response("Failed to create accounts, try again later")
+
+        return self._success_response(f"{len(accounts)} {self._context.bank_code} {','.join(accounts)}")
+
 class RemoveAccountCommand(BaseCommand[StorageContext]):
     """
     Command to remove an account
@@ -151,13 +189,14 @@ class AccountWithdrawCommand(BaseCommand[StorageContext]):
         return self._success_response()
 
 
-class AccountBalanceCommand(BaseCommand[StorageContext]):
+class AccountBalanceCommand(BaseCommand[ReadContext]):
     """
-    Gets account balance
+    Gets account balance, from read snapshot if it is enabled (AB <account> strict reads storage)
     """
 
-    def __init__(self, code: str, context: StorageContext, account_address: str):
+    def __init__(self, code: str, context: ReadContext, account_address: str, mode: str | None = None):
         super().__init__(code, context)
+        self._strict = _is_strict(mode)
         try:
             account, _ = parse_address(account_address)
             if account:
@@ -174,36 +213,77 @@ class AccountBalanceCommand(BaseCommand[StorageContext]):
     def execute(self) -> str:
         if self._account_number is None:
             return self._error_response("Invalid account number format")
+        if self._strict is None:
+            return self._error_response("Invalid read mode")
+
+        balance = None
+        if self._context.snapshot is not None and not self._strict:
+            balance = self._context.snapshot.get_balance(self._account_number, self._context.max_staleness)
+        if balance is None:
+            # account created after the snapshot or stale snapshot
+            balance = self._context.storage.get_balance(self._account_number)
 
-        balance = self._context.storage.get_balance(self._account_number)
         if balance is None:
             return self._error_response("Account not found")
         return self._success_response(str(balance))
 
 
-class BankAmountCommand(BaseCommand[StorageContext]):
+class BankAmountCommand(BaseCommand[ReadContext]):
     """
-    Gets total amount in bank
+    Gets total amount in bank, from read snapshot if it is enabled (BA strict reads storage)
     """
 
+    def __init__(self, code: str, context: ReadContext, mode: str | None = None):
+        super().__init__(code, context)
+        self._strict = _is_strict(mode)
+
     def execute(self) -> str:
-        total = self._context.storage.get_total_amount()
+        if self._strict is None:
+            return self._error_response("Invalid read mode")
+
+        total = None
+        if self._context.snapshot is not None and not self._strict:
+            total = self._context.snapshot.get_total_amount(self._context.max_staleness)
+        if total is None:
+            total = self._context.storage.get_total_amount()
         return self._success_response(str(total))
 
 
-class BankNumberCommand(BaseCommand[StorageContext]):
+class BankNumberCommand(BaseCommand[ReadContext]):
     """
-    Gets number of clients
+    Gets number of clients, from read snapshot if it is enabled (BN strict reads storage)
     """
 
+    def __init__(self, code: str, context: ReadContext, mode: str | None = None):
+        super().__init__(code, context)
+        self._strict = _is_strict(mode)
+
     def execute(self) -> str:
-        count = self._context.storage.get_client_count()
+        if self._strict is None:
+            return self._error_response("Invalid read mode")
+
+        count = None
+        if self._context.snapshot is not None and not self._strict:
+            count = self._context.snapshot.get_client_count(self._context.max_staleness)
+        if count is None:
+            count = self._context.storage.get_client_count()
         return self._success_response(str(count))
 
 
+def _is_strict(mode: str | None) -> bool | None:
+    """
+    Parses optional read mode argument of AB, BA and BN
+    :return: True for strict read, False without mode, None if mode is invalid
+    """
+    if mode is None:
+        return False
+    return True if mode.lower() == "strict" else None
+
+
 class RobberyPlanCommand(BaseCommand[NetworkContext]):
     """
-    Creates a robbery plan - scans network and finds optimal banks to rob
+    Creates a robbery plan - scans network and finds optimal banks to rob.
+    Scan stops as soon as banks found so far hold the target amount.
     """
 
     def __init__(self, code: str, context: NetworkContext, target_amount: str):
@@ -220,12 +300,23 @@ class RobberyPlanCommand(BaseCommand[NetworkContext]):
             return self._error_response("Invalid target amount")
 
         try:
-            banks = self._context.scanner.scan_network(self._context.our_ip)
+            scanner = self._context.scanner
+            banks = []
+            found_amount = 0
+            scan = scanner.iter_banks(self._context.our_ip)
+            try:
+                for bank in scan:
+                    banks.append(bank)
+                    found_amount += bank.total_amount
+                    if found_amount >= self._target_amount:
+                        break
+            finally:
+                scan.close()
 
             if not banks:
                 return self._error_response("No banks found in network")
 
-            targets = self._context.scanner.find_robbery_targets(self._target_amount, banks)
+            targets = scanner.find_robbery_targets(self._target_amount, banks)
 
             if not targets:
                 return self._error_response("Could not create robbery plan")
@@ -242,4 +333,23 @@ class RobberyPlanCommand(BaseCommand[NetworkContext]):
             return self._success_response(message)
 
         except Exception as e:
-            return self._error_response(f"Error creating robbery plan: {str(e)}")
\ No newline at end of file
+            return self._error_response(f"Error creating robbery plan: {str(e)}")
+
+
+class GossipCommand(BaseCommand[GossipContext]):
+    """
+    Gossip exchange - merges members sent by other bank (GS <ip>:<port>:<heartbeat>:<amount>:<clients> ...)
+    and answers with this bank and alive members it knows (push-pull)
+    """
+
+    def __init__(self, code: str, context: GossipContext, *entries: str):
+        super().__init__(code, context)
+        self._entries = list(entries)
+
+    def execute(self) -> str:
+        if self._context.membership is None:
+            return self._error_response("Gossip is disabled")
+
+        self._context.membership.merge(parse_members(self._entries))
+        return self._success_response(format_members(self._context.membership.view()))
+
@@ -21,7 +21,23 @@ class StorageContext(CommandContext):
     bank_code: str
     storage: BankStorage
 
+
+@dataclass
+class BulkStorageContext(StorageContext):
+    limit: int  # max accounts created by one command
+
+
+@dataclass
+class ReadContext(StorageContext):
+    snapshot: 'ReadSnapshot | None'  # None if snapshot reads are disabled
+    max_staleness: float  # seconds, older snapshot is not used
+
 @dataclass
 class NetworkContext(CommandContext):
     our_ip: str
     scanner: 'NetworkScanner'
+
+
+@dataclass
+class GossipContext(CommandContext):
+    membership: 'Membership | None'  # Membership proxy, None if gossip is disabled
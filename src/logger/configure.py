@@ -1,17 +1,265 @@
 import logging
+import os
+import queue
+import re
 import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
 from logging.handlers import QueueListener, QueueHandler
 from multiprocessing import Queue
 
 LOG_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | P:%(process)d | %(message)s"
 
+LOG_QUEUE_SIZE = 10_000  # batches
+BUFFER_CAPACITY = 5_000  # records buffered in every process
+BATCH_SIZE = 200
+FLUSH_INTERVAL = 0.05
+SIMILAR_LIMIT = 10  # similar records allowed per window, others are suppressed
+SIMILAR_WINDOW = 5.0
+
+_NUMBERS = re.compile(r"\d+")
+
+
+@dataclass
+class LogBatch:
+    """
+    Records shipped to listener at once, with number of records this process had to drop or suppress since last batch.
+    """
+    records: list
+    pid: int
+    dropped: int = 0
+    suppressed: int = 0
+
+
+@dataclass
+class _SimilarRecords:
+    window_start: float
+    count: int = 1
+    suppressed: int = 0
+    sample: logging.LogRecord | None = field(default=None, repr=False)
+
+
+class BatchingQueueHandler(QueueHandler):
+    """
+    Non-blocking queue handler. Records are buffered in a local ring and shipped to the listener in batches
+    by a background thread. When buffer is full, low priority records (below WARNING) are dropped first.
+    Bursts of similar records (same logger, level and message apart from numbers) are rate limited and replaced
+    with a single "N similar messages suppressed" record.
+    """
+
+    def __init__(self, log_queue: Queue, capacity: int = BUFFER_CAPACITY, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, similar_limit: int = SIMILAR_LIMIT,
+                 similar_window: float = SIMILAR_WINDOW):
+        super().__init__(log_queue)
+        self._capacity = capacity
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._similar_limit = similar_limit
+        self._similar_window = similar_window
+
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        """
+        (Re)initializes state, called in every new process because threads and locks do not survive fork.
+        """
+        self._pid = os.getpid()
+        self._buffer_lock = threading.Lock()
+        self._buffer = deque()
+        self._similar = {}
+        self._dropped = 0
+        self._suppressed = 0
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._run, name="LogFlusher", daemon=True)
+        self._flusher.start()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self._pid != os.getpid():
+                self._reset()
+
+            if record.levelno < logging.CRITICAL and self._is_suppressed(record):
+                return
+
+            self._buffer_record(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def _is_suppressed(self, record: logging.LogRecord) -> bool:
+        """
+        Counts similar records in current window
+        :return: True if record exceeded limit of similar records
+        """
+        key = (record.name, record.levelno, _NUMBERS.sub("#", record.getMessage()))
+        now = time.monotonic()
+
+        with self._buffer_lock:
+            similar = self._similar.get(key)
+            if similar is None or now - similar.window_start >= self._similar_window:
+                if similar is not None and similar.suppressed:
+                    self._append(self._summary(similar))
+                self._similar[key] = _SimilarRecords(window_start=now)
+                return False
+
+            similar.count += 1
+            if similar.count <= self._similar_limit:
+                return False
+
+            similar.suppressed += 1
+            similar.sample = record
+            self._suppressed += 1
+            return True
+
+    def _summary(self, similar: _SimilarRecords) -> logging.LogRecord:
+        sample = similar.sample
+        summary = logging.makeLogRecord({
+            "name": sample.name,
+            "levelno": sample.levelno,
+            "levelname": sample.levelname,
+            "msg": f"{similar.suppressed} similar messages suppressed, last: {sample.getMessage()}",
+        })
+        return summary
+
+    def _buffer_record(self, record: logging.LogRecord):
+        with self._buffer_lock:
+            self._append(record)
+            should_flush = len(self._buffer) >= self._batch_size
+
+        if should_flush:
+            self._wakeup.set()
+
+    def _append(self, record: logging.LogRecord):
+        """
+        Appends record to the ring, lock must be held. Under backpressure low priority records are dropped.
+        """
+        if len(self._buffer) >= self._capacity:
+            if record.levelno < logging.WARNING:
+                self._dropped += 1
+                return
+
+            victim = next((r for r in self._buffer if r.levelno < logging.WARNING), None)
+            if victim is not None:
+                self._buffer.remove(victim)
+            else:
+                self._buffer.popleft()
+            self._dropped += 1
+
+        self._buffer.append(record)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            self._sweep_similar()
+            self._ship()
+
+    def _sweep_similar(self, force: bool = False):
+        """
+        Emits summaries for windows that ended without another similar record.
+        :param force: ends all windows
+        """
+        now = time.monotonic()
+        with self._buffer_lock:
+            expired = [
+                key for key, similar in self._similar.items()
+                if force or now - similar.window_start >= self._similar_window
+            ]
+            for key in expired:
+                similar = self._similar.pop(key)
+                if similar.suppressed:
+                    self._append(self._summary(similar))
+
+    def _ship(self) -> bool:
+        """
+        Ships buffered records in batches
+        :return: False if listener queue is full (records stay in buffer)
+        """
+        while True:
+            with self._buffer_lock:
+                if not self._buffer and not self._dropped and not self._suppressed:
+                    return True
+
+                count = min(len(self._buffer), self._batch_size)
+                records = [self._buffer.popleft() for _ in range(count)]
+                batch = LogBatch(records, self._pid, self._dropped, self._suppressed)
+                self._dropped = 0
+                self._suppressed = 0
+
+            try:
+                self.queue.put_nowait(batch)
+            except queue.Full:
+                with self._buffer_lock:
+                    self._buffer.extendleft(reversed(records))
+                    self._dropped += batch.dropped
+                    self._suppressed += batch.suppressed
+                return False
+            except (OSError, ValueError):
+                # queue was closed
+                return False
+
+    def flush(self):
+        """
+        Ships everything that is buffered, used before process exits.
+        """
+        if self._pid != os.getpid():
+            return
+
+        self._sweep_similar(force=True)
+        self._ship()
+
+    def close(self):
+        self.flush()
+        self._closed = True
+        self._wakeup.set()
+        super().close()
+
+
+class BatchQueueListener(QueueListener):
+    """
+    QueueListener that unpacks LogBatch and counts records dropped or suppressed in other processes.
+    """
+
+    def __init__(self, log_queue: Queue, *handlers, respect_handler_level: bool = False):
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.dropped = 0
+        self.suppressed = 0
+
+    def handle(self, record):
+        if not isinstance(record, LogBatch):
+            super().handle(record)
+            return
+
+        for item in record.records:
+            super().handle(item)
+
+        self.suppressed += record.suppressed
+        if record.dropped:
+            self.dropped += record.dropped
+            super().handle(logging.makeLogRecord({
+                "name": "LOGGER",
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "process": record.pid,
+                "msg": f"Dropped {record.dropped} log records because log buffer was full",
+            }))
+
+    def get_stats(self) -> dict:
+        """
+        :return: number of records dropped and suppressed in all processes
+        """
+        return {"log_dropped": self.dropped, "log_suppressed": self.suppressed}
+
 
 def configure_logger_queue(file_path: str = 'app.log', suppress_console: bool = False) -> tuple:
     """
-    Configures logger handlers for queue logging (QueueListener, QueueHandler)
+    Configures logger handlers for queue logging (BatchQueueListener, BatchingQueueHandler)
     :param file_path: log file path
     :param suppress_console: Disables console if True
-    :return: multiprocessing queue and QueueListener
+    :return: multiprocessing queue and BatchQueueListener
     """
 
     formatter = logging.Formatter(LOG_FORMAT)
@@ -32,18 +280,27 @@ def configure_logger_queue(file_path: str = 'app.log', suppress_console: bool =
     else:
         handlers = (file_handler,)
 
-    log_queue = Queue()
-    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    log_queue = Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = BatchQueueListener(log_queue, *handlers, respect_handler_level=True)
 
     return log_queue, listener
 
 
-def add_queue_handler_to_root(queue: Queue) -> None:
+def add_queue_handler_to_root(queue: Queue) -> BatchingQueueHandler:
     """
-    Adds queue to QueueHandler for root logger
+    Adds queue to BatchingQueueHandler for root logger, handlers inherited from parent process are replaced.
     This function is called from processes.
+    Records below INFO are not created at all, listener handlers would drop them anyway.
     :param queue: queue through which logs are connected to the same listener
+    :return: new handler, it should be flushed before process exits
     """
     root = logging.getLogger()
-    root.setLevel(logging.NOTSET)
-    root.addHandler(QueueHandler(queue))
+    root.setLevel(logging.INFO)
+
+    for handler in list(root.handlers):
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+
+    handler = BatchingQueueHandler(queue)
+    root.addHandler(handler)
+    return handler
@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+log = logging.getLogger("TRACE")
+
+_local = threading.local()
+
+
+class RequestTrace:
+    """
+    Stage timings of one request
+    """
+
+    def __init__(self, client: str, command: str):
+        self.client = client
+        self.command = command
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._stages = []
+
+    def add_stage(self, name: str, start: float, end: float):
+        """
+        Adds finished stage
+        :param name: stage name
+        :param start: perf_counter value when stage started
+        :param end: perf_counter value when stage ended
+        """
+        self._stages.append((name, start - self._start, end - start))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def to_record(self, total: float, status: str) -> dict:
+        """
+        Creates JSON serializable record
+        :param total: total request duration in seconds
+        :param status: OK or ER
+        :return: trace record
+        """
+        return {
+            "time": self.started_at,
+            "pid": os.getpid(),
+            "client": self.client,
+            "command": self.command,
+            "status": status,
+            "total_ms": round(total * 1000, 3),
+            "stages": [
+                {"stage": name, "offset_ms": round(offset * 1000, 3), "duration_ms": round(duration * 1000, 3)}
+                for name, offset, duration in self._stages
+            ]
+        }
+
+
+@contextmanager
+def trace_stage(name: str):
+    """
+    Measures a stage of the request traced in the current thread, does nothing if no request is traced.
+    :param name: stage name
+    """
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_stage(name, start, time.perf_counter())
+
+
+class TraceBuffer:
+    """
+    Ring buffer with recent traces, lives in manager process and is shared by all workers.
+    """
+
+    def __init__(self, size: int):
+        self._traces = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            self._traces.append(record)
+
+    def get_all(self) -> list:
+        """
+        :return: traces, newest first
+        """
+        with self._lock:
+            return list(reversed(self._traces))
+
+
+class RequestTracer:
+    """
+    Opt-in per-request tracing. Slow requests are logged, sampled requests are stored in shared trace buffer.
+    """
+
+    def __init__(self, config: dict, trace_buffer: TraceBuffer | None):
+        self._enabled = config.get("tracing_enabled", False)
+        self._slow_threshold = config.get("trace_slow_threshold", 0.5)
+        self._sample_rate = config.get("trace_sample_rate", 0.01)
+        self._buffer = trace_buffer
+
+    def begin(self, client: str, command: str) -> RequestTrace | None:
+        """
+        Starts tracing request in current thread
+        :param client: client ip address
+        :param command: command code
+        :return: new trace or None if tracing is disabled
+        """
+        if not self._enabled:
+            # trace of request started before tracing was disabled must not collect stages
+            _local.trace = None
+            return None
+
+        trace = RequestTrace(client, command)
+        _local.trace = trace
+        return trace
+
+    def finish(self, trace: RequestTrace | None, response: str):
+        """
+        Finishes trace, logs it if it's slow and stores it if it's sampled.
+        :param trace: trace returned from begin
+        :param response: response sent to client
+        """
+        if trace is None:
+            return
+
+        _local.trace = None
+        total = trace.elapsed()
+        is_slow = total >= self._slow_threshold
+
+        if not is_slow and random.random() >= self._sample_rate:
+            return
+
+        record = trace.to_record(total, "ER" if response.startswith("ER") else "OK")
+        if is_slow:
+            log.warning(f"Slow request: {json.dumps(record)}")
+
+        if self._buffer is not None:
+            try:
+                self._buffer.add(record)
+            except (OSError, EOFError):
+                pass
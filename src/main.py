@@ -1,16 +1,17 @@
 import logging
 import multiprocessing
 import os
+import signal
 import time
 from threading import Thread, Event
 
 from bank.bank import Bank
 from bank.security import SecurityGuard
 from logger.configure import configure_logger_queue, add_queue_handler_to_root
-from utils.configurations import ConfigurationManager
+from utils.configurations import ConfigurationManager, InvalidConfiguration
 from utils.paths import get_base_paths
+from utils.shared import SharedManager
 from web.app import create_flask_app
-from multiprocessing import Manager
 
 if __name__ == "__main__":
     multiprocessing.freeze_support()
@@ -18,7 +19,7 @@ if __name__ == "__main__":
     paths = get_base_paths()
 
     log_queue, listener = configure_logger_queue(paths['root'] / "app.log")
-    add_queue_handler_to_root(log_queue)
+    queue_handler = add_queue_handler_to_root(log_queue)
     listener.start()
 
     log = logging.getLogger("SYSTEM")
@@ -26,7 +27,8 @@ if __name__ == "__main__":
     flask_logger.setLevel(logging.WARNING) #only log errors
 
     bank = None
-    manager = Manager()
+    manager = SharedManager()
+    manager.start()
 
     try:
         config_manager = ConfigurationManager(paths['config_folder'] / "config.json")
@@ -44,10 +46,25 @@ if __name__ == "__main__":
         Thread(target=bank.open_bank, daemon=True).start()
         log.info("Bank logic started in background thread")
 
+        def reload_configuration():
+            """
+            Reads config.json again and applies it to the running bank
+            """
+            try:
+                bank.reload_config(config_manager.reload())
+            except InvalidConfiguration as e:
+                log.error(f"Configuration reload failed: {e}")
+
+        if hasattr(signal, "SIGHUP"):
+            # reload waits for workers, it must not block main thread
+            signal.signal(signal.SIGHUP, lambda *_: Thread(target=reload_configuration, daemon=True).start())
+
         web_host = config.get('monitoring_host', '127.0.0.1')
         web_port = config.get('monitoring_port', 8090)
         app = create_flask_app(bank, paths['public_folder'])
         app.config['STOP_EVENT'] = stop_event
+        app.config['LOG_LISTENER'] = listener
+        app.config['CONFIG_MANAGER'] = config_manager
 
         Thread(
             target=app.run,
@@ -72,5 +89,6 @@ if __name__ == "__main__":
             manager.shutdown()
 
         log.info('Application is shutting down')
+        queue_handler.close()
         listener.stop()
         os._exit(0)
\ No newline at end of file
@@ -0,0 +1,29 @@
+import argparse
+import json
+import sqlite3
+import sys
+
+from bank.migration import MigrationError, migrate_storage
+from bank.storages import MAX_SHARDS
+from utils.paths import resolve_path
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Migrates sqlite storage to another number of shards "
+                                                 "(the bank must be stopped)")
+    parser.add_argument("--storage-path", required=True, help="storage_path from configuration")
+    parser.add_argument("--shards", type=int, required=True, help=f"target storage_shards, 1..{MAX_SHARDS}")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    if not (1 <= arguments.shards <= MAX_SHARDS):
+        sys.exit(f"Number of shards must be between 1 and {MAX_SHARDS}")
+
+    try:
+        result = migrate_storage(resolve_path(arguments.storage_path), arguments.shards)
+    except (MigrationError, OSError, sqlite3.Error) as e:
+        sys.exit(f"Migration failed: {e}")
+
+    print(json.dumps(result, indent=2))
@@ -1,5 +1,8 @@
 import logging
 import socket
+import time
+
+from network.health import PeerHealth
 
 log = logging.getLogger("NETWORK")
 
@@ -9,38 +12,79 @@ class BankConnector:
     Handles connection to other banks in P2P network
     """
 
-    def __init__(self, timeout: float = 5.0):
+    def __init__(self, timeout: float = 5.0, peers: PeerHealth | None = None):
+        """
+        :param timeout: maximum timeout of a call
+        :param peers: shared circuit breaker and latency of peers, calls use fixed timeout without it
+        """
         self._timeout = timeout
+        self._peers = peers
 
-    def send_command(self, bank_ip: str, port: int, command: str) -> str | None:
+    def send_command(self, bank_ip: str, port: int, command: str, response_size: int = 1024) -> str | None:
         """
         Sends command to another bank and returns response
         :param bank_ip: IP address of target bank
         :param port: Port of target bank
         :param command: Command to send
-        :return: Response string or None if failed
+        :param response_size: longer responses are read until end of line up to this size
+        :return: Response string or None if failed (or circuit of the peer is open)
+        """
+        return self._send(bank_ip, port, command, response_size, adaptive_timeout=True)[0]
+
+    def send_mutation(self, bank_ip: str, port: int, command: str) -> tuple[str | None, bool]:
+        """
+        Sends command that changes balance in another bank. It always gets the full timeout, adaptive timeout
+        is measured mostly on fast reads and the mutation could be applied after we gave up.
+        :return: response (None if failed) and False if command surely did not reach the bank (it can be sent again)
         """
+        return self._send(bank_ip, port, command, 1024, adaptive_timeout=False)
+
+    def _send(self, bank_ip: str, port: int, command: str, response_size: int,
+              adaptive_timeout: bool) -> tuple[str | None, bool]:
+        """
+        :return: response (None if failed) and True if connection was established (command may have been received)
+        """
+        peer = f"{bank_ip}:{port}"
         sock = None
+        connected = False
         try:
+            timeout = self._peers.acquire(peer, self._timeout) if self._peers is not None else self._timeout
+            if timeout is None:
+                log.debug(f"Circuit of {peer} is open")
+                return None, False
+            if not adaptive_timeout:
+                timeout = self._timeout
+
+            started = time.perf_counter()
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(self._timeout)
+            sock.settimeout(timeout)
             sock.connect((bank_ip, port))
+            connected = True
 
             sock.sendall(f"{command}\r\n".encode('utf-8'))
 
-            response = sock.recv(1024).decode('utf-8').strip()
+            data = sock.recv(1024)
+            while response_size > len(data) and data and not data.endswith(b"\n"):
+                chunk = sock.recv(min(65536, response_size - len(data)))
+                if not chunk:
+                    break
+                data += chunk
+            response = data.decode('utf-8').strip()
 
-            return response
+            self._record(peer, time.perf_counter() - started)
+            return response, True
 
         except socket.timeout:
-            log.warning(f"Timeout connecting to {bank_ip}:{port}")
-            return None
+            log.warning(f"Timeout connecting to {peer}")
+            self._record(peer, None)
+            return None, connected
         except socket.error as e:
-            log.warning(f"Connection error to {bank_ip}:{port}: {e}")
-            return None
+            log.warning(f"Connection error to {peer}: {e}")
+            self._record(peer, None)
+            return None, connected
         except Exception as e:
-            log.error(f"Unexpected error communicating with {bank_ip}:{port}: {e}")
-            return None
+            log.error(f"Unexpected error communicating with {peer}: {e}")
+            return None, connected
         finally:
             if sock:
                 try:
@@ -48,6 +92,10 @@ class BankConnector:
                 except:
                     pass
 
+    def _record(self, peer: str, latency: float | None):
+        if self._peers is not None:
+            self._peers.record(peer, latency)
+
     def get_bank_code(self, bank_ip: str, port: int) -> str | None:
         """
         Gets bank code (BC command) from another bank
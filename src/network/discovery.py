@@ -0,0 +1,153 @@
+import ipaddress
+import logging
+import secrets
+import socket
+import struct
+import threading
+import time
+
+SUMMARY_MAX_AGE = 1.0  # seconds, summary is read from storage at most once per this time
+
+log = logging.getLogger("NETWORK")
+
+
+def _is_multicast(address: str) -> bool:
+    return ipaddress.IPv4Address(address).is_multicast
+
+
+def broadcast_addresses(ip_ranges: list) -> list:
+    """
+    :param ip_ranges: normalized network_scan_ip_range
+    :return: broadcast address of /24 subnet of every range
+    """
+    return list(dict.fromkeys(".".join(start.split(".")[:3]) + ".255" for start, _ in ip_ranges))
+
+
+def discover(addresses: list, port: int, window: float, interface: str):
+    """
+    Sends discovery datagram (DI <nonce>) to broadcast or multicast addresses and yields replies
+    (ip, port, amount, clients) as they arrive during the collection window.
+    Replies whose bank code differs from the IP they were sent from are dropped
+    :param addresses: broadcast or multicast addresses
+    :param port: discovery port of banks
+    :param window: collection window in seconds
+    :param interface: IP of interface multicast is sent from
+    """
+    nonce = secrets.token_hex(4)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        for address in addresses:
+            if _is_multicast(address):
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            sock.sendto(f"DI {nonce}".encode('utf-8'), (address, port))
+
+        deadline = time.monotonic() + window
+        while (remaining := deadline - time.monotonic()) > 0:
+            sock.settimeout(remaining)
+            try:
+                data, (source_ip, _) = sock.recvfrom(512)
+            except socket.timeout:
+                break
+
+            parts = data.decode('utf-8', errors='replace').split()
+            if len(parts) != 6 or parts[0] != "DI" or parts[1] != nonce:
+                continue
+            if parts[2] != source_ip:
+                log.warning(f"Dropping discovery reply from {source_ip} announcing bank {parts[2]}")
+                continue
+            try:
+                yield parts[2], int(parts[3]), int(parts[4]), int(parts[5])
+            except ValueError:
+                continue
+    except OSError as e:
+        log.warning(f"UDP discovery failed: {e}")
+    finally:
+        sock.close()
+
+
+class DiscoveryResponder:
+    """
+    UDP listener of bank process, answers discovery datagram (DI <nonce>) with
+    DI <nonce> <bank code> <port> <amount> <clients>. Socket is bound with SO_REUSEADDR to all interfaces,
+    so several banks on one machine receive the same broadcast.
+    """
+
+    def __init__(self, config: dict, summary):
+        """
+        :param summary: function returning (amount, clients) of this bank
+        """
+        self._bank_code = config["bank_code"]
+        self._port = config["port"]
+        self._host = config["host"]
+        self._discovery_port = config.get("discovery_port", 65500)
+        self._multicast = [
+            address for address in config.get("discovery_addresses", []) if _is_multicast(address)
+        ]
+        self._summary = summary
+
+        self._cached_summary = None
+        self._summary_time = 0.0
+        self._socket = None
+        self._thread = None
+
+    def start(self) -> bool:
+        """
+        :return: False if discovery port cannot be bound
+        """
+        try:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._socket.bind(("", self._discovery_port))
+            for group in self._multicast:
+                membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(self._host))
+                self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        except OSError as e:
+            log.error(f"Discovery listener could not start on UDP port {self._discovery_port}: {e}")
+            if self._socket:
+                self._socket.close()
+            return False
+
+        self._thread = threading.Thread(target=self._run, name="Discovery", daemon=True)
+        self._thread.start()
+        log.info(f"Discovery listener is listening on UDP port {self._discovery_port}")
+        return True
+
+    def stop(self):
+        if self._socket:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            try:
+                data, address = self._socket.recvfrom(512)
+            except OSError:
+                break
+
+            parts = data.decode('utf-8', errors='replace').split()
+            if len(parts) != 2 or parts[0] != "DI":
+                continue
+
+            try:
+                amount, clients = self._get_summary()
+                reply = f"DI {parts[1]} {self._bank_code} {self._port} {amount} {clients}"
+                self._socket.sendto(reply.encode('utf-8'), address)
+            except Exception as e:
+                log.warning(f"Discovery reply to {address[0]} failed: {e}")
+
+    def _get_summary(self) -> tuple[int, int]:
+        """
+        Summary is cached, so flood of datagrams does not read storage every time
+        """
+        now = time.monotonic()
+        if self._cached_summary is None or now - self._summary_time > SUMMARY_MAX_AGE:
+            self._cached_summary = self._summary()
+            self._summary_time = now
+        return self._cached_summary
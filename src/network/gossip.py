@@ -0,0 +1,297 @@
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from network.connector import BankConnector
+
+GOSSIP_ENTRIES = 16  # members sent by GS command, it has to fit into 1024 bytes read by bank
+VIEW_ENTRIES = 1000  # members in GS response (whole view), connector reads longer responses
+VIEW_RESPONSE_SIZE = 64 * 1024
+MAX_MEMBERS = 4096
+FORGET_FACTOR = 10  # dead member is forgotten after gossip_timeout * FORGET_FACTOR
+HEARTBEAT_SKEW = 60_000  # ms, heartbeat further ahead of our wall time is forged (or clock is wrong)
+PROBES_PER_ROUND = 16  # unconfirmed members probed with BC in one gossip round
+
+log = logging.getLogger("NETWORK")
+
+
+@dataclass
+class Member:
+    """
+    Bank known from gossip. Heartbeat is increased only by the bank itself (it starts from wall time,
+    so restarted bank is newer than its previous incarnation), higher heartbeat wins when views are merged.
+    """
+    ip: str
+    port: int
+    heartbeat: int
+    amount: int  # BA of the bank when it sent the heartbeat
+    clients: int  # BN of the bank when it sent the heartbeat
+    updated: float = 0.0  # local monotonic time when heartbeat increased last time
+    discovered: float = 0.0  # local monotonic time when member was seen first time (or revived)
+    confirmed: bool = False  # member answered BC probe with its IP, only confirmed members are used
+
+    def format(self) -> str:
+        return f"{self.ip}:{self.port}:{self.heartbeat}:{self.amount}:{self.clients}"
+
+
+def format_members(members: list) -> str:
+    """
+    :return: members in wire format (ip:port:heartbeat:amount:clients separated by spaces)
+    """
+    return " ".join(member.format() for member in members)
+
+
+def parse_members(entries: list) -> list:
+    """
+    Parses members in wire format, invalid entries are skipped
+    :param entries: arguments of GS command
+    :return: list of Member
+    """
+    members = []
+    for entry in entries[:VIEW_ENTRIES]:
+        parts = entry.split(":")
+        if len(parts) != 5:
+            continue
+        try:
+            port, heartbeat, amount, clients = (int(part) for part in parts[1:])
+        except ValueError:
+            continue
+        if 1 <= port <= 65535 and parts[0].count(".") == 3:
+            members.append(Member(parts[0], port, heartbeat, amount, clients))
+    return members
+
+
+class Membership:
+    """
+    View of the bank network built by gossip, lives in manager process and is shared by bank process (which gossips)
+    and workers (which answer gossip of other banks and plan robberies from it). Member whose heartbeat did not
+    increase for timeout is dead, it is not gossiped nor returned as alive, but its heartbeat is remembered,
+    so old news about it do not revive it. GS can be sent by anyone, so new member is used (and gossiped further)
+    only after gossip thread confirmed it with BC probe and heartbeat far in the future is not accepted.
+    """
+
+    def __init__(self, ip: str, port: int, timeout: float):
+        self._self = Member(ip, port, 0, 0, 0, time.monotonic())
+        self._timeout = timeout
+        self._members = {}  # ip:port: Member
+        self._guard = threading.Lock()
+
+        self._messages = 0
+
+    def update_self(self, amount: int, clients: int):
+        """
+        Increases heartbeat of this bank and sets its summary
+        """
+        with self._guard:
+            self._self.heartbeat = max(self._self.heartbeat + 1, int(time.time() * 1000))
+            self._self.amount = amount
+            self._self.clients = clients
+            self._self.updated = time.monotonic()
+
+    def merge(self, members: list) -> int:
+        """
+        Merges members received from other bank
+        :param members: list of Member
+        :return: number of members that were unknown or had newer heartbeat
+        """
+        now = time.monotonic()
+        max_heartbeat = int(time.time() * 1000) + HEARTBEAT_SKEW
+        updated = 0
+        with self._guard:
+            self._messages += 1
+            for member in members:
+                key = f"{member.ip}:{member.port}"
+                if key == self._key(self._self) or member.heartbeat > max_heartbeat:
+                    continue
+
+                known = self._members.get(key)
+                if known is not None and known.heartbeat >= member.heartbeat:
+                    continue
+
+                is_new = known is None or now - known.updated > self._timeout
+                member.discovered = now if is_new else known.discovered
+                member.confirmed = not is_new and known.confirmed
+                member.updated = now
+                self._members[key] = member
+                updated += 1
+
+            self._forget(now)
+        return updated
+
+    def sample(self) -> list:
+        """
+        Members pushed to other bank - members discovered most recently (news spread like a rumour)
+        and random alive members
+        :return: this bank and alive members, as many as fit into one GS command
+        """
+        with self._guard:
+            alive = self._alive(time.monotonic())
+            if len(alive) < GOSSIP_ENTRIES:
+                return [self._self] + alive
+
+            alive.sort(key=lambda member: member.discovered, reverse=True)
+            newest = alive[:GOSSIP_ENTRIES // 2]
+            others = random.sample(alive[GOSSIP_ENTRIES // 2:], GOSSIP_ENTRIES - 1 - len(newest))
+            return [self._self] + newest + others
+
+    def view(self) -> list:
+        """
+        Members pulled by other bank in GS response
+        :return: this bank and alive members (at most VIEW_ENTRIES)
+        """
+        with self._guard:
+            alive = self._alive(time.monotonic())
+            return [self._self] + random.sample(alive, min(len(alive), VIEW_ENTRIES - 1))
+
+    def alive(self) -> list:
+        """
+        :return: alive members (without this bank)
+        """
+        with self._guard:
+            return self._alive(time.monotonic())
+
+    def unconfirmed(self) -> list:
+        """
+        :return: alive members that were not confirmed yet, at most PROBES_PER_ROUND
+        """
+        with self._guard:
+            now = time.monotonic()
+            members = [member for member in self._members.values()
+                       if not member.confirmed and now - member.updated <= self._timeout]
+            return random.sample(members, min(len(members), PROBES_PER_ROUND))
+
+    def confirm(self, ip: str, port: int):
+        """
+        Marks member as confirmed (it answered BC probe)
+        """
+        with self._guard:
+            member = self._members.get(f"{ip}:{port}")
+            if member is not None:
+                member.confirmed = True
+
+    def is_alive(self, ip: str) -> bool:
+        """
+        :return: True if some alive member has this IP address
+        """
+        with self._guard:
+            return any(member.ip == ip for member in self._alive(time.monotonic()))
+
+    def get_stats(self) -> dict:
+        """
+        :return: dictionary with received messages, alive and dead members
+        """
+        now = time.monotonic()
+        with self._guard:
+            alive = self._alive(now)
+            unconfirmed = sum(
+                1 for member in self._members.values()
+                if not member.confirmed and now - member.updated <= self._timeout
+            )
+            return {
+                "messages": self._messages,
+                "alive": len(alive),
+                "unconfirmed": unconfirmed,
+                "dead": len(self._members) - len(alive) - unconfirmed,
+                "members": {
+                    self._key(member): {"amount": member.amount, "clients": member.clients,
+                                        "age": round(now - member.updated, 1)}
+                    for member in alive
+                },
+            }
+
+    def _alive(self, now: float) -> list:
+        return [
+            member for member in self._members.values()
+            if member.confirmed and now - member.updated <= self._timeout
+        ]
+
+    def _forget(self, now: float):
+        if len(self._members) <= MAX_MEMBERS:
+            limit = self._timeout * FORGET_FACTOR
+            forgotten = [key for key, member in self._members.items() if now - member.updated > limit]
+        else:
+            forgotten = sorted(self._members, key=lambda key: self._members[key].updated)[:-MAX_MEMBERS]
+
+        for key in forgotten:
+            del self._members[key]
+
+    @staticmethod
+    def _key(member: Member) -> str:
+        return f"{member.ip}:{member.port}"
+
+
+class Gossiper:
+    """
+    Gossip thread of bank process. Every gossip_interval it refreshes summary of this bank and exchanges
+    views (push-pull) with gossip_fanout random alive members, or with gossip_seeds while no member is known,
+    so news reach all banks in O(log n) rounds. New members are confirmed with BC probe.
+    Ports of alive members are saved to known banks.
+    """
+
+    def __init__(self, config: dict, membership: Membership, security, peers, summary):
+        """
+        :param membership: Membership proxy
+        :param security: SecurityGuard, ports of members are saved as known ports
+        :param peers: PeerHealth proxy used by connector
+        :param summary: function returning (amount, clients) of this bank
+        """
+        self._membership = membership
+        self._security = security
+        self._summary = summary
+        self._interval = config.get("gossip_interval", 1)
+        self._fanout = config.get("gossip_fanout", 3)
+        self._seeds = [seed.rsplit(":", 1) for seed in config.get("gossip_seeds", [])]
+        self._own_address = (config["host"], config["port"])
+        self._connector = BankConnector(config.get("network_timeout", 2), peers)
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="Gossip", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self._interval + 5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._gossip_round()
+            except Exception as e:
+                log.error(f"Gossip round failed: {e}", exc_info=True)
+
+            # jitter keeps banks started together from gossiping in lockstep
+            self._stop.wait(self._interval * random.uniform(0.8, 1.2))
+
+    def _gossip_round(self):
+        """
+        Sends view to random members and merges their views
+        """
+        self._membership.update_self(*self._summary())
+
+        alive = self._membership.alive()
+        if alive:
+            targets = [(member.ip, member.port) for member in random.sample(alive, min(len(alive), self._fanout))]
+        else:
+            targets = [(ip, int(port)) for ip, port in self._seeds if (ip, int(port)) != self._own_address]
+
+        for ip, port in targets:
+            response = self._connector.send_command(
+                ip, port, f"GS {format_members(self._membership.sample())}", response_size=VIEW_RESPONSE_SIZE
+            )
+            if not response or not response.startswith("GS"):
+                continue
+            self._membership.merge(parse_members(response.split()[1:]))
+
+        for member in self._membership.unconfirmed():
+            if self._connector.get_bank_code(member.ip, member.port) == member.ip:
+                self._membership.confirm(member.ip, member.port)
+
+        for member in self._membership.alive():
+            if self._security.get_known_port(member.ip) is None:
+                self._security.save_known_port(member.ip, member.port)
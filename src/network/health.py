@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+LATENCY_SAMPLES = 50  # latest call durations of a peer used for its timeout
+MIN_SAMPLES = 5  # peer with fewer samples gets the full network timeout
+TIMEOUT_FACTOR = 4  # timeout is p99 latency multiplied by this factor
+MIN_TIMEOUT = 0.25  # seconds, lower bound of adaptive timeout
+MAX_PEERS = 4096
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _Peer:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0  # consecutive failures
+        self.opened_at = 0.0
+        self.probe_started = None  # time of half-open probe in progress
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+
+class PeerHealth:
+    """
+    Circuit breaker and latency of other banks (ip:port), lives in manager process and is shared by all workers.
+    After failure_threshold consecutive failed calls (timeout, refused connection) circuit of the peer opens
+    and calls fail immediately. After open_time one call is let through (half-open), its success closes the circuit,
+    failure opens it again. Timeout of a call is derived from latest latencies of the peer (p99 * 4),
+    peer without measured latency gets the full network timeout.
+    """
+
+    def __init__(self, failure_threshold: int, open_time: float):
+        self._failure_threshold = failure_threshold
+        self._open_time = open_time
+        self._peers = OrderedDict()  # peer: _Peer, least recently used first
+        self._guard = threading.Lock()
+
+        self._rejected = 0
+
+    def acquire(self, peer: str, max_timeout: float) -> float | None:
+        """
+        Asks for permission to call peer, every permitted call must be followed by record
+        :param peer: address in format ip:port
+        :param max_timeout: upper bound of timeout (network_timeout)
+        :return: timeout of the call or None if circuit is open
+        """
+        now = time.monotonic()
+        with self._guard:
+            state = self._get(peer)
+
+            if state.state == OPEN:
+                if now - state.opened_at < self._open_time:
+                    self._rejected += 1
+                    return None
+                state.state = HALF_OPEN
+
+            if state.state == HALF_OPEN:
+                # probe of crashed worker is never recorded, so it is given up after its timeout
+                if state.probe_started is not None and now - state.probe_started < 2 * max_timeout:
+                    self._rejected += 1
+                    return None
+                state.probe_started = now
+                return max_timeout
+
+            return self._timeout(state, max_timeout)
+
+    def record(self, peer: str, latency: float | None):
+        """
+        Records result of call
+        :param latency: duration of successful call in seconds, None if call failed
+        """
+        with self._guard:
+            state = self._get(peer)
+            state.probe_started = None
+
+            if latency is not None:
+                state.latencies.append(latency)
+                state.failures = 0
+                state.state = CLOSED
+                return
+
+            state.failures += 1
+            if state.state == HALF_OPEN or (self._failure_threshold and state.failures >= self._failure_threshold):
+                state.state = OPEN
+                state.opened_at = time.monotonic()
+
+    def get_stats(self) -> dict:
+        """
+        :return: dictionary with calls rejected by open circuits and state, failures
+                 and latency percentiles of peers that are not closed or have latency samples
+        """
+        with self._guard:
+            peers = {}
+            for peer, state in self._peers.items():
+                if state.state == CLOSED and not state.latencies:
+                    continue
+                latencies = sorted(state.latencies)
+                peers[peer] = {
+                    "state": state.state,
+                    "failures": state.failures,
+                    "p50_ms": round(_percentile(latencies, 0.5) * 1000, 3) if latencies else None,
+                    "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+                }
+
+            return {"rejected": self._rejected, "peers": peers}
+
+    def _get(self, peer: str) -> _Peer:
+        state = self._peers.get(peer)
+        if state is None:
+            state = self._peers[peer] = _Peer()
+            if len(self._peers) > MAX_PEERS:
+                self._peers.popitem(last=False)
+        else:
+            self._peers.move_to_end(peer)
+        return state
+
+    @staticmethod
+    def _timeout(state: _Peer, max_timeout: float) -> float:
+        if len(state.latencies) < MIN_SAMPLES:
+            return max_timeout
+
+        p99 = _percentile(sorted(state.latencies), 0.99)
+        return min(max(p99 * TIMEOUT_FACTOR, MIN_TIMEOUT), max_timeout)
+
+
+def _percentile(values: list, fraction: float) -> float:
+    """
+    :param values: sorted values
+    """
+    return values[min(int(len(values) * fraction), len(values) - 1)]
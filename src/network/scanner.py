@@ -1,13 +1,27 @@
 import logging
+import time
 from dataclasses import dataclass
-from typing import List
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 from network.connector import BankConnector
+from network.discovery import broadcast_addresses, discover
+
+SCAN_THREADS = 50
 
 log = logging.getLogger("NETWORK")
 
 
+def ip_ranges(ip_range: list) -> list:
+    """
+    Normalizes network_scan_ip_range, which is one range ["start", "end"] or list of ranges [["start", "end"], ...]
+    :return: list of ranges [start, end]
+    """
+    if ip_range and all(isinstance(part, str) for part in ip_range):
+        return [ip_range]
+    return list(ip_range or [])
+
+
 @dataclass
 class BankInfo:
     """
@@ -25,17 +39,27 @@ class NetworkScanner:
     Scans P2P network for active banks
     """
 
-    def __init__(self, port_range: tuple, timeout: float = 2.0, ip_range: list = None, security=None):
+    def __init__(self, port_range: tuple, timeout: float = 2.0, ip_range: list = None, security=None, peers=None,
+                 rate: float = 0, membership=None, discovery: dict | None = None):
         """
         :param port_range: Tuple (min_port, max_port) to scan
         :param timeout: Connection timeout in seconds
-        :param subnet: First 3 octets of IP to scan
+        :param ip_range: range [start IP, end IP] or list of ranges, every range is within one /24 subnet
+        :param peers: PeerHealth shared by workers, banks with open circuit are skipped
+        :param rate: maximum probes (ip and port) started per second, 0 = unlimited
+        :param membership: Membership proxy, alive members of gossip are used instead of probing
+        :param discovery: UDP discovery settings (port, addresses, window, own_port), banks answering
+                          the discovery datagram are used instead of probing
         """
         self._port_range = port_range
         self._timeout = timeout
         self._ip_range = ip_range
-        self._connector = BankConnector(timeout)
+        self._connector = BankConnector(timeout, peers)
         self._security = security
+        self._rate = rate
+        self._membership = membership
+        self._discovery = discovery
+        self._confirmed = set()  # (ip, port) of discovered banks that answered BC with their IP
 
     def scan_network(self, our_ip: str) -> List[BankInfo]:
         """
@@ -43,40 +67,114 @@ class NetworkScanner:
         :param our_ip: Our own IP to skip
         :return: List of discovered banks
         """
-        banks = []
+        banks = list(self.iter_banks(our_ip))
+        log.info(f"Found {len(banks)} active banks")
+        return banks
 
+    def iter_banks(self, our_ip: str) -> Iterator[BankInfo]:
+        """
+        Scans network and yields banks as they are found. Probes are started at most rate per second,
+        when the caller stops iterating, probes that were not started yet are cancelled.
+        When gossip knows alive banks, their summaries are returned without probing,
+        otherwise banks answering UDP discovery are returned. Probing is the fallback when both find nothing.
+        :param our_ip: Our own IP to skip
+        """
+        # membership does not contain this bank, banks sharing our IP on other ports are valid targets
+        members = self._membership.alive() if self._membership is not None else []
+        if members:
+            log.info(f"Using {len(members)} banks known from gossip")
+            for member in members:
+                yield BankInfo(ip=member.ip, port=member.port, total_amount=member.amount,
+                               client_count=member.clients)
+            return
+
+        if self._discovery is not None:
+            found = False
+            for bank in self._discover(our_ip):
+                found = True
+                yield bank
+            if found:
+                return
+            log.info("No bank answered UDP discovery, falling back to probing")
+
+        targets = [target for target in self._targets() if target[0] != our_ip]
+        if not targets:
+            return
+
+        log.info(f"Scanning {len(targets)} targets in {len(ip_ranges(self._ip_range))} IP ranges")
+
+        interval = 1 / self._rate if self._rate else 0
+        next_start = time.monotonic()
+        pending = set()
+        executor = ThreadPoolExecutor(max_workers=SCAN_THREADS)
         try:
-            start_parts = self._ip_range[0].split('.')
-            end_parts = self._ip_range[1].split('.')
-
-            subnet_base = ".".join(start_parts[:3])
-            start_num = int(start_parts[3])
-            end_num = int(end_parts[3])
-
-            ips_to_scan = [f"{subnet_base}.{i}" for i in range(start_num, end_num + 1)]
-        except (IndexError, ValueError) as e:
-            log.error(f"Error parsing IP range {self._ip_range}: {e}")
-            return []
+            while targets or pending:
+                now = time.monotonic()
+                while targets and len(pending) < SCAN_THREADS and next_start <= now:
+                    ip, port = targets.pop()
+                    pending.add(executor.submit(self._check_target, ip, port, our_ip))
+                    next_start = max(next_start + interval, now) if interval else now
+
+                wait_time = max(next_start - now, 0.001) if targets and len(pending) < SCAN_THREADS else None
+                if not pending:
+                    time.sleep(wait_time)
+                    continue
+
+                done, pending = wait(pending, timeout=wait_time, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    if result:
+                        yield result
+        finally:
+            # probes in progress finish in background, they are limited by timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _discover(self, our_ip: str) -> Iterator[BankInfo]:
+        """
+        Sends one discovery datagram to every broadcast (or multicast) address and yields banks
+        that answer within the discovery window. A bank seen for the first time is used only after
+        it answers BC with its own IP on the announced port
+        :param our_ip: Our own IP, used as multicast interface and to skip our own reply
+        """
+        addresses = self._discovery.get("addresses") or broadcast_addresses(ip_ranges(self._ip_range))
+        own_address = (our_ip, self._discovery.get("own_port"))
+        seen = set()
+
+        for ip, port, amount, clients in discover(addresses, self._discovery["port"],
+                                                  self._discovery.get("window", 0.5), our_ip):
+            if (ip, port) == own_address or (ip, port) in seen:
+                continue
+            seen.add((ip, port))
+
+            if (ip, port) not in self._confirmed:
+                if self._connector.get_bank_code(ip, port) != ip:
+                    log.warning(f"Discovered bank {ip}:{port} did not confirm its bank code, skipping")
+                    continue
+                self._confirmed.add((ip, port))
+
+            if self._security.get_known_port(ip) is None:
+                self._security.save_known_port(ip, port)
+            log.info(f"Discovered bank at {ip}:{port} - Amount: {amount}, Clients: {clients}")
+            yield BankInfo(ip=ip, port=port, total_amount=amount, client_count=clients)
+
+    def _targets(self) -> list:
+        """
+        :return: targets (ip, port) in reversed scan order, so they can be popped
+        """
+        ips_to_scan = []
+        for start, end in ip_ranges(self._ip_range):
+            try:
+                start_parts = start.split('.')
+                subnet_base = ".".join(start_parts[:3])
+                ips_to_scan += [f"{subnet_base}.{i}" for i in range(int(start_parts[3]), int(end.split('.')[3]) + 1)]
+            except (IndexError, ValueError, AttributeError) as e:
+                log.error(f"Error parsing IP range {[start, end]}: {e}")
+                return []
 
         ports_to_scan = range(self._port_range[0], self._port_range[1] + 1)
-
-        targets = [(ip, port) for ip in ips_to_scan for port in ports_to_scan]
-
-        log.info(f"Scanning {len(targets)} targets from {self._ip_range[0]} to {self._ip_range[1]}")
-
-        with ThreadPoolExecutor(max_workers=50) as executor:
-            futures = {
-                executor.submit(self._check_target, ip, port, our_ip): (ip, port)
-                for ip, port in targets
-            }
-
-            for future in as_completed(futures):
-                result = future.result()
-                if result:
-                    banks.append(result)
-
-        log.info(f"Found {len(banks)} active banks")
-        return banks
+        targets = [(ip, port) for ip in dict.fromkeys(ips_to_scan) for port in ports_to_scan]
+        targets.reverse()
+        return targets
 
     def _check_target(self, ip: str, port: int, our_ip: str) -> BankInfo | None:
         """
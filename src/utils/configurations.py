@@ -3,10 +3,23 @@ import json
 import ipaddress
 from pathlib import Path
 
+from bank.storages import MAX_SHARDS
+from network.scanner import ip_ranges
 from utils.paths import resolve_path
 
 log = logging.getLogger("SYSTEM")
 
+# keys applied to running bank by configuration reload, changes of other keys need restart
+LIVE_CONFIG_KEYS = (
+    "client_timeout", "keepalive_timeout", "max_connections_per_ip",
+    "max_requests_per_minute", "max_bad_commands", "ban_duration",
+    "network_timeout", "network_scan_port_range", "network_scan_ip_range", "network_scan_rate",
+    "tracing_enabled", "trace_slow_threshold", "trace_sample_rate", "bulk_create_limit",
+    "worker_heartbeat_timeout", "worker_restart_backoff", "worker_drain_timeout",
+    "autoscale_connections_per_worker", "autoscale_interval", "autoscale_cooldown", "proxy_cache_ttl",
+    "read_snapshot_max_staleness",
+)
+
 class InvalidConfiguration(Exception):
     pass
 
@@ -28,25 +41,42 @@ class ConfigurationManager:
         :param config_file_path: file path
         :return: configuration dict if valid else None
         """
+        try:
+            return self._read_config(config_file_path)
+        except InvalidConfiguration as ex:
+            log.error(ex)
+
+    def _read_config(self, config_file_path: str) -> dict:
+        """
+        Reads and validates configuration file
+        :param config_file_path: file path
+        :return: configuration dict
+        :raises InvalidConfiguration: when file is missing, cannot be decoded or is invalid
+        """
         config_file_path = resolve_path(config_file_path)
 
         try:
             with open(config_file_path) as config_file:
                 config = json.load(config_file)
-                self._validate_config(config)
-
-                config['storage_path'] = resolve_path(config['storage_path'])
-
-                return config
-
         except FileNotFoundError:
-            log.error(f"Config file {config_file_path} was not found")
-
+            raise InvalidConfiguration(f"Config file {config_file_path} was not found")
         except json.JSONDecodeError:
-            log.error(f"Config file {config_file_path} could not be decoded")
+            raise InvalidConfiguration(f"Config file {config_file_path} could not be decoded")
 
-        except InvalidConfiguration as ex:
-            log.error(ex)
+        self._validate_config(config)
+        config['storage_path'] = resolve_path(config['storage_path'])
+        return config
+
+    def reload(self) -> dict:
+        """
+        Reads configuration file again, loaded configuration is kept when the new one is invalid
+        :return: new configuration
+        :raises InvalidConfiguration: when file is missing, cannot be decoded or is invalid
+        """
+        config = self._read_config(self._config_file_path)
+        self._config = config
+        log.info("Configuration reloaded: " + json.dumps(config))
+        return config
 
 
     def _validate_config(self, config: dict):
@@ -88,7 +118,7 @@ class ConfigurationManager:
             raise InvalidConfiguration(f"Port must be an integer.")
 
         if not (1 <= config["port"] <= 65535):
-            raise InvalidConfiguration(f"Port must be in range from 1 to 65535. Found: {config["port"]}")
+            raise InvalidConfiguration(f"Port must be in range from 1 to 65535. Found: {config['port']}")
 
         storage_path = config["storage_path"]
         if not isinstance(storage_path, str) or not storage_path.strip():
@@ -155,7 +185,7 @@ class ConfigurationManager:
             raise InvalidConfiguration("monitoring_host must be a valid IPv4 address.")
 
         if not (1 <= config["monitoring_port"] <= 65535):
-            raise InvalidConfiguration(f"monitoring_port must be in range from 1 to 65535. Found: {config["port"]}")
+            raise InvalidConfiguration(f"monitoring_port must be in range from 1 to 65535. Found: {config['monitoring_port']}")
 
         net_range = config["network_scan_port_range"]
         if not isinstance(net_range, list) or len(net_range) != 2:
@@ -177,25 +207,237 @@ class ConfigurationManager:
         if config["network_timeout"] > 15:
             raise InvalidConfiguration(f"network_timeout cant be bigger than 15. Found: {config['network_timeout']}")
 
-        ip_range = config["network_scan_ip_range"]
-        if not isinstance(ip_range, list) or len(ip_range) != 2:
-            raise InvalidConfiguration("network_scan_ip_range must be a list of two IP strings ['start_ip', 'end_ip']")
+        if not isinstance(config["network_scan_ip_range"], list) or not config["network_scan_ip_range"]:
+            raise InvalidConfiguration("network_scan_ip_range must be a list of two IP strings ['start_ip', 'end_ip'] "
+                                       "or a list of such ranges")
 
-        try:
-            start_ip = ipaddress.IPv4Address(ip_range[0])
-            end_ip = ipaddress.IPv4Address(ip_range[1])
+        for ip_range in ip_ranges(config["network_scan_ip_range"]):
+            if not isinstance(ip_range, list) or len(ip_range) != 2:
+                raise InvalidConfiguration("network_scan_ip_range must be a list of two IP strings ['start_ip', 'end_ip'] "
+                                           "or a list of such ranges")
 
-            start_parts = ip_range[0].split('.')
-            end_parts = ip_range[1].split('.')
+            try:
+                start_ip = ipaddress.IPv4Address(ip_range[0])
+                end_ip = ipaddress.IPv4Address(ip_range[1])
 
-            if start_parts[:3] != end_parts[:3]:
-                raise InvalidConfiguration("Scan IP range must be within the same subnet (first 3 octets must match)")
+                start_parts = ip_range[0].split('.')
+                end_parts = ip_range[1].split('.')
 
-            if int(start_ip) > int(end_ip):
-                raise InvalidConfiguration("Scan IP range start cannot be higher than end")
+                if start_parts[:3] != end_parts[:3]:
+                    raise InvalidConfiguration("Scan IP range must be within the same subnet (first 3 octets must match)")
 
-        except ValueError:
-            raise InvalidConfiguration("network_scan_ip_range must contain valid IPv4 addresses")
+                if int(start_ip) > int(end_ip):
+                    raise InvalidConfiguration("Scan IP range start cannot be higher than end")
+
+            except ValueError:
+                raise InvalidConfiguration("network_scan_ip_range must contain valid IPv4 addresses")
+
+        scan_rate = config.get("network_scan_rate", 500)
+        if not isinstance(scan_rate, (int, float)) or scan_rate < 0:
+            raise InvalidConfiguration(f"network_scan_rate must be 0 (unlimited) or a positive number. Found: {scan_rate}")
+
+        if config.get("storage_engine", "sqlite") not in ("sqlite", "journal"):
+            raise InvalidConfiguration(f"storage_engine must be 'sqlite' or 'journal'. Found: {config['storage_engine']}")
+
+        fsync_interval = config.get("journal_fsync_interval", 0.002)
+        if not isinstance(fsync_interval, (int, float)) or not (0 <= fsync_interval <= 1):
+            raise InvalidConfiguration(f"journal_fsync_interval must be a number from 0 to 1. Found: {fsync_interval}")
+
+        snapshot_interval = config.get("journal_snapshot_interval", 60)
+        if not isinstance(snapshot_interval, (int, float)) or snapshot_interval < 1:
+            raise InvalidConfiguration(f"journal_snapshot_interval must be at least 1 second. Found: {snapshot_interval}")
+
+        if config.get("cache_warmup", "blocking") not in ("blocking", "background"):
+            raise InvalidConfiguration(f"cache_warmup must be 'blocking' or 'background'. Found: {config['cache_warmup']}")
+
+        warmup_chunk_size = config.get("cache_warmup_chunk_size", 5000)
+        if not isinstance(warmup_chunk_size, int) or warmup_chunk_size < 1:
+            raise InvalidConfiguration(f"cache_warmup_chunk_size must be a positive integer. Found: {warmup_chunk_size}")
+
+        cache_policy = config.get("cache_policy", "full")
+        if cache_policy not in ("full", "lru", "clock"):
+            raise InvalidConfiguration(f"cache_policy must be 'full', 'lru' or 'clock'. Found: {cache_policy}")
+
+        cache_capacity = config.get("cache_capacity", 100_000)
+        if not isinstance(cache_capacity, int) or cache_capacity < 1:
+            raise InvalidConfiguration(f"cache_capacity must be a positive integer. Found: {cache_capacity}")
+
+        if cache_policy != "full" and config.get("storage_engine", "sqlite") == "journal":
+            raise InvalidConfiguration("Journal storage engine requires cache_policy 'full'")
+
+        bulk_create_limit = config.get("bulk_create_limit", 10_000)
+        if not isinstance(bulk_create_limit, int) or not (1 <= bulk_create_limit <= 90_000):
+            raise InvalidConfiguration(f"bulk_create_limit must be a number from 1 to 90000. Found: {bulk_create_limit}")
+
+        if not isinstance(config.get("hot_accounts", False), bool):
+            raise InvalidConfiguration("hot_accounts must be true or false")
+
+        if config.get("hot_accounts", False) and config.get("storage_engine", "sqlite") != "sqlite":
+            raise InvalidConfiguration("hot_accounts is supported only by sqlite storage engine")
+
+        hot_threshold = config.get("hot_account_threshold", 50)
+        if not isinstance(hot_threshold, int) or hot_threshold < 1:
+            raise InvalidConfiguration(f"hot_account_threshold must be a positive integer. Found: {hot_threshold}")
+
+        hot_flush_interval = config.get("hot_account_flush_interval", 0.05)
+        if not isinstance(hot_flush_interval, (int, float)) or not (0.001 <= hot_flush_interval <= 5):
+            raise InvalidConfiguration(f"hot_account_flush_interval must be a number from 0.001 to 5. Found: {hot_flush_interval}")
+
+        idempotency_cache_size = config.get("idempotency_cache_size", 10_000)
+        if not isinstance(idempotency_cache_size, int) or idempotency_cache_size < 0:
+            raise InvalidConfiguration(f"idempotency_cache_size must be a non-negative integer. Found: {idempotency_cache_size}")
+
+        idempotency_ttl = config.get("idempotency_ttl", 300)
+        if not isinstance(idempotency_ttl, (int, float)) or idempotency_ttl <= 0:
+            raise InvalidConfiguration(f"idempotency_ttl must be a positive number. Found: {idempotency_ttl}")
+
+        heartbeat_timeout = config.get("worker_heartbeat_timeout", 5)
+        if not isinstance(heartbeat_timeout, (int, float)) or heartbeat_timeout < 1:
+            raise InvalidConfiguration(f"worker_heartbeat_timeout must be a number of at least 1. Found: {heartbeat_timeout}")
+
+        restart_backoff = config.get("worker_restart_backoff", 1)
+        if not isinstance(restart_backoff, (int, float)) or not (0 < restart_backoff <= 30):
+            raise InvalidConfiguration(f"worker_restart_backoff must be a number from 0 to 30. Found: {restart_backoff}")
+
+        min_workers = config.get("min_workers", config["bank_workers"])
+        max_workers = config.get("max_workers", config["bank_workers"])
+        for key, value in (("min_workers", min_workers), ("max_workers", max_workers)):
+            if not isinstance(value, int) or not (1 <= value <= 16):
+                raise InvalidConfiguration(f"{key} must be a number from 1 to 16. Found: {value}")
+
+        if not (min_workers <= config["bank_workers"] <= max_workers):
+            raise InvalidConfiguration(f"bank_workers must be between min_workers and max_workers. Found: {config['bank_workers']}")
+
+        connections_per_worker = config.get("autoscale_connections_per_worker", 20)
+        if not isinstance(connections_per_worker, int) or connections_per_worker < 1:
+            raise InvalidConfiguration(f"autoscale_connections_per_worker must be a positive integer. Found: {connections_per_worker}")
+
+        autoscale_interval = config.get("autoscale_interval", 5)
+        if not isinstance(autoscale_interval, (int, float)) or autoscale_interval < 1:
+            raise InvalidConfiguration(f"autoscale_interval must be a number of at least 1. Found: {autoscale_interval}")
+
+        autoscale_cooldown = config.get("autoscale_cooldown", 30)
+        if not isinstance(autoscale_cooldown, (int, float)) or autoscale_cooldown < 0:
+            raise InvalidConfiguration(f"autoscale_cooldown must be a non-negative number. Found: {autoscale_cooldown}")
+
+        drain_timeout = config.get("worker_drain_timeout", 30)
+        if not isinstance(drain_timeout, (int, float)) or drain_timeout <= 0:
+            raise InvalidConfiguration(f"worker_drain_timeout must be a positive number. Found: {drain_timeout}")
+
+        keepalive_timeout = config.get("keepalive_timeout", 60)
+        if not isinstance(keepalive_timeout, (int, float)) or not (1 <= keepalive_timeout <= 3600):
+            raise InvalidConfiguration(f"keepalive_timeout must be a number from 1 to 3600. Found: {keepalive_timeout}")
+
+        max_connections = config.get("max_connections_per_worker", 1000)
+        if not isinstance(max_connections, int) or not (1 <= max_connections <= 100_000):
+            raise InvalidConfiguration(f"max_connections_per_worker must be a number from 1 to 100000. Found: {max_connections}")
+
+        max_connections_per_ip = config.get("max_connections_per_ip", 100)
+        if not isinstance(max_connections_per_ip, int) or max_connections_per_ip < 1:
+            raise InvalidConfiguration(f"max_connections_per_ip must be a positive integer. Found: {max_connections_per_ip}")
+
+        handler_threads = config.get("client_handler_threads", 32)
+        if not isinstance(handler_threads, int) or not (1 <= handler_threads <= 1000):
+            raise InvalidConfiguration(f"client_handler_threads must be between 1 and 1000. Found: {handler_threads}")
+
+        queue_size = config.get("client_queue_size", 128)
+        if not isinstance(queue_size, int) or not (1 <= queue_size <= 100_000):
+            raise InvalidConfiguration(f"client_queue_size must be between 1 and 100000. Found: {queue_size}")
+
+        proxy_cache_size = config.get("proxy_cache_size", 10_000)
+        if not isinstance(proxy_cache_size, int) or not (0 <= proxy_cache_size <= 1_000_000):
+            raise InvalidConfiguration(f"proxy_cache_size must be between 0 and 1000000. Found: {proxy_cache_size}")
+
+        proxy_cache_ttl = config.get("proxy_cache_ttl", 0)
+        if not isinstance(proxy_cache_ttl, (int, float)) or not (0 <= proxy_cache_ttl <= 60):
+            raise InvalidConfiguration(f"proxy_cache_ttl must be between 0 and 60 seconds. Found: {proxy_cache_ttl}")
+
+        failure_threshold = config.get("circuit_failure_threshold", 3)
+        if not isinstance(failure_threshold, int) or failure_threshold < 0:
+            raise InvalidConfiguration(f"circuit_failure_threshold must be 0 or a positive integer. Found: {failure_threshold}")
+
+        open_time = config.get("circuit_open_time", 10)
+        if not isinstance(open_time, (int, float)) or not (0 < open_time <= 3600):
+            raise InvalidConfiguration(f"circuit_open_time must be between 0 and 3600 seconds. Found: {open_time}")
+
+        if not isinstance(config.get("gossip_enabled", False), bool):
+            raise InvalidConfiguration("gossip_enabled must be true or false")
+
+        seeds = config.get("gossip_seeds", [])
+        if not isinstance(seeds, list):
+            raise InvalidConfiguration("gossip_seeds must be a list of addresses 'ip:port'")
+        for seed in seeds:
+            try:
+                seed_ip, seed_port = seed.rsplit(":", 1)
+                ipaddress.IPv4Address(seed_ip)
+                if not (1 <= int(seed_port) <= 65535):
+                    raise ValueError
+            except (AttributeError, ValueError):
+                raise InvalidConfiguration(f"gossip_seeds must contain addresses 'ip:port'. Found: {seed}")
+
+        gossip_interval = config.get("gossip_interval", 1)
+        if not isinstance(gossip_interval, (int, float)) or not (0.1 <= gossip_interval <= 60):
+            raise InvalidConfiguration(f"gossip_interval must be between 0.1 and 60 seconds. Found: {gossip_interval}")
+
+        gossip_fanout = config.get("gossip_fanout", 3)
+        if not isinstance(gossip_fanout, int) or not (1 <= gossip_fanout <= 10):
+            raise InvalidConfiguration(f"gossip_fanout must be between 1 and 10. Found: {gossip_fanout}")
+
+        gossip_timeout = config.get("gossip_timeout", 10)
+        if not isinstance(gossip_timeout, (int, float)) or gossip_timeout <= gossip_interval:
+            raise InvalidConfiguration(f"gossip_timeout must be bigger than gossip_interval. Found: {gossip_timeout}")
+
+        if not isinstance(config.get("discovery_enabled", False), bool):
+            raise InvalidConfiguration("discovery_enabled must be true or false")
+
+        discovery_port = config.get("discovery_port", 65500)
+        if not isinstance(discovery_port, int) or not (1 <= discovery_port <= 65535):
+            raise InvalidConfiguration(f"discovery_port must be between 1 and 65535. Found: {discovery_port}")
+
+        discovery_addresses = config.get("discovery_addresses", [])
+        if not isinstance(discovery_addresses, list):
+            raise InvalidConfiguration("discovery_addresses must be a list of broadcast or multicast addresses")
+        for address in discovery_addresses:
+            try:
+                ipaddress.IPv4Address(address)
+            except ValueError:
+                raise InvalidConfiguration(f"discovery_addresses must contain IPv4 addresses. Found: {address}")
+
+        discovery_window = config.get("discovery_window", 0.5)
+        if not isinstance(discovery_window, (int, float)) or not (0.05 <= discovery_window <= 10):
+            raise InvalidConfiguration(f"discovery_window must be between 0.05 and 10 seconds. Found: {discovery_window}")
+
+        if not isinstance(config.get("read_snapshot", False), bool):
+            raise InvalidConfiguration("read_snapshot must be true or false")
+
+        snapshot_interval = config.get("read_snapshot_interval", 0.2)
+        if not isinstance(snapshot_interval, (int, float)) or not (0.01 <= snapshot_interval <= 60):
+            raise InvalidConfiguration(f"read_snapshot_interval must be between 0.01 and 60 seconds. Found: {snapshot_interval}")
+
+        max_staleness = config.get("read_snapshot_max_staleness", 1)
+        if not isinstance(max_staleness, (int, float)) or max_staleness <= snapshot_interval:
+            raise InvalidConfiguration(f"read_snapshot_max_staleness must be bigger than read_snapshot_interval. Found: {max_staleness}")
+
+        storage_shards = config.get("storage_shards", 1)
+        if not isinstance(storage_shards, int) or not (1 <= storage_shards <= MAX_SHARDS):
+            raise InvalidConfiguration(f"storage_shards must be between 1 and {MAX_SHARDS}. Found: {storage_shards}")
+        if storage_shards > 1 and config.get("storage_engine", "sqlite") != "sqlite":
+            raise InvalidConfiguration("storage_shards is supported only by sqlite storage engine")
+
+        if not isinstance(config.get("tracing_enabled", False), bool):
+            raise InvalidConfiguration("tracing_enabled must be true or false")
+
+        trace_threshold = config.get("trace_slow_threshold", 0.5)
+        if not isinstance(trace_threshold, (int, float)) or trace_threshold < 0:
+            raise InvalidConfiguration(f"trace_slow_threshold must be a non-negative number. Found: {trace_threshold}")
+
+        trace_sample_rate = config.get("trace_sample_rate", 0.01)
+        if not isinstance(trace_sample_rate, (int, float)) or not (0 <= trace_sample_rate <= 1):
+            raise InvalidConfiguration(f"trace_sample_rate must be a number from 0 to 1. Found: {trace_sample_rate}")
+
+        trace_buffer_size = config.get("trace_buffer_size", 100)
+        if not isinstance(trace_buffer_size, int) or not (1 <= trace_buffer_size <= 10_000):
+            raise InvalidConfiguration(f"trace_buffer_size must be an integer from 1 to 10000. Found: {trace_buffer_size}")
 
         log.info("Configuration validation passed")
 
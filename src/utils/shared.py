@@ -0,0 +1,26 @@
+from multiprocessing.managers import SyncManager
+
+from bank.idempotency import ResponseCache
+from bank.proxy import ProxyCache
+from bank.storages import CACHE_POLICIES
+from logger.tracing import TraceBuffer
+from network.gossip import Membership
+from network.health import PeerHealth
+
+
+class SharedManager(SyncManager):
+    """
+    SyncManager with custom objects shared between processes.
+    Objects live in manager process, other processes access them through proxies.
+    """
+    pass
+
+
+SharedManager.register("TraceBuffer", TraceBuffer)
+SharedManager.register("ResponseCache", ResponseCache)
+SharedManager.register("ProxyCache", ProxyCache)
+SharedManager.register("PeerHealth", PeerHealth)
+SharedManager.register("Membership", Membership)
+
+for cache_class in CACHE_POLICIES.values():
+    SharedManager.register(cache_class.__name__, cache_class)
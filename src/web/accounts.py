@@ -1,5 +1,5 @@
 import logging
-from flask import Blueprint, render_template, jsonify, request, current_app
+from flask import Blueprint, render_template, jsonify, request, current_app, Response
 
 log = logging.getLogger("WEB")
 
@@ -47,4 +47,38 @@ def get_accounts_paged():
 
     except Exception as e:
         log.error(f"Error getting accounts: {e}")
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+
+@accounts_bp.route('/bulk', methods=['POST'])
+def create_accounts_bulk():
+    """
+    API endpoint for creating many accounts at once.
+    Payload: {"count": 1000}
+    Streams address of every created account on its own line.
+    """
+    try:
+        bank = current_app.config['BANK']
+        limit = bank.get_bulk_create_limit()
+
+        data = request.get_json(silent=True) or {}
+        count = data.get('count')
+        if not isinstance(count, int) or not (1 <= count <= limit):
+            return jsonify({"error": f"Count must be a number from 1 to {limit}"}), 400
+
+        accounts = bank.create_accounts(count)
+        if not accounts:
+            return jsonify({"error": "Failed to create accounts"}), 503
+
+        bank_code = bank.get_bank_code()
+        log.info(f"Created {len(accounts)} accounts from monitoring API")
+
+        def generate():
+            for account_number in accounts:
+                yield f"{account_number}/{bank_code}\n"
+
+        return Response(generate(), mimetype='text/plain', headers={"X-Accounts-Created": str(len(accounts))})
+
+    except Exception as e:
+        log.error(f"Error creating accounts: {e}")
+        return jsonify({"error": str(e)}), 500
@@ -1,6 +1,9 @@
 import logging
 from threading import Thread
-from flask import Blueprint, render_template, jsonify, current_app, request
+from flask import Blueprint, render_template, jsonify, current_app, request, Response
+
+from utils.configurations import InvalidConfiguration
+from workers.profiler import format_folded
 
 log = logging.getLogger("WEB")
 
@@ -26,17 +29,127 @@ def get_stats():
     try:
         bank = current_app.config['BANK']
         stats = bank.get_stats()
+
+        listener = current_app.config.get('LOG_LISTENER')
+        if listener:
+            stats.update(listener.get_stats())
+
         return jsonify(stats)
     except Exception as e:
         log.error(f"Error getting stats: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@monitoring_bp.route('/api/workers')
+def get_workers():
+    """
+    Worker pool - state of every worker, restarts and recent autoscaling events
+    """
+    try:
+        bank = current_app.config['BANK']
+        return jsonify(bank.get_workers())
+    except Exception as e:
+        log.error(f"Error getting workers: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@monitoring_bp.route('/api/config')
+def get_config():
+    """
+    Current configuration and its version
+    """
+    bank = current_app.config['BANK']
+    return jsonify(bank.get_config())
+
+
+@monitoring_bp.route('/api/config/reload', methods=['POST'])
+def reload_config():
+    """
+    Reads config.json again and applies changed keys that can be changed while the bank runs
+    """
+    try:
+        config_manager = current_app.config.get('CONFIG_MANAGER')
+        if config_manager is None:
+            return jsonify({"error": "Configuration manager not configured"}), 500
+
+        bank = current_app.config['BANK']
+        return jsonify(bank.reload_config(config_manager.reload())), 200
+
+    except InvalidConfiguration as e:
+        log.error(f"Configuration reload failed: {e}")
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        log.error(f"Error reloading configuration: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@monitoring_bp.route('/api/traces')
+def get_traces():
+    """
+    Recent sampled and slow request traces
+    """
+    try:
+        bank = current_app.config['BANK']
+        return jsonify({"traces": bank.get_traces()})
+    except Exception as e:
+        log.error(f"Error getting traces: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@monitoring_bp.route('/api/profile', methods=['POST'])
+def control_profiler():
+    """
+    Starts or stops sampling profiler in workers.
+    Payload: {"action": "start", "interval": 0.01} or {"action": "stop", "per_worker": false}
+    """
+    try:
+        data = request.get_json()
+        action = data.get('action')
+        bank = current_app.config['BANK']
+
+        if action == 'start':
+            interval = float(data.get('interval', 0.01))
+            if not (0.001 <= interval <= 1):
+                return jsonify({"error": "Interval must be between 0.001 and 1 second"}), 400
+
+            workers = bank.start_profiling(interval)
+            return jsonify({"status": "started", "workers": workers}), 200
+
+        elif action == 'stop':
+            profile = bank.stop_profiling(bool(data.get('per_worker', False)))
+            return jsonify({
+                "status": "stopped",
+                "workers": profile["workers"],
+                "samples": profile["samples"],
+                "unique_stacks": len(profile["stacks"])
+            }), 200
+
+        else:
+            return jsonify({"error": "Invalid action"}), 400
+
+    except Exception as e:
+        log.error(f"Error controlling profiler: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@monitoring_bp.route('/api/profile')
+def get_profile():
+    """
+    Last collected profile as folded stacks (flamegraph.pl / speedscope input)
+    """
+    bank = current_app.config['BANK']
+    profile = bank.get_profile()
+    if profile is None:
+        return jsonify({"error": "No profile collected"}), 404
+
+    return Response(format_folded(profile["stacks"]), mimetype='text/plain')
+
+
 @monitoring_bp.route('/api/control', methods=['POST'])
 def control_bank():
     """
     Endpoints to Start or Stop the bank logic without killing the app.
-    Payload: {"action": "start"} or {"action": "stop"}
+    Payload: {"action": "start"}, {"action": "stop"} or {"action": "restart"} (rolling restart of workers)
     """
     try:
         data = request.get_json()
@@ -56,6 +169,14 @@ def control_bank():
             bank.close_bank()
             return jsonify({"status": "stopped"}), 200
 
+        elif action == 'restart':
+            if not getattr(bank, '_is_open', False):
+                return jsonify({"error": "Bank is not running"}), 409
+
+            log.info("Rolling restart of workers via web control...")
+            Thread(target=bank.restart_workers, daemon=True).start()
+            return jsonify({"status": "restarting"}), 202
+
         else:
             return jsonify({"error": "Invalid action"}), 400
 
@@ -36,6 +36,9 @@ async function fetchStats() {
         document.getElementById('client-count').textContent = data.client_count;
         document.getElementById('active-connections').textContent = data.active_connections || 0;
 
+        document.getElementById('cache-warmup').textContent = formatWarmup(data.warmup);
+        document.getElementById('cache-stats').textContent = formatCache(data.cache);
+
         isBankOpen = data.is_open;
         updateBankStatusUI(data.is_open);
 
@@ -47,6 +50,66 @@ async function fetchStats() {
     }
 }
 
+function formatWarmup(warmup) {
+    if (!warmup) return '-';
+
+    if (warmup.state === 'running') {
+        const total = warmup.total || 0;
+        const percent = total ? Math.floor(warmup.loaded * 100 / total) : 0;
+        return `running ${warmup.loaded}/${total} (${percent}%)`;
+    }
+
+    if (warmup.state === 'done' && warmup.duration !== null && warmup.duration !== undefined) {
+        return `done, ${warmup.loaded} accounts in ${warmup.duration} s`;
+    }
+
+    return warmup.state;
+}
+
+function formatCache(cache) {
+    if (!cache) return '-';
+
+    const size = cache.capacity ? `${cache.size}/${cache.capacity}` : `${cache.size}`;
+    const ratio = cache.hit_ratio === null ? '-' : (cache.hit_ratio * 100).toFixed(1) + '%';
+    return `${cache.policy} ${size}, hit ratio ${ratio}, ${cache.evictions} evictions`;
+}
+
+async function fetchTraces() {
+    try {
+        const response = await fetch('/api/traces');
+        if (!response.ok) return;
+        const data = await response.json();
+
+        const tbody = document.getElementById('traces-table');
+        if (!tbody) return;
+
+        if (!data.traces || data.traces.length === 0) {
+            tbody.innerHTML = '<tr><td colspan="6">No traces collected</td></tr>';
+            return;
+        }
+
+        // values come from clients (command), so they are inserted as text, never as HTML
+        tbody.replaceChildren(...data.traces.map(trace => {
+            const row = document.createElement('tr');
+            [
+                new Date(trace.time * 1000).toLocaleTimeString(),
+                trace.client,
+                trace.command,
+                trace.status,
+                trace.total_ms,
+                trace.stages.map(stage => `${stage.stage} ${stage.duration_ms}`).join(', '),
+            ].forEach(value => {
+                const cell = document.createElement('td');
+                cell.textContent = value;
+                row.appendChild(cell);
+            });
+            return row;
+        }));
+    } catch (error) {
+        // traces are optional, stats error is shown instead
+    }
+}
+
 function updateUptime() {
     if (!isBankOpen) return;
 
@@ -151,6 +214,7 @@ async function confirmAppShutdown() {
 
 function refreshData() {
     fetchStats();
+    fetchTraces();
 }
 
 refreshData();
@@ -0,0 +1,119 @@
+import time
+from collections import deque
+from dataclasses import dataclass
+
+CPU_HIGH = 0.75  # average busy fraction of workers that adds a worker
+CPU_LOW = 0.25
+LOW_LOAD_CHECKS = 3  # consecutive checks with low load before a worker is removed
+MAX_EVENTS = 50
+
+
+@dataclass
+class LoadSample:
+    """
+    Load of worker pool measured by worker manager
+    """
+    workers: int  # workers accepting sockets (not draining or restarting)
+    connections_per_worker: float
+    cpu: float  # average busy fraction of workers (CPU time / wall time), 0 - 1
+    accept_queue: int | None  # connections waiting in accept queue, None if it cannot be read
+    queued_messages: int = 0  # messages waiting for handler thread in all workers
+
+
+class Autoscaler:
+    """
+    Decides when worker pool grows or shrinks between min_workers and max_workers.
+    Pool grows as soon as connections per worker, CPU or accept queue are high, it shrinks only after load
+    stays low for several checks and cooldown since the last change passed, so it does not flap on short dips.
+    """
+
+    def __init__(self, config: dict):
+        self._min_workers = config.get("min_workers", config["bank_workers"])
+        self._max_workers = config.get("max_workers", config["bank_workers"])
+        self.configure(config)
+
+        self._next_check = 0.0
+        self._last_change = 0.0
+        self._low_checks = 0
+        self._events = deque(maxlen=MAX_EVENTS)
+
+    def configure(self, config: dict):
+        """
+        Sets thresholds, they can be changed while the bank runs (limits of the pool cannot)
+        """
+        self._target = config.get("autoscale_connections_per_worker", 20)
+        self._interval = config.get("autoscale_interval", 5)
+        self._cooldown = config.get("autoscale_cooldown", 30)
+
+    @property
+    def min_workers(self) -> int:
+        return self._min_workers
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    def is_enabled(self) -> bool:
+        return self._min_workers < self._max_workers
+
+    def is_due(self, now: float) -> bool:
+        """
+        :return: True if load should be checked now (every autoscale_interval)
+        """
+        if not self.is_enabled() or now < self._next_check:
+            return False
+
+        self._next_check = now + self._interval
+        return True
+
+    def decide(self, sample: LoadSample, now: float) -> tuple[int, str | None]:
+        """
+        Decides how worker pool should change
+        :param sample: current load
+        :param now: monotonic time
+        :return: (change, reason) - change is 1 (add worker), -1 (drain worker) or 0
+        """
+        queued = sample.accept_queue or 0
+
+        reason = None
+        if sample.connections_per_worker > self._target:
+            reason = f"{sample.connections_per_worker:.1f} connections per worker"
+        elif sample.cpu > CPU_HIGH:
+            reason = f"CPU {sample.cpu:.0%}"
+        elif queued > sample.workers:
+            reason = f"{queued} connections in accept queue"
+        elif sample.queued_messages > sample.workers:
+            reason = f"{sample.queued_messages} messages waiting for handler"
+
+        if reason:
+            self._low_checks = 0
+            return (1, reason) if sample.workers < self._max_workers else (0, None)
+
+        is_low = (sample.connections_per_worker < self._target / 2 and sample.cpu < CPU_LOW and not queued
+                  and not sample.queued_messages)
+        self._low_checks = self._low_checks + 1 if is_low else 0
+
+        if (self._low_checks >= LOW_LOAD_CHECKS and sample.workers > self._min_workers
+                and now - self._last_change >= self._cooldown):
+            self._low_checks = 0
+            return -1, (f"low load ({sample.connections_per_worker:.1f} connections per worker, "
+                        f"CPU {sample.cpu:.0%})")
+
+        return 0, None
+
+    def record(self, action: str, workers: int, reason: str, now: float):
+        """
+        Records scaling event
+        :param action: "scale_up" or "scale_down"
+        :param workers: number of workers after the change
+        :param reason: load that caused the change
+        :param now: monotonic time
+        """
+        self._last_change = now
+        self._events.append({"time": time.time(), "action": action, "workers": workers, "reason": reason})
+
+    def get_events(self) -> list:
+        """
+        :return: recent scaling events, newest first
+        """
+        return list(reversed(self._events))
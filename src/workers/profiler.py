@@ -0,0 +1,100 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+
+class StackSampler:
+    """
+    Statistical (wall clock) profiler. Background thread periodically samples stacks of all threads
+    in this process and counts them in folded format (frame;frame;frame).
+    """
+
+    def __init__(self):
+        self._stacks = Counter()
+        self._samples = 0
+        self._interval = 0.01
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float) -> bool:
+        """
+        Starts sampling, previously collected stacks are discarded
+        :param interval: time between samples in seconds
+        :return: False if sampler is already running
+        """
+        if self.is_running():
+            return False
+
+        self._stacks = Counter()
+        self._samples = 0
+        self._interval = interval
+        self._stop_event.clear()
+
+        self._thread = threading.Thread(target=self._run, name="StackSampler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> dict:
+        """
+        Stops sampling
+        :return: dictionary with number of samples and folded stacks with their counts
+        """
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+        return {"samples": self._samples, "stacks": dict(self._stacks)}
+
+    def _run(self):
+        own_id = threading.get_ident()
+
+        while not self._stop_event.wait(self._interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self._stacks[self._fold(frame)] += 1
+            self._samples += 1
+
+    @staticmethod
+    def _fold(frame) -> str:
+        """
+        Converts stack to folded format, outermost frame first
+        :param frame: innermost frame of the stack
+        :return: folded stack
+        """
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+
+        return ";".join(reversed(names))
+
+
+def merge_profiles(profiles: list, per_worker: bool = False) -> Counter:
+    """
+    Merges folded stacks collected from workers
+    :param profiles: profiles returned from StackSampler.stop with added "pid"
+    :param per_worker: prefixes every stack with worker pid so workers stay separated in flamegraph
+    :return: merged stacks with counts
+    """
+    merged = Counter()
+    for profile in profiles:
+        prefix = f"worker-{profile.get('pid')};" if per_worker else ""
+        for stack, count in profile.get("stacks", {}).items():
+            merged[prefix + stack] += count
+
+    return merged
+
+
+def format_folded(stacks: Counter) -> str:
+    """
+    Formats stacks as folded text accepted by flamegraph.pl, speedscope, etc.
+    :param stacks: stacks with counts
+    :return: one "stack count" per line
+    """
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
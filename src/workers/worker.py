@@ -1,34 +1,74 @@
 import logging
 import sqlite3
+import time
 from dataclasses import dataclass
 from multiprocessing import Queue, Process, managers, Value
-from multiprocessing.connection import PipeConnection
+from multiprocessing.connection import Connection
 from typing import Any
 
+from bank.allocator import AccountAllocator
+from bank.hot_accounts import HotAccounts
+from bank.idempotency import ResponseCache
+from bank.proxy import BankProxy, ProxyCache
 from bank.security import SecurityGuard
+from bank.snapshot import ReadSnapshot
 from commands.commands import (
-    BankCodeCommand, CreateAccountCommand, RemoveAccountCommand,
+    BankCodeCommand, CreateAccountCommand, BulkCreateAccountCommand, RemoveAccountCommand,
     AccountDepositCommand, AccountWithdrawCommand, AccountBalanceCommand,
-    BankAmountCommand, BankNumberCommand, RobberyPlanCommand)
+    BankAmountCommand, BankNumberCommand, RobberyPlanCommand, GossipCommand)
 
-from commands.contexts import BankCodeContext, StorageContext, NetworkContext
+from commands.contexts import (
+    BankCodeContext, StorageContext, NetworkContext, BulkStorageContext, GossipContext, ReadContext)
 from commands.factory import CommandFactory
 
-from bank.client import ClientConnection, ClientContext
-from bank.storages import BankStorage
+from bank.client import ClientContext, ClientContextHolder
+from bank.connections import ConnectionManager
+from bank.engines import create_storage
+from bank.storages import BalanceCache
 from logger.configure import add_queue_handler_to_root
+from logger.tracing import RequestTracer
+from network.gossip import Membership
+from network.health import PeerHealth
 from network.scanner import NetworkScanner
+from workers.profiler import StackSampler
+
+HEARTBEAT_INTERVAL = 0.5  # seconds between heartbeats of idle worker
 
 
 @dataclass
 class WorkerContext:
     log_queue: Queue
-    shared_memory: managers.DictProxy
-    pipe: PipeConnection
+    shared_memory: BalanceCache
+    pipe: Connection
     config: dict
     lock: Any  # AcquirerProxy - dynamically generated class ?
     active_connections: Value
     security: SecurityGuard
+    trace_buffer: Any  # TraceBuffer proxy
+    warmup_state: managers.DictProxy
+    allocator: AccountAllocator
+    hot_accounts: HotAccounts | None
+    index: int  # row in hot accounts table, 0 is used by bank process
+    read_snapshot: ReadSnapshot | None  # None if snapshot reads are disabled
+    responses: ResponseCache | None  # ResponseCache proxy, None if request IDs are disabled
+    proxy_cache: ProxyCache | None  # ProxyCache proxy, None if caching of proxied balances is disabled
+    peers: PeerHealth  # PeerHealth proxy, circuit breaker and latency of other banks
+    membership: Membership | None  # Membership proxy, None if gossip is disabled
+    heartbeats: Any  # shared array of last heartbeat (monotonic time) of every worker, indexed by index
+    cpu_times: Any  # shared array of CPU time of every worker, indexed by index
+    queue_depths: Any  # shared array of messages waiting for handler thread in every worker, indexed by index
+    rejections: Any  # shared array of messages rejected as "Server busy" by every worker, indexed by index
+    config_version: int = 0  # version of config, it is increased by every configuration reload
+
+
+@dataclass
+class WorkerCommand:
+    """
+    Control message sent to worker through its pipe, worker answers with a dictionary through the same pipe.
+    """
+    request_id: int
+    action: str
+    payload: dict
 
 
 class Worker(Process):
@@ -46,10 +86,29 @@ class Worker(Process):
         self._lock = worker_context.lock
         self._active_connections = worker_context.active_connections
         self._security = worker_context.security
+        self._trace_buffer = worker_context.trace_buffer
+        self._warmup_state = worker_context.warmup_state
+        self._allocator = worker_context.allocator
+        self._hot_accounts = worker_context.hot_accounts
+        self._index = worker_context.index
+        self._responses = worker_context.responses
+        self._proxy_cache = worker_context.proxy_cache
+        self._peers = worker_context.peers
+        self._membership = worker_context.membership
+        self._read_snapshot = worker_context.read_snapshot
+        self._heartbeats = worker_context.heartbeats
+        self._cpu_times = worker_context.cpu_times
+        self._queue_depths = worker_context.queue_depths
+        self._rejections = worker_context.rejections
+        self._config_version = worker_context.config_version
 
         self._factory = None
+        self._tracer = None
+        self._sampler = StackSampler()
         self._storage = None
         self._log = None
+        self._client_context = None  # ClientContextHolder read by connections for every message
+        self._connections = None
 
         self.daemon = True
 
@@ -59,13 +118,30 @@ class Worker(Process):
         Initializes storage and starts accepting sockets.
         """
 
-        add_queue_handler_to_root(self._log_queue)
+        log_handler = add_queue_handler_to_root(self._log_queue)
         self._log = logging.getLogger(f"WORKER-{self.pid}")
 
         try:
-            self._storage = BankStorage(self._configuration["storage_path"], self._configuration["storage_timeout"], self._cache, self._lock)
+            self._serve()
+        finally:
+            # buffered records would be lost when process exits
+            log_handler.flush()
+
+    def _serve(self):
+        """
+        Initializes storage and command factory, then accepts sockets until worker is stopped.
+        """
+        try:
+            self._storage = create_storage(
+                self._configuration, self._cache, self._lock, self._allocator, warmup_state=self._warmup_state,
+                hot_accounts=self._hot_accounts, worker_index=self._index
+            )
             self._factory = self._init_command_factory()
-        except sqlite3.Error as e:
+            self._tracer = RequestTracer(self._configuration, self._trace_buffer)
+            self._client_context = ClientContextHolder(self._init_client_context())
+            self._connections = ConnectionManager(self._configuration, self._active_connections)
+            self._connections.start()
+        except (sqlite3.Error, OSError) as e:
             self._log.critical(f"Worker could not connect to storage: {e}")
             return
         except Exception as e:
@@ -76,6 +152,7 @@ class Worker(Process):
 
         try:
             self._accept_clients()
+            self._drain()
         except Exception as e:
             self._log.error(e)
         finally:
@@ -95,7 +172,16 @@ class Worker(Process):
             port_range=tuple(self._configuration.get('network_scan_port_range')),
             timeout=self._configuration.get('network_timeout'),
             ip_range=self._configuration.get('network_scan_ip_range'),
-            security=self._security
+            security=self._security,
+            peers=self._peers,
+            rate=self._configuration.get('network_scan_rate', 500),
+            membership=self._membership,
+            discovery={
+                "port": self._configuration.get('discovery_port', 65500),
+                "addresses": self._configuration.get('discovery_addresses', []),
+                "window": self._configuration.get('discovery_window', 0.5),
+                "own_port": self._configuration['port'],
+            } if self._configuration.get('discovery_enabled', False) else None
         )
 
         network_context = NetworkContext(our_ip=bank_code, scanner=network_scanner)
@@ -105,38 +191,126 @@ class Worker(Process):
 
         storage_context = StorageContext(bank_code, self._storage)
         factory.register("AC", CreateAccountCommand, storage_context)
+        factory.register(
+            "AP",
+            BulkCreateAccountCommand,
+            BulkStorageContext(bank_code, self._storage, self._configuration.get("bulk_create_limit", 10_000))
+        )
         factory.register("AR", RemoveAccountCommand, storage_context)
         factory.register("AD", AccountDepositCommand, storage_context)
         factory.register("AW", AccountWithdrawCommand, storage_context)
-        factory.register("AB", AccountBalanceCommand, storage_context)
-        factory.register("BA", BankAmountCommand, storage_context)
-        factory.register("BN", BankNumberCommand, storage_context)
+        read_context = ReadContext(
+            bank_code, self._storage, self._read_snapshot,
+            self._configuration.get("read_snapshot_max_staleness", 1)
+        )
+        factory.register("AB", AccountBalanceCommand, read_context)
+        factory.register("BA", BankAmountCommand, read_context)
+        factory.register("BN", BankNumberCommand, read_context)
         factory.register("RP", RobberyPlanCommand, network_context)
+        factory.register("GS", GossipCommand, GossipContext(self._membership))
 
         return factory
 
+    def _init_client_context(self) -> ClientContext:
+        """
+        Creates context shared by connections, it is created again when configuration changes
+        (balance requests in progress in the old proxy are not joined by new requests)
+        """
+        return ClientContext(
+            config=self._configuration,
+            factory=self._factory,
+            security=self._security,
+            tracer=self._tracer,
+            proxy=BankProxy(self._configuration, self._security, self._proxy_cache, self._peers, self._membership),
+            responses=self._responses
+        )
+
     def _accept_clients(self):
         """
-        Accepts sockets from one side of the pipe. For every socket it starts a new client thread.
+        Accepts sockets from one side of the pipe, every socket is added to connection manager.
+        Pipe also carries control commands (WorkerCommand) which are answered through the pipe.
+        Heartbeat is written on every loop, supervisor restarts worker whose heartbeat stops.
         """
         while True:
             try:
-                client_socket = self._pipe.recv()
+                self._heartbeats[self._index] = time.monotonic()
+                self._cpu_times[self._index] = time.process_time()
+                self._publish_load()
+                if not self._pipe.poll(HEARTBEAT_INTERVAL):
+                    continue
+
+                message = self._pipe.recv()
 
                 # None closes worker
-                if client_socket is None:
+                if message is None:
                     break
 
-                context = ClientContext(
-                    socket=client_socket,
-                    config=self._configuration,
-                    factory=self._factory,
-                    active_connections=self._active_connections,
-                    security=self._security
-                )
+                if isinstance(message, WorkerCommand):
+                    self._pipe.send(self._handle_command(message))
+                    continue
 
-                client = ClientConnection(context)
-                client.start()
+                self._connections.add(message, self._client_context)
 
             except KeyboardInterrupt:
-                break
\ No newline at end of file
+                break
+
+    def _publish_load(self):
+        """
+        Publishes handler queue depth and rejected messages for monitoring and autoscaling
+        """
+        stats = self._connections.get_stats()
+        self._queue_depths[self._index] = stats["queued"]
+        self._rejections[self._index] = stats["rejected"]
+
+    def _drain(self):
+        """
+        Stops connections after commands in progress (idle connections are closed immediately)
+        and waits until they are closed (at most worker_drain_timeout)
+        """
+        self._connections.stop()
+
+        deadline = time.monotonic() + self._configuration.get("worker_drain_timeout", 30)
+        while self._active_connections.value > 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        if self._active_connections.value > 0:
+            self._log.warning(f"Worker {self.pid} stopped with {self._active_connections.value} open connections")
+
+    def _reload_config(self, version: int, changes: dict) -> int:
+        """
+        Applies changed configuration keys. Command factory (network scanner), tracer and proxy are created again
+        and replace client context, open connections use them from their next message.
+        :return: applied configuration version
+        """
+        self._configuration.update(changes)
+        if "ban_duration" in changes:
+            self._security.BAN_DURATION = changes["ban_duration"]
+
+        self._factory = self._init_command_factory()
+        self._tracer = RequestTracer(self._configuration, self._trace_buffer)
+        self._client_context.context = self._init_client_context()
+        self._config_version = version
+
+        self._log.info(f"Configuration version {version} applied: {', '.join(changes)}")
+        return version
+
+    def _handle_command(self, command: WorkerCommand) -> dict:
+        """
+        Handles control command received from worker manager
+        :param command: command to handle
+        :return: reply for worker manager
+        """
+        reply = {"request_id": command.request_id, "pid": self.pid}
+
+        if command.action == "profile_start":
+            reply["started"] = self._sampler.start(command.payload.get("interval", 0.01))
+        elif command.action == "profile_stop":
+            reply.update(self._sampler.stop())
+        elif command.action == "profile_status":
+            reply["running"] = self._sampler.is_running()
+        elif command.action == "reload_config":
+            reply["version"] = self._reload_config(command.payload.get("version"), command.payload.get("changes", {}))
+        else:
+            reply["error"] = f"Unknown action {command.action}"
+
+        return reply
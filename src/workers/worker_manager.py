@@ -1,19 +1,80 @@
+import itertools
 import logging
 import socket
-from multiprocessing import Queue, Pipe, managers, Value
+import time
+from dataclasses import dataclass
+from typing import Any
+from multiprocessing import Queue, Pipe, managers, Value, Array
+from multiprocessing.connection import Connection
+from threading import Lock, Thread, Event
 
+from bank.allocator import AccountAllocator
+from bank.hot_accounts import HotAccounts
+from bank.snapshot import ReadSnapshot
+from bank.idempotency import ResponseCache
+from bank.proxy import ProxyCache
+from network.gossip import Membership
+from network.health import PeerHealth
 from bank.security import SecurityGuard
-from workers.worker import WorkerContext, Worker
+from bank.storages import BalanceCache
+from workers.autoscaler import Autoscaler, LoadSample
+from workers.profiler import merge_profiles
+from workers.worker import WorkerContext, Worker, WorkerCommand
+
+SUPERVISE_INTERVAL = 0.5  # seconds between supervisor checks
+STABLE_UPTIME = 30  # worker running this long resets restart backoff
+MAX_RESTART_BACKOFF = 30
+DRAIN_GRACE = 5  # seconds after worker_drain_timeout before draining worker is terminated
+READY_TIMEOUT = 10  # seconds new worker of rolling restart has to send first heartbeat
+ROLLING_SURGE = 1  # extra workers running during rolling restart
 
 log = logging.getLogger("MANAGER")
 
 
+def max_worker_index(config: dict) -> int:
+    """
+    Gets the highest worker index (workers are indexed from 1), it is also row of worker in hot accounts table
+    :param config: bank configuration
+    :return: max_workers plus workers started ahead during rolling restart
+    """
+    return config.get("max_workers", config["bank_workers"]) + ROLLING_SURGE
+
+
+@dataclass(eq=False)
+class WorkerSlot:
+    """
+    Place of one worker in the pool, respawned worker keeps its slot (index, heartbeat and hot accounts row).
+    """
+    index: int
+    connections: Any  # shared Value with active connections of the worker
+    worker: Worker | None = None
+    pipe: Connection | None = None
+    started_at: float = 0.0
+    restarts: int = 0
+    failures: int = 0  # consecutive failures, backoff grows with them
+    restart_at: float | None = None  # set when worker is dead and waits for respawn
+    drain_started: float | None = None  # set when worker stopped getting sockets and finishes its connections
+    cpu_sample: tuple[float, float] = (0.0, 0.0)  # (CPU time, monotonic time) at last load check
+    config_version: int = 0  # configuration version applied by the worker
+
+    def is_serving(self) -> bool:
+        return self.pipe is not None and self.restart_at is None and self.drain_started is None
+
+
 class WorkerManager:
     """
     Class that manages workers (Processes).
+    Supervisor thread watches worker processes and their heartbeats, dead or hung worker is removed from
+    socket distribution immediately and respawned with exponential backoff.
+    When min_workers < max_workers supervisor also scales the pool by load, removed worker is drained first
+    (it gets no new sockets and exits when its connections finish).
+    Rolling restart replaces workers one by one, new worker is started before the old one is drained.
     """
 
-    def __init__(self, config: dict, log_queue: Queue, shared_memory: managers.DictProxy, shared_lock, security: SecurityGuard):
+    def __init__(self, config: dict, log_queue: Queue, shared_memory: BalanceCache, shared_lock, security: SecurityGuard, trace_buffer,
+                 warmup_state: managers.DictProxy, allocator: AccountAllocator, hot_accounts: HotAccounts | None,
+                 responses: ResponseCache | None, proxy_cache: ProxyCache | None, peers: PeerHealth,
+                 membership: Membership | None, read_snapshot: ReadSnapshot | None):
 
         self._config = config
         self._worker_count = config["bank_workers"]
@@ -21,93 +82,525 @@ class WorkerManager:
         self._shared_memory = shared_memory
         self._shared_lock = shared_lock
         self._security = security
+        self._trace_buffer = trace_buffer
+        self._warmup_state = warmup_state
+        self._allocator = allocator
+        self._hot_accounts = hot_accounts
+        self._responses = responses
+        self._proxy_cache = proxy_cache
+        self._peers = peers
+        self._membership = membership
+        self._read_snapshot = read_snapshot
 
-        self._workers = []
-        self._worker_pipes = []
+        self._heartbeat_timeout = config.get("worker_heartbeat_timeout", 5)
+        self._restart_backoff = config.get("worker_restart_backoff", 1)
+        self._drain_timeout = config.get("worker_drain_timeout", 30)
+        self._autoscaler = Autoscaler(config)
+        self._accept_queue = None
+
+        self._slots = []
+        self._restarts = 0
+        self._config_version = 0
+        self._max_index = max_worker_index(config)
+        # rolling restart and autoscaling do not change the pool at the same time
+        self._scale_lock = Lock()
         self._worker_index = 0
 
-        self._active_connections = Value('i', 0)
+        # pipes are written from listener thread (sockets), web thread (commands) and supervisor (respawn)
+        self._pipe_lock = Lock()
+        self._command_lock = Lock()
+        self._request_ids = itertools.count(1)
+
+        # index 0 is not used, workers have indexes 1..max index like hot accounts rows
+        self._heartbeats = Array('d', self._max_index + 1, lock=False)
+        self._cpu_times = Array('d', self._max_index + 1, lock=False)
+        self._queue_depths = Array('i', self._max_index + 1, lock=False)
+        self._rejections = Array('q', self._max_index + 1, lock=False)
+
+        self._supervisor = None
+        self._stop_supervisor = Event()
 
     def create_workers(self):
         """
         Creates new workers. New pipe between is created that provides way to pass data.
         """
-        self._workers.clear()
-        self._worker_pipes.clear()
-        self._worker_index = 0
+        with self._pipe_lock:
+            self._slots = [WorkerSlot(index + 1, Value('i', 0)) for index in range(self._worker_count)]
+            self._worker_index = 0
 
-        for _ in range(self._worker_count):
-            parent_connection, child_connection = Pipe()
+            for slot in self._slots:
+                self._create_worker(slot)
 
-            context = WorkerContext(
-                shared_memory=self._shared_memory,
-                log_queue=self._log_queue,
-                pipe=child_connection,
-                config=self._config,
-                lock=self._shared_lock,
-                active_connections=self._active_connections,
-                security=self._security
-            )
+    def _create_worker(self, slot: WorkerSlot):
+        """
+        Creates worker process for slot, pipe lock must be held if slot is in the pool
+        """
+        parent_connection, child_connection = Pipe()
+
+        context = WorkerContext(
+            shared_memory=self._shared_memory,
+            log_queue=self._log_queue,
+            pipe=child_connection,
+            config=self._config,
+            lock=self._shared_lock,
+            active_connections=slot.connections,
+            security=self._security,
+            trace_buffer=self._trace_buffer,
+            warmup_state=self._warmup_state,
+            allocator=self._allocator,
+            hot_accounts=self._hot_accounts,
+            index=slot.index,
+            read_snapshot=self._read_snapshot,
+            responses=self._responses,
+            proxy_cache=self._proxy_cache,
+            peers=self._peers,
+            membership=self._membership,
+            heartbeats=self._heartbeats,
+            cpu_times=self._cpu_times,
+            queue_depths=self._queue_depths,
+            rejections=self._rejections,
+            config_version=self._config_version
+        )
 
-            worker = Worker(context)
-            self._workers.append(worker)
-            self._worker_pipes.append(parent_connection)
+        self._heartbeats[slot.index] = 0.0
+        self._cpu_times[slot.index] = 0.0
+        self._queue_depths[slot.index] = 0
+        self._rejections[slot.index] = 0
+        slot.cpu_sample = (0.0, time.monotonic())
+        # threads of crashed worker never decremented the counter
+        slot.connections.value = 0
+        slot.worker = Worker(context)
+        slot.pipe = parent_connection
+        slot.config_version = self._config_version
+
+    def set_accept_queue(self, accept_queue):
+        """
+        Sets source of accept queue length used by autoscaling
+        :param accept_queue: function returning number of connections waiting in accept queue or None
+        """
+        self._accept_queue = accept_queue
 
     def start_workers(self):
         """
-        Starts all workers.
+        Starts all workers and supervisor.
         """
-        if not self._workers:
+        if not self._slots:
             log.warning("No workers to start. Did you call create_workers()?")
             return
 
-        for worker in self._workers:
-            if not worker.is_alive():
-                worker.start()
+        now = time.monotonic()
+        for slot in self._slots:
+            if not slot.worker.is_alive():
+                slot.worker.start()
+                slot.started_at = now
+
+        self._stop_supervisor.clear()
+        self._supervisor = Thread(target=self._supervise, name="WorkerSupervisor", daemon=True)
+        self._supervisor.start()
 
     def stop_workers(self):
         """
-        Stops all workers by sending None through the pipe.
+        Stops supervisor and drains all workers (None is sent through the pipe) - workers finish commands
+        in progress and close connections, workers still running after worker_drain_timeout are terminated.
+        """
+        self._stop_supervisor.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+            self._supervisor = None
+
+        with self._pipe_lock:
+            for slot in self._slots:
+                if slot.pipe is None:
+                    continue
+                try:
+                    slot.pipe.send(None)
+                except OSError:
+                    pass
+
+        deadline = time.monotonic() + self._drain_timeout + DRAIN_GRACE
+        for slot in self._slots:
+            worker = slot.worker
+            if worker is not None and worker.is_alive():
+                worker.join(timeout=max(deadline - time.monotonic(), 0))
+                if worker.is_alive():
+                    log.warning(f"Worker {worker.pid} did not finish draining in time, terminating it")
+                    worker.terminate()
+
+        self._slots = []
+
+    def _supervise(self):
+        """
+        Supervisor loop, checks workers, respawns dead ones when their backoff passes and scales the pool
         """
-        for pipe in self._worker_pipes:
+        while not self._stop_supervisor.wait(SUPERVISE_INTERVAL):
+            now = time.monotonic()
+            for slot in list(self._slots):
+                try:
+                    if slot.drain_started is not None:
+                        self._check_draining_worker(slot, now)
+                    elif slot.restart_at is None:
+                        self._check_worker(slot, now)
+                    elif now >= slot.restart_at:
+                        self._respawn_worker(slot)
+                except Exception as e:
+                    log.error(f"Supervisor failed to handle worker {slot.index}: {e}")
+
+            if self._autoscaler.is_due(now) and self._scale_lock.acquire(blocking=False):
+                try:
+                    self._autoscale(now)
+                except Exception as e:
+                    log.error(f"Autoscaling failed: {e}")
+                finally:
+                    self._scale_lock.release()
+
+    def _check_worker(self, slot: WorkerSlot, now: float):
+        """
+        Removes worker from distribution if its process died or it stopped sending heartbeats
+        """
+        worker = slot.worker
+        if worker.is_alive():
+            last_beat = max(self._heartbeats[slot.index], slot.started_at)
+            if now - last_beat <= self._heartbeat_timeout:
+                if slot.failures and now - slot.started_at > STABLE_UPTIME:
+                    slot.failures = 0
+                return
+
+            log.error(f"Worker {worker.pid} did not send heartbeat for {now - last_beat:.1f} s, terminating it")
+            worker.terminate()
+            worker.join(timeout=1.0)
+            if worker.is_alive():
+                worker.kill()
+        else:
+            log.error(f"Worker {worker.pid} died with exit code {worker.exitcode}")
+
+        backoff = min(self._restart_backoff * 2 ** slot.failures, MAX_RESTART_BACKOFF)
+        slot.failures += 1
+
+        with self._pipe_lock:
+            slot.restart_at = now + backoff
             try:
-                pipe.send(None)
+                slot.pipe.close()
             except OSError:
                 pass
 
-        for worker in self._workers:
+        log.warning(f"Worker {slot.index} will be restarted in {backoff:.1f} s")
+
+    def _respawn_worker(self, slot: WorkerSlot):
+        with self._pipe_lock:
+            self._create_worker(slot)
+
+        slot.worker.start()
+        slot.started_at = time.monotonic()
+        slot.restarts += 1
+        self._restarts += 1
+
+        with self._pipe_lock:
+            slot.restart_at = None
+
+        log.info(f"Worker {slot.index} restarted as {slot.worker.pid}")
+
+    def _check_draining_worker(self, slot: WorkerSlot, now: float):
+        """
+        Removes drained worker from the pool when it exits, worker that drains too long is terminated
+        """
+        worker = slot.worker
+        if worker.is_alive():
+            if now - slot.drain_started <= self._drain_timeout + DRAIN_GRACE:
+                return
+            log.warning(f"Worker {worker.pid} did not finish draining in time, terminating it")
+            worker.terminate()
+            worker.join(timeout=1.0)
             if worker.is_alive():
-                worker.join(timeout=1.0)
-                if worker.is_alive():
-                    worker.terminate()
+                worker.kill()
+                return
+
+        worker.join(timeout=1.0)
+        with self._pipe_lock:
+            self._slots.remove(slot)
+            slot.pipe.close()
+        log.info(f"Worker {slot.index} ({worker.pid}) drained in {now - slot.drain_started:.1f} s and stopped")
+
+    def _autoscale(self, now: float):
+        """
+        Measures load of worker pool and adds or drains one worker if autoscaler decides so
+        """
+        serving = [slot for slot in self._slots if slot.is_serving()]
+        if not serving:
+            return
+
+        cpu = 0.0
+        for slot in serving:
+            cpu_time, sampled_at = slot.cpu_sample
+            current = self._cpu_times[slot.index]
+            if now > sampled_at:
+                cpu += min(max(current - cpu_time, 0.0) / (now - sampled_at), 1.0)
+            slot.cpu_sample = (current, now)
+
+        sample = LoadSample(
+            workers=len(serving),
+            connections_per_worker=sum(slot.connections.value for slot in serving) / len(serving),
+            cpu=cpu / len(serving),
+            accept_queue=self._accept_queue() if self._accept_queue else None,
+            queued_messages=sum(self._queue_depths[slot.index] for slot in serving)
+        )
+
+        change, reason = self._autoscaler.decide(sample, now)
+        if change > 0:
+            self._add_worker(now, reason)
+        elif change < 0:
+            self._drain_worker(serving[-1], now, reason)
+
+    def _add_worker(self, now: float, reason: str):
+        slot = self._start_new_worker()
+        if slot is None:
+            return
+
+        workers = self._serving_count()
+        self._autoscaler.record("scale_up", workers, reason, now)
+        log.info(f"Scaled up to {workers} workers ({reason}), worker {slot.index} started as {slot.worker.pid}")
+
+    def _start_new_worker(self) -> WorkerSlot | None:
+        """
+        Starts worker in a free slot and adds it to socket distribution
+        :return: new slot or None if all indexes are held (by workers that are still draining)
+        """
+        used = {slot.index for slot in self._slots}
+        free = [index for index in range(1, self._max_index + 1) if index not in used]
+        if not free:
+            return None
+
+        slot = WorkerSlot(free[0], Value('i', 0))
+        self._create_worker(slot)
+        slot.worker.start()
+        slot.started_at = time.monotonic()
+
+        # socket distribution sees the worker only after it was started
+        with self._pipe_lock:
+            self._slots.append(slot)
+        return slot
 
-        self._workers.clear()
-        self._worker_pipes.clear()
+    def _drain_worker(self, slot: WorkerSlot, now: float, reason: str):
+        self._stop_worker(slot, now)
+
+        workers = self._serving_count()
+        self._autoscaler.record("scale_down", workers, reason, now)
+        log.info(f"Scaled down to {workers} workers ({reason}), draining worker {slot.index}")
+
+    def _stop_worker(self, slot: WorkerSlot, now: float):
+        """
+        Stops sending sockets to worker and tells it to exit when its connections finish,
+        supervisor removes the slot when worker exits
+        """
+        with self._pipe_lock:
+            slot.drain_started = now
+            try:
+                slot.pipe.send(None)
+            except OSError:
+                pass
+
+    def _serving_count(self) -> int:
+        return sum(1 for slot in list(self._slots) if slot.is_serving())
+
+    def restart_workers(self) -> int:
+        """
+        Rolling restart, every worker is replaced by a new one. New worker is started and has to send
+        heartbeat before the old one is drained, so the pool never has fewer workers serving.
+        :return: number of replaced workers
+        """
+        with self._scale_lock:
+            replaced = 0
+            for old_slot in [slot for slot in self._slots if slot.is_serving()]:
+                new_slot = self._start_new_worker()
+                if new_slot is None or not self._wait_until(lambda: self._heartbeats[new_slot.index] > 0, READY_TIMEOUT):
+                    log.error("New worker did not start, rolling restart is stopped")
+                    break
+
+                self._stop_worker(old_slot, time.monotonic())
+                if not self._wait_until(lambda: old_slot not in self._slots, self._drain_timeout + DRAIN_GRACE + 1):
+                    log.error(f"Worker {old_slot.index} was not stopped, rolling restart is stopped")
+                    break
+
+                replaced += 1
+                log.info(f"Worker {old_slot.index} replaced by worker {new_slot.index} ({new_slot.worker.pid})")
+
+            self._autoscaler.record("rolling_restart", self._serving_count(), f"{replaced} workers replaced",
+                                    time.monotonic())
+            return replaced
+
+    @staticmethod
+    def _wait_until(condition, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
 
     def distribute_socket(self, client_socket: socket.socket):
         """
         Distributes socket between workers, socket in this process must be closed.
+        Dead workers are skipped, when sending fails the next worker is tried.
         :param client_socket: socket to distribute.
         """
-        if not self._worker_pipes:
-            log.critical("No worker pipes available to distribute socket")
-            client_socket.close()
-            return
-
         try:
-            self._worker_pipes[self._worker_index].send(client_socket)
-        except (IndexError, OSError):
-            log.critical("Worker process was not found - its either dead or none were created")
+            with self._pipe_lock:
+                for _ in range(len(self._slots)):
+                    slot = self._slots[self._worker_index % len(self._slots)]
+                    self._worker_index = (self._worker_index + 1) % len(self._slots)
+
+                    if not slot.is_serving():
+                        continue
+                    try:
+                        slot.pipe.send(client_socket)
+                        return
+                    except OSError:
+                        log.warning(f"Worker {slot.index} pipe is closed, trying next worker")
+
+            log.critical("No worker available to handle socket")
         finally:
             client_socket.close()
-            if self._worker_index < len(self._worker_pipes) - 1:
-                self._worker_index += 1
-            else:
-                self._worker_index = 0
+
+    def publish_config(self, changes: dict, version: int) -> int:
+        """
+        Applies changed configuration keys to worker manager and running workers,
+        workers started later get them from configuration
+        :param changes: changed keys with new values
+        :param version: new configuration version
+        :return: number of workers that applied the configuration
+        """
+        self._config.update(changes)
+        self._config_version = version
+
+        self._heartbeat_timeout = self._config.get("worker_heartbeat_timeout", 5)
+        self._restart_backoff = self._config.get("worker_restart_backoff", 1)
+        self._drain_timeout = self._config.get("worker_drain_timeout", 30)
+        self._autoscaler.configure(self._config)
+
+        slots = {slot.worker.pid: slot for slot in list(self._slots) if slot.is_serving()}
+        replies = self.send_command("reload_config", {"version": version, "changes": changes})
+        for reply in replies:
+            if reply.get("version") == version and reply.get("pid") in slots:
+                slots[reply["pid"]].config_version = version
+
+        return sum(1 for reply in replies if reply.get("version") == version)
 
     def get_active_connections_count(self) -> int:
         """
         Gets the current number of active connections
         :return: number of active connections
         """
-        return self._active_connections.value
\ No newline at end of file
+        return sum(slot.connections.value for slot in list(self._slots))
+
+    def send_command(self, action: str, payload: dict | None = None, timeout: float = 5.0) -> list:
+        """
+        Sends control command to all workers and collects their replies.
+        :param action: command action
+        :param payload: command arguments
+        :param timeout: max time to wait for every worker reply
+        :return: list of replies (dictionaries) from workers that answered
+        """
+        replies = []
+
+        with self._command_lock:
+            request_id = next(self._request_ids)
+            command = WorkerCommand(request_id=request_id, action=action, payload=payload or {})
+
+            with self._pipe_lock:
+                pipes = [slot.pipe for slot in self._slots if slot.is_serving()]
+            for pipe in pipes:
+                try:
+                    with self._pipe_lock:
+                        pipe.send(command)
+                except OSError:
+                    log.warning("Could not send command to worker, pipe is closed")
+
+            for pipe in pipes:
+                reply = self._receive_reply(pipe, request_id, timeout)
+                if reply is not None:
+                    replies.append(reply)
+
+        return replies
+
+    @staticmethod
+    def _receive_reply(pipe, request_id: int, timeout: float) -> dict | None:
+        """
+        Receives reply for given request, late replies to older requests are skipped.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not pipe.poll(remaining):
+                    log.warning(f"Worker did not answer command {request_id} in time")
+                    return None
+
+                reply = pipe.recv()
+                if isinstance(reply, dict) and reply.get("request_id") == request_id:
+                    return reply
+        except (OSError, EOFError):
+            return None
+
+    def get_worker_stats(self) -> dict:
+        """
+        Gets state of worker pool
+        :return: dictionary with total restarts, worker limits and list of workers
+                 (index, pid, state, uptime, restarts, active connections, messages waiting for handler
+                 and messages rejected because handler queue was full)
+        """
+        now = time.monotonic()
+        workers = []
+        for slot in list(self._slots):
+            if slot.drain_started is not None:
+                state = "draining"
+            else:
+                state = "restarting" if slot.restart_at is not None else "running"
+
+            workers.append({
+                "index": slot.index,
+                "config_version": slot.config_version,
+                "pid": slot.worker.pid if slot.worker else None,
+                "state": state,
+                "uptime": round(now - slot.started_at, 1) if state != "restarting" and slot.started_at else 0,
+                "restarts": slot.restarts,
+                "connections": slot.connections.value,
+                "queued": self._queue_depths[slot.index],
+                "rejected": self._rejections[slot.index],
+            })
+
+        return {
+            "restarts": self._restarts,
+            "config_version": self._config_version,
+            "min_workers": self._autoscaler.min_workers,
+            "max_workers": self._autoscaler.max_workers,
+            "queued": sum(worker["queued"] for worker in workers),
+            "rejected": sum(worker["rejected"] for worker in workers),
+            "workers": workers
+        }
+
+    def get_scaling_events(self) -> list:
+        """
+        :return: recent autoscaling events, newest first
+        """
+        return self._autoscaler.get_events()
+
+    def start_profiling(self, interval: float) -> int:
+        """
+        Starts stack sampler in all workers
+        :param interval: sampling interval in seconds
+        :return: number of workers that are sampling
+        """
+        replies = self.send_command("profile_start", {"interval": interval})
+        return sum(1 for reply in replies if reply.get("started"))
+
+    def stop_profiling(self, per_worker: bool = False) -> dict:
+        """
+        Stops stack sampler in all workers and merges their stacks
+        :param per_worker: keep stacks of every worker under its own root frame
+        :return: dictionary with number of workers, samples and merged folded stacks
+        """
+        replies = self.send_command("profile_stop")
+        return {
+            "workers": len(replies),
+            "samples": sum(reply.get("samples", 0) for reply in replies),
+            "stacks": merge_profiles(replies, per_worker)
+        }